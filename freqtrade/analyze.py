@@ -8,8 +8,10 @@ from typing import List, Dict
 
 import arrow
 import talib.abstract as ta
-from pandas import DataFrame, to_datetime
+from pandas import DataFrame
 
+from freqtrade import metrics
+from freqtrade.candles import candles_to_dataframe, decode_candles
 from freqtrade.exchange import get_ticker_history
 from freqtrade.vendor.qtpylib.indicators import awesome_oscillator, crossed_above
 
@@ -28,13 +30,7 @@ def parse_ticker_dataframe(ticker: list) -> DataFrame:
     :param ticker: See exchange.get_ticker_history
     :return: DataFrame
     """
-    columns = {'C': 'close', 'V': 'volume', 'O': 'open', 'H': 'high', 'L': 'low', 'T': 'date'}
-    frame = DataFrame(ticker) \
-        .drop('BV', 1) \
-        .rename(columns=columns)
-    frame['date'] = to_datetime(frame['date'], utc=True, infer_datetime_format=True)
-    frame.sort_values('date', inplace=True)
-    return frame
+    return candles_to_dataframe(decode_candles(ticker))
 
 
 def populate_indicators(dataframe: DataFrame) -> DataFrame:
@@ -115,6 +111,7 @@ def populate_sell_trend(dataframe: DataFrame) -> DataFrame:
     return dataframe
 
 
+@metrics.timed(metrics.ANALYZE_SECONDS)
 def analyze_ticker(ticker_history: List[Dict]) -> DataFrame:
     """
     Parses the given ticker history and returns a populated DataFrame
@@ -128,6 +125,7 @@ def analyze_ticker(ticker_history: List[Dict]) -> DataFrame:
     return dataframe
 
 
+@metrics.timed(metrics.SIGNAL_SECONDS)
 def get_signal(pair: str, signal: SignalType) -> bool:
     """
     Calculates current signal based several technical analysis indicators
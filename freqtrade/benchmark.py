@@ -0,0 +1,277 @@
+"""
+Benchmarks of the hot paths of the bot, using the bundled backtesting data
+"""
+import gc
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from tabulate import tabulate
+
+from freqtrade import __version__
+
+logger = logging.getLogger(__name__)
+
+# Pairs of the bundled testdata used by the benchmarks
+PAIRS = ['BTC_ETH', 'BTC_LTC', 'BTC_ETC', 'BTC_DASH', 'BTC_ZEC',
+         'BTC_XLM', 'BTC_NXT', 'BTC_POWR', 'BTC_ADA', 'BTC_XMR']
+RESULTS_FILE = 'benchmark.json'
+
+# Registered benchmarks in the order they are run, see benchmark()
+BENCHMARKS: Dict[str, Callable[[Dict[str, Any]], Callable[[], Any]]] = OrderedDict()
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Registers a benchmark. The decorated function is called with the options
+    of the run and prepares everything which should not be measured,
+    it returns the callable which is timed.
+    :param name: name of the benchmark
+    :return: decorator
+    """
+    def decorator(setup: Callable[[Dict[str, Any]], Callable[[], Any]]) -> Callable:
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+@benchmark('parse_ticker_dataframe')
+def _parse_ticker_dataframe(options: Dict[str, Any]) -> Callable[[], Any]:
+    from freqtrade.analyze import parse_ticker_dataframe
+    from freqtrade.optimize import load_data
+
+    data = load_data(pairs=PAIRS)
+    return lambda: [parse_ticker_dataframe(pair_data) for pair_data in data.values()]
+
+
+@benchmark('populate_indicators')
+def _populate_indicators(options: Dict[str, Any]) -> Callable[[], Any]:
+    from freqtrade.analyze import parse_ticker_dataframe, populate_indicators
+    from freqtrade.optimize import load_data
+
+    frames = [parse_ticker_dataframe(pair_data) for pair_data in load_data(pairs=PAIRS).values()]
+    return lambda: [populate_indicators(frame.copy()) for frame in frames]
+
+
+def _backtest(realistic: bool) -> Callable[[], Any]:
+    from freqtrade import main
+    from freqtrade.optimize import load_data, preprocess
+    from freqtrade.optimize.backtesting import backtest
+    from freqtrade.optimize.hyperopt_conf import hyperopt_optimize_conf
+
+    config = hyperopt_optimize_conf()
+    main._CONF = config
+    processed = preprocess(load_data(pairs=PAIRS))
+    max_open_trades = config['max_open_trades'] if realistic else 0
+    return lambda: backtest(config['stake_amount'], processed, max_open_trades, realistic)
+
+
+@benchmark('backtest_simple')
+def _backtest_simple(options: Dict[str, Any]) -> Callable[[], Any]:
+    return _backtest(realistic=False)
+
+
+@benchmark('backtest_realistic')
+def _backtest_realistic(options: Dict[str, Any]) -> Callable[[], Any]:
+    return _backtest(realistic=True)
+
+
+@benchmark('backtest_stream')
+def _backtest_stream(options: Dict[str, Any]) -> Callable[[], Any]:
+    from freqtrade import main
+    from freqtrade.optimize import load_data
+    from freqtrade.optimize.backtesting import backtest_stream
+    from freqtrade.optimize.hyperopt_conf import hyperopt_optimize_conf
+
+    config = hyperopt_optimize_conf()
+    main._CONF = config
+    data = load_data(pairs=PAIRS)
+    # Includes the analysis, which the other backtests do beforehand
+    return lambda: backtest_stream(
+        config['stake_amount'], data.items(), config['max_open_trades'], True, chunk_size=1000
+    )
+
+
+@benchmark('hyperopt')
+def _hyperopt(options: Dict[str, Any]) -> Callable[[], Any]:
+    from hyperopt.pyll.stochastic import sample
+    from numpy.random import RandomState
+
+    from freqtrade.optimize import hyperopt, load_data, preprocess
+
+    hyperopt.PROCESSED = preprocess(load_data(pairs=PAIRS))
+    # The same parameters are evaluated in every run
+    random_state = RandomState(0)
+    params = [sample(hyperopt.SPACE, rng=random_state) for _ in range(options['epochs'])]
+    hyperopt.TOTAL_TRIES = options['epochs']
+    return lambda: [hyperopt.optimizer(epoch_params) for epoch_params in params]
+
+
+@benchmark('calc_profit_percent')
+def _calc_profit_percent(options: Dict[str, Any]) -> Callable[[], Any]:
+    from freqtrade.persistence import Trade
+
+    trade = Trade(pair='BTC_ETH', stake_amount=0.001, fee=0.0025,
+                  open_rate=0.07256061, amount=0.01378155)
+    rates = [0.07256061 * (1 + offset / 10000) for offset in range(-5000, 5000)]
+    return lambda: [trade.calc_profit_percent(rate=rate) for rate in rates]
+
+
+@benchmark('trade_stats')
+def _trade_stats(options: Dict[str, Any]) -> Callable[[], Any]:
+    from sqlalchemy import create_engine
+
+    from freqtrade import persistence
+    from freqtrade.persistence import Trade
+
+    persistence.init({'dry_run': True}, create_engine('sqlite://'))
+    now = datetime.utcnow()
+    for index in range(options['trades']):
+        close_date = now - timedelta(minutes=index * 7)
+        profit = ((index * 37) % 200 - 100) / 10000
+        Trade.session.add(Trade(
+            exchange='BITTREX', pair=PAIRS[index % len(PAIRS)], stake_amount=0.001,
+            fee=0.0025, open_rate=0.1, close_rate=0.1 * (1 + profit), amount=0.01,
+            is_open=False, close_profit=profit, close_profit_abs=profit * 0.001,
+            open_date=close_date - timedelta(minutes=90), close_date=close_date
+        ))
+    Trade.session.flush()
+
+    def run() -> None:
+        # The queries behind /profit, /performance and /daily
+        persistence.load_trade_stats()
+        persistence.get_trade_stats()
+        persistence.get_pair_profits()
+        persistence.get_daily_profit(now.date(), 30)
+    return run
+
+
+@benchmark('startup')
+def _startup(options: Dict[str, Any]) -> Callable[[], Any]:
+    # A new interpreter parses the arguments and exits, like `freqtrade --version`
+    command = [sys.executable, '-m', 'freqtrade.main', '--version']
+    return lambda: subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+
+
+def run_benchmark(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Times the given callable and measures its peak memory usage.
+    The memory is traced in an additional run, as tracing slows down the timed runs.
+    :param func: callable without arguments
+    :param repeat: number of timed runs
+    :return: dict, format: {
+        'runs': int, 'min': float, 'median': float, 'mean': float, 'max': float (in seconds),
+        'peak_memory': int (in bytes)
+    }
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+        'peak_memory': peak_memory,
+    }
+
+
+def run_benchmarks(names: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the given benchmarks
+    :param names: names of the benchmarks, see BENCHMARKS
+    :param options: options passed to the benchmarks, format: {
+        'repeat': int, 'epochs': int, 'trades': int
+    }
+    :return: dict with the environment and the results per benchmark
+    """
+    results = OrderedDict()
+    for name in names:
+        logger.info('Running benchmark %s ...', name)
+        results[name] = run_benchmark(BENCHMARKS[name](options), options['repeat'])
+    return {
+        'version': __version__,
+        'python': platform.python_version(),
+        'date': datetime.utcnow().isoformat(),
+        'options': options,
+        'results': results,
+    }
+
+
+def generate_text_table(results: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Generates a text table of the given results
+    :param results: results of run_benchmarks()
+    :param previous: results of an earlier run to compare with (optional)
+    :return: pretty printed table with tabulate as str
+    """
+    headers = ['benchmark', 'runs', 'min (s)', 'median (s)', 'max (s)', 'peak memory (MiB)']
+    if previous:
+        headers.append('median change')
+
+    tabular_data = []
+    for name, result in results['results'].items():
+        row = [
+            name,
+            result['runs'],
+            '{:.4f}'.format(result['min']),
+            '{:.4f}'.format(result['median']),
+            '{:.4f}'.format(result['max']),
+            '{:.2f}'.format(result['peak_memory'] / 2 ** 20),
+        ]
+        if previous:
+            previous_result = previous['results'].get(name)
+            row.append('{:+.1f}%'.format(
+                (result['median'] / previous_result['median'] - 1) * 100
+            ) if previous_result else '')
+        tabular_data.append(row)
+    return tabulate(tabular_data, headers=headers, disable_numparse=True)
+
+
+def start(args) -> None:
+    # Initialize logger
+    logging.basicConfig(
+        level=args.loglevel,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+
+    names = args.benchmarks or list(BENCHMARKS)
+    results = run_benchmarks(names, {
+        'repeat': args.repeat,
+        'epochs': args.epochs,
+        'trades': args.trades,
+    })
+
+    with open(args.export, 'w') as file:
+        json.dump(results, file, indent=4)
+    logger.info('Results written to %s', args.export)
+    logger.info(
+        '\n====================== BENCHMARK REPORT ======================================\n%s',
+        generate_text_table(results, previous)
+    )
@@ -0,0 +1,104 @@
+"""
+Decoding of the candles returned by the exchange into typed columns
+"""
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+import numpy as np
+from pandas import DataFrame, to_datetime
+
+# Keys of a candle which are required, in the order of the decoded columns
+REQUIRED_KEYS = ('O', 'H', 'L', 'C', 'V', 'T')
+# Names of the decoded columns
+COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'date')
+# Order of the columns of the dataframe used by the analysis
+DATAFRAME_COLUMNS = ['close', 'high', 'low', 'open', 'date', 'volume']
+
+_GET_VALUES = itemgetter(*REQUIRED_KEYS)
+
+
+def get_rows(ticker: List[Dict]) -> List[Tuple]:
+    """
+    Returns the values of the required keys of every candle, in the order of REQUIRED_KEYS
+    :param ticker: candles, format: [{'O', 'H', 'L', 'C', 'V', 'T'}, ...]
+    :return: list of tuples
+    :raise ValueError: if a required key is missing
+    """
+    try:
+        return list(map(_GET_VALUES, ticker))
+    except KeyError as error:
+        raise ValueError('Required property {} not present in candle'.format(error.args[0]))
+    except TypeError:
+        raise ValueError('Candles must be dicts')
+
+
+def decode_candles(ticker: List[Dict]) -> Dict[str, np.ndarray]:
+    """
+    Decodes the given candles into one array per column, sorted by date.
+    The candles are read in a single pass and validated while they are converted.
+    :param ticker: candles, format: [{'O', 'H', 'L', 'C', 'V', 'T'}, ...]
+    :return: dict, format: {'open', 'high', 'low', 'close', 'volume': float64 array,
+        'date': datetime64[ns] array (UTC)}
+    :raise ValueError: if a required key is missing or a value is invalid
+    """
+    rows = get_rows(ticker)
+    if not rows:
+        columns = {name: np.empty(0, dtype=np.float64) for name in COLUMNS[:-1]}
+        columns['date'] = np.empty(0, dtype='datetime64[ns]')
+        return columns
+
+    values = np.array(rows, dtype=object)
+    try:
+        rates = values[:, :-1].astype(np.float64)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid rate or volume in candle')
+    invalid = ~np.isfinite(rates).all(axis=0)
+    if invalid.any():
+        raise ValueError('Invalid {} in candle'.format(COLUMNS[int(np.argmax(invalid))]))
+    dates = _decode_dates(values[:, -1])
+
+    # Candles are usually sorted already
+    if (dates[1:] < dates[:-1]).any():
+        order = np.argsort(dates, kind='mergesort')
+        rates, dates = rates[order], dates[order]
+
+    columns = {name: rates[:, index] for index, name in enumerate(COLUMNS[:-1])}
+    columns['date'] = dates
+    return columns
+
+
+def _decode_dates(dates: np.ndarray) -> np.ndarray:
+    """
+    Converts ISO 8601 dates to naive datetime64 in UTC
+    """
+    try:
+        zoned = _has_timezone(dates.astype(str))
+        # Dates without a timezone, e.g. 2017-11-26T08:50:00, are parsed by numpy
+        if not zoned.any():
+            return dates.astype('datetime64[ns]')
+        result = np.empty(len(dates), dtype='datetime64[ns]')
+        result[~zoned] = dates[~zoned].astype('datetime64[ns]')
+        result[zoned] = to_datetime(dates[zoned], utc=True).tz_convert(None).values \
+            .astype('datetime64[ns]')
+        return result
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date in candle')
+
+
+def _has_timezone(dates: np.ndarray) -> np.ndarray:
+    """
+    Checks every date for a timezone designator (Z, +01:00, -05:00) after the time
+    """
+    times = np.char.partition(dates, 'T')[:, 2]
+    return np.logical_or.reduce([np.char.find(times, zone) >= 0 for zone in ('Z', '+', '-')])
+
+
+def candles_to_dataframe(columns: Dict[str, np.ndarray]) -> DataFrame:
+    """
+    Creates the dataframe used by the analysis from the decoded columns
+    :param columns: result of decode_candles()
+    :return: DataFrame with the columns DATAFRAME_COLUMNS, date in UTC
+    """
+    data = {name: columns[name] for name in COLUMNS[:-1]}
+    data['date'] = to_datetime(columns['date'], utc=True)
+    return DataFrame(data, columns=DATAFRAME_COLUMNS)
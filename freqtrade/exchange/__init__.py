@@ -2,16 +2,16 @@
 """ Cryptocurrency Exchanges support """
 import enum
 import logging
-from random import randint
 from threading import RLock
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Optional
 
-import arrow
 import requests
 from cachetools import cached, TTLCache
 
-from freqtrade import OperationalException
+from freqtrade import OperationalException, metrics
+from freqtrade.resample import get_source_interval, resample_ticker_history
 from freqtrade.exchange.bittrex import Bittrex
+from freqtrade.exchange.dry_run import DryRun
 from freqtrade.exchange.interface import Exchange
 
 logger = logging.getLogger(__name__)
@@ -21,8 +21,13 @@ lock = RLock()
 _API: Exchange = None
 _CONF: dict = {}
 
-# Holds all open sell orders for dry_run
-_DRY_RUN_OPEN_ORDERS: Dict[str, Any] = {}
+# Holds all simulated orders for dry_run
+_DRY_RUN: DryRun = DryRun()
+
+_TICKER_HISTORY_CACHE = TTLCache(maxsize=100, ttl=30)
+
+# Ticker intervals in minutes served by the exchange, all others are derived from them
+TICK_INTERVALS = (1, 5)
 
 
 class Exchanges(enum.Enum):
@@ -86,42 +91,23 @@ def validate_pairs(pairs: List[str]) -> None:
                 'Pair {} is not available at {}'.format(pair, _API.name.lower()))
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'buy')
 def buy(pair: str, rate: float, amount: float) -> str:
     if _CONF['dry_run']:
-        global _DRY_RUN_OPEN_ORDERS
-        order_id = 'dry_run_buy_{}'.format(randint(0, 10**6))
-        _DRY_RUN_OPEN_ORDERS[order_id] = {
-            'pair': pair,
-            'rate': rate,
-            'amount': amount,
-            'type': 'LIMIT_BUY',
-            'remaining': 0.0,
-            'opened': arrow.utcnow().datetime,
-            'closed': arrow.utcnow().datetime,
-        }
-        return order_id
+        return _DRY_RUN.buy(pair, rate, amount)
 
     return _API.buy(pair, rate, amount)
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'sell')
 def sell(pair: str, rate: float, amount: float) -> str:
     if _CONF['dry_run']:
-        global _DRY_RUN_OPEN_ORDERS
-        order_id = 'dry_run_sell_{}'.format(randint(0, 10**6))
-        _DRY_RUN_OPEN_ORDERS[order_id] = {
-            'pair': pair,
-            'rate': rate,
-            'amount': amount,
-            'type': 'LIMIT_SELL',
-            'remaining': 0.0,
-            'opened': arrow.utcnow().datetime,
-            'closed': arrow.utcnow().datetime,
-        }
-        return order_id
+        return _DRY_RUN.sell(pair, rate, amount)
 
     return _API.sell(pair, rate, amount)
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_balance')
 def get_balance(currency: str) -> float:
     if _CONF['dry_run']:
         return 999.9
@@ -129,6 +115,7 @@ def get_balance(currency: str) -> float:
     return _API.get_balance(currency)
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_balances')
 def get_balances():
     if _CONF['dry_run']:
         return []
@@ -136,29 +123,40 @@ def get_balances():
     return _API.get_balances()
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_ticker')
 def get_ticker(pair: str) -> dict:
-    return _API.get_ticker(pair)
+    ticker = _API.get_ticker(pair)
+    if _CONF.get('dry_run'):
+        # Keep the snapshot used to fill simulated orders up to date
+        _DRY_RUN.update_ticker(pair, ticker)
+    return ticker
 
 
-@cached(TTLCache(maxsize=100, ttl=30), lock=lock)
+@metrics.count_cache(_TICKER_HISTORY_CACHE, 'get_ticker_history')
+@cached(_TICKER_HISTORY_CACHE, lock=lock)
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_ticker_history')
 def get_ticker_history(pair: str, tick_interval: Optional[int] = 5) -> List[Dict]:
-    return _API.get_ticker_history(pair, tick_interval)
+    if tick_interval in TICK_INTERVALS:
+        return _API.get_ticker_history(pair, tick_interval)
 
+    source_interval = get_source_interval(tick_interval, TICK_INTERVALS)
+    return resample_ticker_history(
+        _API.get_ticker_history(pair, source_interval), tick_interval, source_interval
+    )
 
+
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'cancel_order')
 def cancel_order(order_id: str) -> None:
     if _CONF['dry_run']:
-        return
+        return _DRY_RUN.cancel_order(order_id)
 
     return _API.cancel_order(order_id)
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_order')
 def get_order(order_id: str) -> Dict:
     if _CONF['dry_run']:
-        order = _DRY_RUN_OPEN_ORDERS[order_id]
-        order.update({
-            'id': order_id
-        })
-        return order
+        return _DRY_RUN.get_order(order_id)
 
     return _API.get_order(order_id)
 
@@ -167,10 +165,12 @@ def get_pair_detail_url(pair: str) -> str:
     return _API.get_pair_detail_url(pair)
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_markets')
 def get_markets() -> List[str]:
     return _API.get_markets()
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_market_summaries')
 def get_market_summaries() -> List[Dict]:
     return _API.get_market_summaries()
 
@@ -183,5 +183,6 @@ def get_fee() -> float:
     return _API.fee
 
 
+@metrics.timed(metrics.EXCHANGE_SECONDS, 'get_wallet_health')
 def get_wallet_health() -> List[Dict]:
     return _API.get_wallet_health()
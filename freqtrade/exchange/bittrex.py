@@ -5,6 +5,7 @@ from bittrex.bittrex import Bittrex as _Bittrex, API_V2_0, API_V1_1
 from requests.exceptions import ContentDecodingError
 
 from freqtrade import OperationalException
+from freqtrade.candles import get_rows
 from freqtrade.exchange.interface import Exchange
 
 logger = logging.getLogger(__name__)
@@ -132,12 +133,12 @@ class Bittrex(Exchange):
                 message='Got invalid response from bittrex',
                 pair=pair))
 
-        for prop in ['C', 'V', 'O', 'H', 'L', 'T']:
-            for tick in data['result']:
-                if prop not in tick.keys():
-                    raise ContentDecodingError('{message} params=({pair})'.format(
-                        message='Required property {} not present in response'.format(prop),
-                        pair=pair))
+        try:
+            get_rows(data['result'])
+        except ValueError as error:
+            raise ContentDecodingError('{message} params=({pair})'.format(
+                message=error,
+                pair=pair))
 
         if not data['success']:
             Bittrex._validate_response(data)
@@ -0,0 +1,118 @@
+""" Simulated order handling used when dry_run is enabled """
+import logging
+import time
+from itertools import count
+from threading import RLock
+from typing import Dict, Optional
+
+import arrow
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class DryRun():
+    """
+    Keeps track of simulated limit orders.
+    Orders are matched against the latest known ticker of their pair,
+    once an order has been reported as closed it is moved into a small
+    LRU cache, so memory usage stays constant during long dry runs.
+    """
+    # Number of closed orders kept around for repeated lookups
+    CLOSED_ORDERS_CACHE_SIZE = 100
+
+    def __init__(self) -> None:
+        self._lock = RLock()
+        # Seeded with the current time to keep ids unique across restarts
+        self._order_ids = count(int(time.time() * 1000))
+        self._open_orders: Dict[str, Dict] = {}
+        self._closed_orders = LRUCache(maxsize=self.CLOSED_ORDERS_CACHE_SIZE)
+        self._tickers: Dict[str, Dict] = {}
+
+    def update_ticker(self, pair: str, ticker: Dict) -> None:
+        """
+        Stores the given ticker as latest snapshot for the pair
+        :param pair: Pair as str, format: BTC_ETH
+        :param ticker: ticker as returned by exchange.get_ticker()
+        :return: None
+        """
+        with self._lock:
+            self._tickers[pair] = ticker
+
+    def buy(self, pair: str, rate: float, amount: float) -> str:
+        return self._place_order('LIMIT_BUY', pair, rate, amount)
+
+    def sell(self, pair: str, rate: float, amount: float) -> str:
+        return self._place_order('LIMIT_SELL', pair, rate, amount)
+
+    def get_order(self, order_id: str) -> Dict:
+        """
+        Get order details for the given order_id.
+        Open orders are matched against the latest ticker snapshot first.
+        Raises KeyError if the order is unknown.
+        :param order_id: ID as str
+        :return: dict, see Exchange.get_order()
+        """
+        with self._lock:
+            if order_id in self._closed_orders:
+                return dict(self._closed_orders[order_id])
+
+            order = self._open_orders[order_id]
+            self._try_fill(order)
+            if order['closed']:
+                # Evict the order, it will not change anymore
+                del self._open_orders[order_id]
+                self._closed_orders[order_id] = order
+            return dict(order)
+
+    def cancel_order(self, order_id: str) -> None:
+        """
+        Cancels the given order, unknown or closed orders are ignored.
+        :param order_id: ID as str
+        :return: None
+        """
+        with self._lock:
+            self._open_orders.pop(order_id, None)
+
+    @property
+    def open_orders_count(self) -> int:
+        """ Number of orders which have not been filled yet """
+        return len(self._open_orders)
+
+    def _place_order(self, order_type: str, pair: str, rate: float, amount: float) -> str:
+        with self._lock:
+            order_id = 'dry_run_{}_{}'.format(
+                'buy' if order_type == 'LIMIT_BUY' else 'sell',
+                next(self._order_ids)
+            )
+            order = {
+                'id': order_id,
+                'type': order_type,
+                'pair': pair,
+                'rate': rate,
+                'amount': amount,
+                'remaining': amount,
+                'opened': arrow.utcnow().datetime,
+                'closed': None,
+            }
+            self._open_orders[order_id] = order
+            # A marketable limit order is filled right away
+            self._try_fill(order)
+            return order_id
+
+    def _try_fill(self, order: Dict) -> None:
+        """
+        Fills the given order if the latest ticker crosses its limit rate.
+        Without a ticker snapshot the order is filled at its limit rate.
+        """
+        if order['closed']:
+            return
+        ticker: Optional[Dict] = self._tickers.get(order['pair'])
+        if ticker:
+            if order['type'] == 'LIMIT_BUY' and ticker['ask'] > order['rate']:
+                return
+            if order['type'] == 'LIMIT_SELL' and ticker['bid'] < order['rate']:
+                return
+        order['remaining'] = 0.0
+        order['closed'] = arrow.utcnow().datetime
+        logger.debug('Dry run order %s has been filled', order['id'])
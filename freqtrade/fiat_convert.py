@@ -1,5 +1,11 @@
+import json
 import logging
+import os
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from pymarketcap import Pymarketcap
 
 logger = logging.getLogger(__name__)
@@ -8,13 +14,16 @@ logger = logging.getLogger(__name__)
 class CryptoFiat():
     # Constants
     CACHE_DURATION = 6 * 60 * 60  # 6 hours
+    REFRESH_MARGIN = 60 * 60  # Refresh 1 hour before the price expires
 
-    def __init__(self, crypto_symbol: str, fiat_symbol: str, price: float) -> None:
+    def __init__(self, crypto_symbol: str, fiat_symbol: str, price: float,
+                 expiration: Optional[float] = None) -> None:
         """
         Create an object that will contains the price for a crypto-currency in fiat
         :param crypto_symbol: Crypto-currency you want to convert (e.g BTC)
         :param fiat_symbol: FIAT currency you want to convert to (e.g USD)
         :param price: Price in FIAT
+        :param expiration: expiration time of a price fetched earlier (Optional)
         """
 
         # Public attributes
@@ -28,6 +37,8 @@ class CryptoFiat():
         self.crypto_symbol = crypto_symbol.upper()
         self.fiat_symbol = fiat_symbol.upper()
         self.set_price(price=price)
+        if expiration is not None:
+            self._expiration = expiration
 
     def set_price(self, price: float) -> None:
         """
@@ -46,6 +57,13 @@ class CryptoFiat():
         """
         return self._expiration - time.time() <= 0
 
+    def needs_refresh(self) -> bool:
+        """
+        Return if the price expires soon and should be refreshed in the background
+        :return: bool, true if the price expires within REFRESH_MARGIN seconds
+        """
+        return self._expiration - time.time() <= self.REFRESH_MARGIN
+
 
 class CryptoToFiatConverter():
     # Constants
@@ -56,9 +74,21 @@ class CryptoToFiatConverter():
         "RUB", "SEK", "SGD", "THB", "TRY", "TWD", "ZAR", "USD"
     ]
 
-    def __init__(self) -> None:
+    def __init__(self, fiat_symbols: Iterable[str] = (), rates_file: Optional[str] = None) -> None:
+        """
+        :param fiat_symbols: FIAT currencies fetched together with every requested one
+        :param rates_file: path of the rate table kept for offline use (Optional)
+        """
         self._coinmarketcap = Pymarketcap()
-        self._pairs = []
+        self._fiat_symbols = [fiat.upper() for fiat in fiat_symbols]
+        self._rates_file = rates_file
+        # Expired rates from the rate table, only used if the API is unavailable
+        self._offline_pairs: Dict[Tuple[str, str], CryptoFiat] = {}
+        self._pairs: Dict[Tuple[str, str], CryptoFiat] = {}
+        self._lock = RLock()
+        # Prices are refreshed in the background, see get_price()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._refreshing: Dict[Tuple[str, str], Future] = {}
 
     def convert_amount(self, crypto_amount: float, crypto_symbol: str, fiat_symbol: str) -> float:
         """
@@ -73,7 +103,9 @@ class CryptoToFiatConverter():
 
     def get_price(self, crypto_symbol: str, fiat_symbol: str) -> float:
         """
-        Return the price of the Crypto-currency in Fiat
+        Return the price of the Crypto-currency in Fiat.
+        Only the first lookup of a pair waits for the API, prices which expire soon
+        or have expired are returned as they are and refreshed in the background.
         :param crypto_symbol: Crypto-currency you want to convert (e.g BTC)
         :param fiat_symbol: FIAT currency you want to convert to (e.g USD)
         :return: Price in FIAT
@@ -86,29 +118,34 @@ class CryptoToFiatConverter():
             raise ValueError('The fiat {} is not supported.'.format(fiat_symbol))
 
         # Get the pair that interest us and return the price in fiat
-        for pair in self._pairs:
-            if pair.crypto_symbol == crypto_symbol and pair.fiat_symbol == fiat_symbol:
-                # If the price is expired we refresh it, avoid to call the API all the time
-                if pair.is_expired():
-                    pair.set_price(
-                        price=self._find_price(
-                            crypto_symbol=pair.crypto_symbol,
-                            fiat_symbol=pair.fiat_symbol
-                        )
-                    )
-
-                # return the last price we have for this pair
-                return pair.price
+        pair = self._pairs.get((crypto_symbol, fiat_symbol))
+        if pair:
+            # return the last price we have for this pair
+            price = pair.price
+            if pair.needs_refresh():
+                self._refresh_price(pair)
+            return price
 
         # The pair does not exist, so we create it and return the price
-        return self._add_pair(
-            crypto_symbol=crypto_symbol,
-            fiat_symbol=fiat_symbol,
-            price=self._find_price(
+        try:
+            prices = self._find_prices(
                 crypto_symbol=crypto_symbol,
-                fiat_symbol=fiat_symbol
+                fiat_symbols=[fiat_symbol] + self._fiat_symbols
             )
-        )
+        except Exception:
+            pair = self._offline_pairs.get((crypto_symbol, fiat_symbol))
+            if not pair:
+                raise
+            logger.warning('Unable to fetch price of %s in %s, using the last known rate',
+                           crypto_symbol, fiat_symbol)
+            # The price is refreshed in the background on the next lookup
+            self._pairs[(crypto_symbol, fiat_symbol)] = pair
+            return pair.price
+
+        for fiat, price in prices.items():
+            self._add_pair(crypto_symbol=crypto_symbol, fiat_symbol=fiat, price=price)
+        self.save_rates()
+        return prices[fiat_symbol]
 
     def _add_pair(self, crypto_symbol: str, fiat_symbol: str, price: float) -> float:
         """
@@ -116,16 +153,101 @@ class CryptoToFiatConverter():
         :param fiat_symbol: FIAT currency you want to convert to (e.g USD)
         :return: price in FIAT
         """
-        self._pairs.append(
-            CryptoFiat(
-                crypto_symbol=crypto_symbol,
-                fiat_symbol=fiat_symbol,
-                price=price
-            )
+        pair = CryptoFiat(
+            crypto_symbol=crypto_symbol,
+            fiat_symbol=fiat_symbol,
+            price=price
         )
+        self._pairs[(pair.crypto_symbol, pair.fiat_symbol)] = pair
 
         return price
 
+    def _refresh_price(self, pair: CryptoFiat) -> None:
+        """
+        Refreshes the price of the given pair in the background,
+        unless a refresh is in progress already
+        :param pair: pair to refresh
+        :return: None
+        """
+        key = (pair.crypto_symbol, pair.fiat_symbol)
+        with self._lock:
+            future = self._refreshing.get(key)
+            if future and not future.done():
+                return
+            self._refreshing[key] = self._executor.submit(self._update_price, pair)
+
+    def _update_price(self, pair: CryptoFiat) -> None:
+        try:
+            prices = self._find_prices(
+                crypto_symbol=pair.crypto_symbol,
+                fiat_symbols=[pair.fiat_symbol] + self._fiat_symbols
+            )
+        except Exception as error:
+            # The old price is used until the next refresh succeeds
+            logger.warning('Unable to refresh price of %s in %s: %s',
+                           pair.crypto_symbol, pair.fiat_symbol, error)
+            return
+
+        pair.set_price(price=prices.pop(pair.fiat_symbol))
+        for fiat, price in prices.items():
+            self._add_pair(crypto_symbol=pair.crypto_symbol, fiat_symbol=fiat, price=price)
+        self.save_rates()
+
+    def load_rates(self) -> None:
+        """
+        Loads the rate table written by save_rates().
+        Rates which are still valid are used right away,
+        expired rates only if the API is unavailable.
+        :return: None
+        """
+        if not self._rates_file or not os.path.exists(self._rates_file):
+            return
+        try:
+            with open(self._rates_file) as file:
+                rates = json.load(file)
+            pairs = [
+                CryptoFiat(rate['crypto_symbol'], rate['fiat_symbol'], rate['price'],
+                           expiration=rate['expiration'])
+                for rate in rates
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            logger.warning('Unable to load fiat rates from %s: %s', self._rates_file, error)
+            return
+
+        with self._lock:
+            for pair in pairs:
+                key = (pair.crypto_symbol, pair.fiat_symbol)
+                if pair.is_expired():
+                    self._offline_pairs[key] = pair
+                elif key not in self._pairs:
+                    self._pairs[key] = pair
+        logger.info('Loaded %d fiat rates from %s', len(pairs), self._rates_file)
+
+    def save_rates(self) -> None:
+        """
+        Writes all known rates to the rate table, if one has been configured
+        :return: None
+        """
+        if not self._rates_file:
+            return
+        with self._lock:
+            pairs = dict(self._offline_pairs)
+            pairs.update(self._pairs)
+            rates = [{
+                'crypto_symbol': pair.crypto_symbol,
+                'fiat_symbol': pair.fiat_symbol,
+                'price': pair.price,
+                'expiration': pair._expiration,
+            } for pair in pairs.values()]
+            # Replace the file at once, so readers never see a partial table
+            tmp_file = self._rates_file + '.tmp'
+            try:
+                with open(tmp_file, 'w') as file:
+                    json.dump(rates, file)
+                os.replace(tmp_file, self._rates_file)
+            except OSError as error:
+                logger.warning('Unable to save fiat rates to %s: %s', self._rates_file, error)
+
     def _is_supported_fiat(self, fiat: str) -> bool:
         """
         Check if the FIAT your want to convert to is supported
@@ -144,13 +266,67 @@ class CryptoToFiatConverter():
         :param fiat_symbol: FIAT currency you want to convert to (e.g USD)
         :return: float, price of the crypto-currency in Fiat
         """
-        # Check if the fiat convertion you want is supported
-        if not self._is_supported_fiat(fiat=fiat_symbol):
-            raise ValueError('The fiat {} is not supported.'.format(fiat_symbol))
+        return self._find_prices(crypto_symbol, [fiat_symbol])[fiat_symbol.upper()]
 
-        return float(
-            self._coinmarketcap.ticker(
-                currency=crypto_symbol,
-                convert=fiat_symbol
-            )['price_' + fiat_symbol.lower()]
-        )
+    def _find_prices(self, crypto_symbol: str, fiat_symbols: List[str]) -> Dict[str, float]:
+        """
+        Call CoinMarketCap API to retrieve the prices in all given FIAT currencies.
+        Every response contains the price in USD besides the converted one,
+        so up to two currencies are fetched with one request.
+        :param crypto_symbol: Crypto-currency you want to convert (e.g BTC)
+        :param fiat_symbols: FIAT currencies you want to convert to (e.g USD, EUR)
+        :return: dict, format: {'USD': float, 'EUR': float}
+        """
+        fiat_symbols = [fiat.upper() for fiat in fiat_symbols]
+        for fiat_symbol in fiat_symbols:
+            # Check if the fiat convertion you want is supported
+            if not self._is_supported_fiat(fiat=fiat_symbol):
+                raise ValueError('The fiat {} is not supported.'.format(fiat_symbol))
+
+        prices: Dict[str, float] = {}
+        # USD is part of every response, so the other currencies are requested first
+        for fiat_symbol in sorted(set(fiat_symbols), key=lambda fiat: (fiat == 'USD', fiat)):
+            if fiat_symbol in prices:
+                continue
+            ticker = self._coinmarketcap.ticker(currency=crypto_symbol, convert=fiat_symbol)
+            prices[fiat_symbol] = float(ticker['price_' + fiat_symbol.lower()])
+            for fiat in fiat_symbols:
+                if ticker.get('price_' + fiat.lower()) is not None:
+                    prices[fiat] = float(ticker['price_' + fiat.lower()])
+        return prices
+
+
+_CONVERTER: Optional[CryptoToFiatConverter] = None
+_CONVERTER_LOCK = RLock()
+
+# Default location of the rate table
+RATES_FILE = 'fiat_rates.json'
+
+
+def init(config: dict) -> None:
+    """
+    Initializes the shared converter with the configured currency and rate table
+    :param config: config as dict
+    :return: None
+    """
+    global _CONVERTER
+    fiat_symbols = [config['fiat_display_currency']] if 'fiat_display_currency' in config else []
+    converter = CryptoToFiatConverter(
+        fiat_symbols=fiat_symbols,
+        rates_file=config.get('internals', {}).get('fiat_rates_file', RATES_FILE)
+    )
+    converter.load_rates()
+    with _CONVERTER_LOCK:
+        _CONVERTER = converter
+
+
+def get_converter() -> CryptoToFiatConverter:
+    """
+    Returns the converter shared by the whole process, so every price is cached only once
+    :return: CryptoToFiatConverter
+    """
+    global _CONVERTER
+    with _CONVERTER_LOCK:
+        if _CONVERTER is None:
+            _CONVERTER = CryptoToFiatConverter()
+        return _CONVERTER
@@ -8,23 +8,28 @@ import time
 import traceback
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+from threading import Event, Thread
 from typing import Dict, Optional, List
 
 import requests
 from cachetools import cached, TTLCache
 
-from freqtrade import __version__, exchange, persistence, rpc, DependencyException, \
-    OperationalException
+from freqtrade import __version__, exchange, fiat_convert, metrics, persistence, profiler, \
+    rpc, DependencyException, OperationalException
 from freqtrade.analyze import get_signal, SignalType
-from freqtrade.misc import State, get_state, update_state, parse_args, throttle, \
-    load_config
+from freqtrade.misc import State, get_state, update_state, parse_args, load_config
 from freqtrade.persistence import Trade
-from freqtrade.fiat_convert import CryptoToFiatConverter
+from freqtrade.fiat_convert import get_converter
+from freqtrade.scheduler import Scheduler
 
 logger = logging.getLogger('freqtrade')
 
 _CONF = {}
 
+# Candle length in minutes of the ticker history analyzed for buy signals
+TICKER_INTERVAL = 5
+
 
 def refresh_whitelist(whitelist: List[str]) -> List[str]:
     """
@@ -48,52 +53,82 @@ def refresh_whitelist(whitelist: List[str]) -> List[str]:
     return sanitized_whitelist
 
 
-def _process(nb_assets: Optional[int] = 0) -> bool:
+def update_whitelist(nb_assets: Optional[int] = 0) -> None:
     """
-    Queries the persistence layer for open trades and handles them,
-    otherwise a new trade is created.
+    Updates the configured whitelist
     :param: nb_assets: the maximum number of pairs to be traded at the same time
-    :return: True if a trade has been created or closed, False otherwise
+    :return: None
+    """
+    # Refresh whitelist based on wallet maintenance
+    sanitized_list = refresh_whitelist(
+        gen_pair_whitelist(
+            _CONF['stake_currency']
+        ) if nb_assets else _CONF['exchange']['pair_whitelist']
+    )
+
+    # Keep only the subsets of pairs wanted (up to nb_assets)
+    final_list = sanitized_list[:nb_assets] if nb_assets else sanitized_list
+    _CONF['exchange']['pair_whitelist'] = final_list
+
+
+def process_exits() -> bool:
+    """
+    Updates the open trades with their order values and sells them if possible.
+    :return: True if a trade has been closed, False otherwise
     """
+    with persistence.unit_of_work():
+        if _CONF.get('internals', {}).get('check_open_trades'):
+            persistence.check_open_trades()
+        persistence.check_archive()
+
+    # Get open trades from persistence layer
+    return handle_open_trades(persistence.get_open_trades())
+
+
+def process_entries(nb_assets: Optional[int] = 0) -> bool:
+    """
+    Refreshes the whitelist and creates new trades as long as there are buy signals,
+    as this runs only once per candle
+    :param: nb_assets: the maximum number of pairs to be traded at the same time
+    :return: True if a trade has been created, False otherwise
+    """
+    update_whitelist(nb_assets)
     state_changed = False
     try:
-        # Refresh whitelist based on wallet maintenance
-        sanitized_list = refresh_whitelist(
-            gen_pair_whitelist(
-                _CONF['stake_currency']
-            ) if nb_assets else _CONF['exchange']['pair_whitelist']
+        while len(persistence.get_open_trades()) < _CONF['max_open_trades']:
+            # Create entity and execute trade
+            if not create_trade(float(_CONF['stake_amount'])):
+                break
+            state_changed = True
+    except DependencyException as exception:
+        logger.warning('Unable to create trade: %s', exception)
+        return state_changed
+
+    if not state_changed and len(persistence.get_open_trades()) < _CONF['max_open_trades']:
+        logger.info(
+            'Checked all whitelisted currencies. '
+            'Found no suitable entry positions for buying. Will keep looking ...'
         )
+    return state_changed
 
-        # Keep only the subsets of pairs wanted (up to nb_assets)
-        final_list = sanitized_list[:nb_assets] if nb_assets else sanitized_list
-        _CONF['exchange']['pair_whitelist'] = final_list
-
-        # Query trades from persistence layer
-        trades = Trade.query.filter(Trade.is_open.is_(True)).all()
-        if len(trades) < _CONF['max_open_trades']:
-            try:
-                # Create entity and execute trade
-                state_changed = create_trade(float(_CONF['stake_amount']))
-                if not state_changed:
-                    logger.info(
-                        'Checked all whitelisted currencies. '
-                        'Found no suitable entry positions for buying. Will keep looking ...'
-                    )
-            except DependencyException as exception:
-                logger.warning('Unable to create trade: %s', exception)
-
-        for trade in trades:
-            # Get order details for actual price per unit
-            if trade.open_order_id:
-                # Update trade with order values
-                logger.info('Got open order for %s', trade)
-                trade.update(exchange.get_order(trade.open_order_id))
-
-            if trade.is_open and trade.open_order_id is None:
-                # Check if we can sell our current pair
-                state_changed = handle_trade(trade) or state_changed
-
-            Trade.session.flush()
+
+@metrics.timed(metrics.PROCESS_SECONDS)
+def _process(nb_assets: Optional[int] = 0,
+             scan_entries: bool = True,
+             handle_exits: bool = True) -> bool:
+    """
+    Handles the open trades, afterwards a new trade is created if possible.
+    :param: nb_assets: the maximum number of pairs to be traded at the same time
+    :param: scan_entries: if False no new trade is created
+    :param: handle_exits: if False open trades are not handled
+    :return: True if a trade has been created or closed, False otherwise
+    """
+    state_changed = False
+    try:
+        if handle_exits:
+            state_changed = process_exits()
+        if scan_entries:
+            state_changed = process_entries(nb_assets) or state_changed
     except (requests.exceptions.RequestException, json.JSONDecodeError) as error:
         logger.warning(
             'Got %s in _process(), retrying in 30 seconds...',
@@ -110,6 +145,33 @@ def _process(nb_assets: Optional[int] = 0) -> bool:
     return state_changed
 
 
+def handle_open_trades(trades: List[Trade]) -> bool:
+    """
+    Updates the trades with their order values and sells them if possible.
+    The exchange is queried outside of any unit of work, so the session is only
+    held while a single trade is changed.
+    :param trades: open trades
+    :return: True if a trade has been closed, False otherwise
+    """
+    state_changed = False
+    for trade in trades:
+        # Get order details for actual price per unit
+        order_id = trade.open_order_id
+        if order_id:
+            logger.info('Got open order for %s', trade)
+            order = exchange.get_order(order_id)
+            with persistence.unit_of_work():
+                # The trade may have been sold by /forcesell in the meantime
+                if trade.is_open and trade.open_order_id == order_id:
+                    # Update trade with order values
+                    trade.update(order)
+
+        if trade.is_open and trade.open_order_id is None:
+            # Check if we can sell our current pair
+            state_changed = handle_trade(trade) or state_changed
+    return state_changed
+
+
 def execute_sell(trade: Trade, limit: float) -> None:
     """
     Executes a limit sell for the given trade and limit
@@ -133,7 +195,7 @@ def execute_sell(trade: Trade, limit: float) -> None:
 
     # For regular case, when the configuration exists
     if 'stake_currency' in _CONF and 'fiat_display_currency' in _CONF:
-        fiat_converter = CryptoToFiatConverter()
+        fiat_converter = get_converter()
         profit_fiat = fiat_converter.convert_amount(
             profit_trade,
             _CONF['stake_currency'],
@@ -155,9 +217,9 @@ def execute_sell(trade: Trade, limit: float) -> None:
             profit_coin=profit_trade
         )
 
-    # Send the message
-    rpc.send_msg(message)
-    Trade.session.flush()
+    # Send the message once the sell order has been stored
+    persistence.on_commit(partial(rpc.send_msg, message))
+    persistence.flush()
 
 
 def min_roi_reached(trade: Trade, current_rate: float, current_time: datetime) -> bool:
@@ -189,25 +251,39 @@ def handle_trade(trade: Trade) -> bool:
         raise ValueError('attempt to handle closed trade: {}'.format(trade))
 
     logger.debug('Handling %s ...', trade)
+    order_id = trade.open_order_id
     current_rate = exchange.get_ticker(trade.pair)['bid']
 
     # Check if minimal roi has been reached
     if min_roi_reached(trade, current_rate, datetime.utcnow()):
         logger.debug('Executing sell due to ROI ...')
-        execute_sell(trade, current_rate)
-        return True
+        return _sell_open_trade(trade, current_rate, order_id)
 
     # Check if sell signal has been enabled and triggered
     if _CONF.get('experimental', {}).get('use_sell_signal'):
         logger.debug('Checking sell_signal ...')
         if get_signal(trade.pair, SignalType.SELL):
             logger.debug('Executing sell due to sell signal ...')
-            execute_sell(trade, current_rate)
-            return True
+            return _sell_open_trade(trade, current_rate, order_id)
 
     return False
 
 
+def _sell_open_trade(trade: Trade, limit: float, order_id: Optional[str]) -> bool:
+    """
+    Sells the given trade within its own unit of work,
+    unless it has been sold or got another order in the meantime
+    :param order_id: open order of the trade when the exchange has been queried
+    :return: True if the trade has been sold, False otherwise
+    """
+    with persistence.unit_of_work():
+        if not trade.is_open or trade.open_order_id != order_id:
+            logger.info('Not selling %s, it has been changed in the meantime', trade)
+            return False
+        execute_sell(trade, limit)
+    return True
+
+
 def get_target_bid(ticker: Dict[str, float]) -> float:
     """ Calculates bid target between current ask price and last price """
     if ticker['ask'] < ticker['last']:
@@ -223,6 +299,26 @@ def create_trade(stake_amount: float) -> bool:
     :param stake_amount: amount of btc to spend
     :return: True if a trade object has been created and persisted, False otherwise
     """
+    pair = get_buy_pair(stake_amount)
+    if not pair:
+        return False
+
+    # The signals are analyzed without blocking the exit loop,
+    # so the open trades are checked again before buying
+    with persistence.unit_of_work():
+        if persistence.get_open_trades_by_pair(pair):
+            logger.info('Not buying %s, a trade has been opened in the meantime', pair)
+            return False
+        execute_buy(pair, stake_amount)
+    return True
+
+
+def get_buy_pair(stake_amount: float) -> Optional[str]:
+    """
+    Checks the buy signals of all whitelisted pairs without an open trade
+    :param stake_amount: amount of btc to spend
+    :return: the first pair with a buy signal, None if there is none
+    """
     logger.info(
         'Checking buy signals to create a new trade with stake_amount: %f ...',
         stake_amount
@@ -235,10 +331,10 @@ def create_trade(stake_amount: float) -> bool:
         )
 
     # Remove currently opened and latest pairs from whitelist
-    for trade in Trade.query.filter(Trade.is_open.is_(True)).all():
-        if trade.pair in whitelist:
-            whitelist.remove(trade.pair)
-            logger.debug('Ignoring %s in pair whitelist', trade.pair)
+    for pair in copy.copy(whitelist):
+        if persistence.get_open_trades_by_pair(pair):
+            whitelist.remove(pair)
+            logger.debug('Ignoring %s in pair whitelist', pair)
     if not whitelist:
         raise DependencyException('No pair in whitelist')
 
@@ -252,25 +348,24 @@ def create_trade(stake_amount: float) -> bool:
     loop = asyncio.get_event_loop()
     signals = loop.run_until_complete(asyncio.gather(*awaitable_signals))
 
-    for idx, _pair in enumerate(whitelist):
+    for idx, pair in enumerate(whitelist):
         if signals[idx]:
-            pair = _pair
-            break
-    else:
-        return False
+            return pair
+    return None
 
+
+def execute_buy(pair: str, stake_amount: float) -> None:
+    """
+    Executes a limit buy for the given pair and creates the trade record
+    :param pair: pair to buy
+    :param stake_amount: amount of btc to spend
+    :return: None
+    """
     # Calculate amount
     buy_limit = get_target_bid(exchange.get_ticker(pair))
     amount = stake_amount / buy_limit
 
     order_id = exchange.buy(pair, buy_limit, amount)
-    # Create trade entity and return
-    rpc.send_msg('*{}:* Buying [{}]({}) with limit `{:.8f}`'.format(
-        exchange.get_name().upper(),
-        pair.replace('_', '/'),
-        exchange.get_pair_detail_url(pair),
-        buy_limit
-    ))
     # Fee is applied twice because we make a LIMIT_BUY and LIMIT_SELL
     trade = Trade(
         pair=pair,
@@ -284,7 +379,15 @@ def create_trade(stake_amount: float) -> bool:
     )
     Trade.session.add(trade)
     Trade.session.flush()
-    return True
+    persistence.register_trade(trade)
+    # Send the message once the buy order has been stored
+    message = '*{}:* Buying [{}]({}) with limit `{:.8f}`'.format(
+        exchange.get_name().upper(),
+        pair.replace('_', '/'),
+        exchange.get_pair_detail_url(pair),
+        buy_limit
+    )
+    persistence.on_commit(partial(rpc.send_msg, message))
 
 
 def init(config: dict, db_url: Optional[str] = None) -> None:
@@ -295,9 +398,11 @@ def init(config: dict, db_url: Optional[str] = None) -> None:
     :return: None
     """
     # Initialize all modules
+    metrics.init(config)
     rpc.init(config)
     persistence.init(config, db_url)
     exchange.init(config)
+    fiat_convert.init(config)
 
     # Set initial application state
     initial_state = config.get('initial_state')
@@ -307,7 +412,11 @@ def init(config: dict, db_url: Optional[str] = None) -> None:
         update_state(State.STOPPED)
 
 
-@cached(TTLCache(maxsize=1, ttl=1800))
+_WHITELIST_CACHE = TTLCache(maxsize=1, ttl=1800)
+
+
+@metrics.count_cache(_WHITELIST_CACHE, 'gen_pair_whitelist')
+@cached(_WHITELIST_CACHE)
 def gen_pair_whitelist(base_currency: str, key: str = 'BaseVolume') -> List[str]:
     """
     Updates the whitelist with with a dynamically generated list
@@ -334,9 +443,94 @@ def cleanup() -> None:
     update_state(State.STOPPED)
     persistence.cleanup()
     rpc.cleanup()
+    metrics.cleanup()
     exit(0)
 
 
+def update_dry_run_db(args) -> None:
+    """
+    Applies the dry run database options given on the command line to the config
+    :param args: parsed command line arguments
+    :return: None
+    """
+    # If the user ask for Dry run with a local DB instead of memory
+    if args.dry_run_db:
+        if _CONF.get('dry_run', False):
+            _CONF.update({'dry_run_db': True})
+            logger.info(
+                'Dry_run will use the DB file: "tradesv3.dry_run.sqlite". (--dry_run_db detected)'
+            )
+        else:
+            logger.info('Dry run is disabled. (--dry_run_db ignored)')
+
+    # If the user ask for Dry run in memory with snapshots to disk
+    if args.dry_run_snapshot:
+        if _CONF.get('dry_run', False):
+            _CONF.update({'dry_run_snapshot': True})
+            logger.info(
+                'Dry_run will snapshot its DB to "tradesv3.dry_run.sqlite". '
+                '(--dry-run-snapshot detected)'
+            )
+        else:
+            logger.info('Dry run is disabled. (--dry-run-snapshot ignored)')
+
+
+def create_scheduler(nb_assets: Optional[int] = 0) -> Scheduler:
+    """
+    Schedules the entry scan just after every candle close,
+    open trades are handled by _ExitLoop
+    :param nb_assets: the maximum number of pairs to be traded at the same time
+    :return: Scheduler
+    """
+    scheduler = Scheduler()
+    scheduler.add_job(
+        'entries',
+        partial(_process, nb_assets=nb_assets, handle_exits=False),
+        interval=TICKER_INTERVAL * 60,
+        offset=_CONF.get('internals', {}).get('candle_delay_secs', 5),
+        align=True,
+    )
+    return scheduler
+
+
+class _ExitLoop(Thread):
+    """
+    Handles the open trades every process_throttle_secs, independent of the entry scan.
+    Both loops and the telegram handlers use the session only within a unit of work
+    or through the functions of freqtrade.persistence, which serializes them.
+    """
+    def __init__(self) -> None:
+        super().__init__(name='exit-loop', daemon=True)
+        self._stopped = Event()
+        self.scheduler = Scheduler(sleep=self._stopped.wait)
+        self.scheduler.add_job(
+            'exits',
+            partial(_process, scan_entries=False),
+            interval=_CONF.get('internals', {}).get('process_throttle_secs', 10),
+        )
+
+    def run(self) -> None:
+        try:
+            while not self._stopped.is_set():
+                if get_state() == State.RUNNING:
+                    self.scheduler.run_pending()
+                # Wake up at least every second to notice state changes
+                self.scheduler.sleep(max_secs=1)
+        except BaseException:
+            # Do not keep buying without anybody watching the open trades
+            logger.exception('Got fatal exception in exit loop! Stopping trader ...')
+            update_state(State.STOPPED)
+
+    def stop(self, timeout: float = 60.0) -> None:
+        """
+        Stops the loop once the current iteration is done
+        :param timeout: maximum seconds to wait for the current iteration
+        :return: None
+        """
+        self._stopped.set()
+        self.join(timeout)
+
+
 def main() -> None:
     """
     Loads and validates the config and handles the main loop
@@ -366,41 +560,43 @@ def main() -> None:
     if args.dynamic_whitelist:
         logger.info('Using dynamically generated whitelist. (--dynamic-whitelist detected)')
 
-    # If the user ask for Dry run with a local DB instead of memory
-    if args.dry_run_db:
-        if _CONF.get('dry_run', False):
-            _CONF.update({'dry_run_db': True})
-            logger.info(
-                'Dry_run will use the DB file: "tradesv3.dry_run.sqlite". (--dry_run_db detected)'
-            )
-        else:
-            logger.info('Dry run is disabled. (--dry_run_db ignored)')
-
-    try:
-        init(_CONF)
-        old_state = None
-        while True:
-            new_state = get_state()
-            # Log state transition
-            if new_state != old_state:
-                rpc.send_msg('*Status:* `{}`'.format(new_state.name.lower()))
-                logger.info('Changing state to: %s', new_state.name)
-
-            if new_state == State.STOPPED:
-                time.sleep(1)
-            elif new_state == State.RUNNING:
-                throttle(
-                    _process,
-                    min_secs=_CONF['internals'].get('process_throttle_secs', 10),
-                    nb_assets=args.dynamic_whitelist,
-                )
-            old_state = new_state
-    except KeyboardInterrupt:
-        logger.info('Got SIGINT, aborting ...')
-    except BaseException:
-        logger.exception('Got fatal exception!')
-    finally:
-        cleanup()
+    update_dry_run_db(args)
+
+    # Profiles the loop iterations if enabled, the summary is logged on exit
+    with profiler.profiling(args.profile):
+        scheduler = None
+        exit_loop = None
+        try:
+            init(_CONF)
+            scheduler = create_scheduler(args.dynamic_whitelist)
+            exit_loop = _ExitLoop()
+            exit_loop.start()
+            old_state = None
+            while True:
+                new_state = get_state()
+                # Log state transition
+                if new_state != old_state:
+                    rpc.send_msg('*Status:* `{}`'.format(new_state.name.lower()))
+                    logger.info('Changing state to: %s', new_state.name)
+
+                if new_state == State.STOPPED:
+                    time.sleep(1)
+                elif new_state == State.RUNNING:
+                    scheduler.run_pending()
+                    # Wake up at least every second to notice state changes
+                    scheduler.sleep(max_secs=1)
+                old_state = new_state
+        except KeyboardInterrupt:
+            logger.info('Got SIGINT, aborting ...')
+        except BaseException:
+            logger.exception('Got fatal exception!')
+        finally:
+            if exit_loop:
+                exit_loop.stop()
+                logger.info('Exit loop stats: %s', exit_loop.scheduler.get_stats())
+            if scheduler:
+                logger.info('Entry loop stats: %s', scheduler.get_stats())
+            cleanup()
 
 
 if __name__ == '__main__':
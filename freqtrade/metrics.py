@@ -0,0 +1,294 @@
+"""
+Runtime metrics of the bot, served in the prometheus text format
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import RLock, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from cachetools.keys import hashkey
+
+logger = logging.getLogger(__name__)
+
+_SERVER: Optional[HTTPServer] = None
+
+# All metrics in the order they have been created
+_REGISTRY: List['_Metric'] = []
+
+
+class _Metric(ABC):
+    """ Base class of all metrics, values are kept per combination of label values """
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        """
+        :param name: metric name, e.g. freqtrade_process_seconds
+        :param documentation: help text
+        :param labelnames: names of the labels, values are passed positionally
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = RLock()
+        _REGISTRY.append(self)
+
+    def collect(self) -> List[str]:
+        """
+        Returns the exposition lines of this metric
+        :return: list of lines
+        """
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} {}'.format(self.name, self.TYPE),
+        ]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """
+        Returns the sample lines of this metric, called with the lock held
+        :return: list of lines
+        """
+
+    def _format(self, suffix: str, labels: Tuple[str, ...], value: float,
+                extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = tuple(zip(self.labelnames, labels)) + extra
+        label_str = ','.join('{}="{}"'.format(name, _escape(value)) for name, value in pairs)
+        return '{}{}{} {}'.format(
+            self.name, suffix, '{' + label_str + '}' if label_str else '', _format_value(value)
+        )
+
+
+class Counter(_Metric):
+    """ Monotonically increasing value, e.g. number of requests """
+    TYPE = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        return [self._format('_total', labels, value) for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """ Value which can go up and down, e.g. number of open trades """
+    TYPE = 'gauge'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Calculates the value whenever the metrics are collected
+        :param function: returns the current value
+        :return: None
+        """
+        self._function = function
+
+    def get(self, *labels: str) -> float:
+        if self._function:
+            return self._function()
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        if self._function:
+            return [self._format('', (), self._function())]
+        return [self._format('', labels, value) for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """ Distribution of observed values, e.g. durations in seconds """
+    TYPE = 'histogram'
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                       30.0, 60.0)
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._buckets = tuple(sorted(buckets))
+        # Per label values: [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [0] * (len(self._buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """ Observes the duration of the block in seconds """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start, *labels)
+
+    def get_count(self, *labels: str) -> int:
+        values = self._values.get(labels)
+        return sum(values[:-1]) if values else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for labels, values in self._values.items():
+            count = 0
+            for bound, bucket_count in zip(self._buckets + (float('inf'),), values):
+                count += bucket_count
+                bucket = (('le', _format_value(bound)),)
+                lines.append(self._format('_bucket', labels, count, bucket))
+            lines.append(self._format('_sum', labels, values[-1]))
+            lines.append(self._format('_count', labels, count))
+        return lines
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator observing the duration of every call in the given histogram
+    :param histogram: Histogram
+    :param labels: label values
+    :return: decorator
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.time() - start, *labels)
+        return wrapper
+    return decorator
+
+
+def count_cache(cache: Any, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Decorator counting hits and misses of a function decorated with cachetools.cached.
+    Must be applied on top of @cached with the same cache and the default key.
+    :param cache: the cache used by @cached
+    :param name: value of the cache label
+    :return: decorator
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            CACHE_REQUESTS.inc(name, 'hit' if hashkey(*args, **kwargs) in cache else 'miss')
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def generate_latest() -> str:
+    """
+    Returns all metrics in the prometheus text format
+    :return: str
+    """
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = generate_latest().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=W0622
+        logger.debug(format, *args)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def init(config: dict) -> None:
+    """
+    Starts serving the metrics over http if enabled
+    :param config: config to use
+    :return: None
+    """
+    global _SERVER
+    metrics_config = config.get('metrics', {})
+    cleanup()
+    if not metrics_config.get('enabled', False):
+        return
+
+    address = (
+        metrics_config.get('listen_ip', '127.0.0.1'),
+        metrics_config.get('listen_port', 8090)
+    )
+    _SERVER = _Server(address, _Handler)
+    Thread(target=_SERVER.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info('Serving metrics on http://%s:%s/metrics', *_SERVER.server_address[:2])
+
+
+def cleanup() -> None:
+    """
+    Stops serving the metrics
+    :return: None
+    """
+    global _SERVER
+    if _SERVER:
+        _SERVER.shutdown()
+        _SERVER.server_close()
+        _SERVER = None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+PROCESS_SECONDS = Histogram(
+    'freqtrade_process_seconds', 'Duration of one iteration of the trading loop')
+SIGNAL_SECONDS = Histogram(
+    'freqtrade_get_signal_seconds', 'Duration of the signal calculation of one pair')
+ANALYZE_SECONDS = Histogram(
+    'freqtrade_analyze_ticker_seconds', 'Duration of the indicator calculation of one pair')
+EXCHANGE_SECONDS = Histogram(
+    'freqtrade_exchange_request_seconds', 'Duration of exchange requests', ('endpoint',))
+DB_QUERY_SECONDS = Histogram(
+    'freqtrade_db_query_seconds', 'Duration of database statements', ('statement', 'table'))
+CACHE_REQUESTS = Counter(
+    'freqtrade_cache_requests', 'Cache lookups by cache and result', ('cache', 'result'))
+OPEN_TRADES = Gauge(
+    'freqtrade_open_trades', 'Number of open trades')
+LOOP_LAG = Gauge(
+    'freqtrade_loop_lag_seconds', 'Delay of the last loop iteration behind its schedule',
+    ('loop',))
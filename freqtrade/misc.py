@@ -1,15 +1,15 @@
 import argparse
 import enum
+import importlib
 import json
 import logging
-import time
-from typing import Any, Callable, List, Dict
+from typing import Callable, List, Dict
 
 from jsonschema import validate, Draft4Validator
 from jsonschema.exceptions import best_match, ValidationError
 from wrapt import synchronized
 
-from freqtrade import __version__
+from freqtrade import __version__, profiler
 
 logger = logging.getLogger(__name__)
 
@@ -64,23 +64,6 @@ def load_config(path: str) -> Dict:
         )
 
 
-def throttle(func: Callable[..., Any], min_secs: float, *args, **kwargs) -> Any:
-    """
-    Throttles the given callable that it
-    takes at least `min_secs` to finish execution.
-    :param func: Any callable
-    :param min_secs: minimum execution time in seconds
-    :return: Any
-    """
-    start = time.time()
-    result = func(*args, **kwargs)
-    end = time.time()
-    duration = max(min_secs - (end - start), 0.0)
-    logger.debug('Throttling %s for %.2f seconds', func.__name__, duration)
-    time.sleep(duration)
-    return result
-
-
 def parse_args(args: List[str]):
     """
     Parses given arguments and returns an argparse Namespace instance.
@@ -126,6 +109,23 @@ def parse_args(args: List[str]):
         action='store_true',
         dest='dry_run_db',
     )
+    parser.add_argument(
+        '--dry-run-snapshot',
+        help='Keep the dry run DB in memory and snapshot it to "tradesv3.dry_run.sqlite" \
+             periodically and on exit. Work only if dry_run is enabled.',  # noqa
+        action='store_true',
+        dest='dry_run_snapshot',
+    )
+    parser.add_argument(
+        '--profile',
+        help='sample the trading loop, backtesting or hyperopt epochs and write profiles \
+             to "profiles/", one per INT loop iterations or epochs (default: 1)',
+        dest='profile',
+        const=1,
+        type=int,
+        metavar='INT',
+        nargs='?',
+    )
     build_subcommands(parser)
     parsed_args = parser.parse_args(args)
 
@@ -133,19 +133,32 @@ def parse_args(args: List[str]):
     if not hasattr(parsed_args, 'func'):
         return parsed_args
 
-    parsed_args.func(parsed_args)
+    with profiler.profiling(parsed_args.profile):
+        parsed_args.func(parsed_args)
     return None
 
 
+def _lazy_start(module: str) -> Callable[[argparse.Namespace], None]:
+    """
+    Returns a function calling start() of the given subcommand module.
+    The module and its dependencies are only imported if the subcommand is run.
+    :param module: name of the module
+    :return: function
+    """
+    def start(args: argparse.Namespace) -> None:
+        importlib.import_module(module).start(args)
+    return start
+
+
 def build_subcommands(parser: argparse.ArgumentParser) -> None:
     """ Builds and attaches all subcommands """
-    from freqtrade.optimize import backtesting, hyperopt
+    from freqtrade import benchmark
 
     subparsers = parser.add_subparsers(dest='subparser')
 
     # Add backtesting subcommand
     backtesting_cmd = subparsers.add_parser('backtesting', help='backtesting module')
-    backtesting_cmd.set_defaults(func=backtesting.start)
+    backtesting_cmd.set_defaults(func=_lazy_start('freqtrade.optimize.backtesting'))
     backtesting_cmd.add_argument(
         '-l', '--live',
         action='store_true',
@@ -173,10 +186,23 @@ def build_subcommands(parser: argparse.ArgumentParser) -> None:
         action='store_true',
         dest='refresh_pairs',
     )
+    backtesting_cmd.add_argument(
+        '--compact',
+        help='store the indicators with single precision to use less memory',
+        action='store_true',
+        dest='compact',
+    )
+    backtesting_cmd.add_argument(
+        '--chunk-size',
+        help='analyze one pair after the other in chunks of INT candles to use less memory',
+        dest='chunk_size',
+        type=int,
+        metavar='INT',
+    )
 
     # Add hyperopt subcommand
     hyperopt_cmd = subparsers.add_parser('hyperopt', help='hyperopt module')
-    hyperopt_cmd.set_defaults(func=hyperopt.start)
+    hyperopt_cmd.set_defaults(func=_lazy_start('freqtrade.optimize.hyperopt'))
     hyperopt_cmd.add_argument(
         '-e', '--epochs',
         help='specify number of epochs (default: 100)',
@@ -199,6 +225,61 @@ def build_subcommands(parser: argparse.ArgumentParser) -> None:
         type=int,
         metavar='INT',
     )
+    hyperopt_cmd.add_argument(
+        '--compact',
+        help='store the indicators with single precision to use less memory',
+        action='store_true',
+        dest='compact',
+    )
+
+    # Add benchmark subcommand
+    benchmark_cmd = subparsers.add_parser('benchmark', help='benchmark module')
+    benchmark_cmd.set_defaults(func=_lazy_start('freqtrade.benchmark'))
+    benchmark_cmd.add_argument(
+        'benchmarks',
+        help='benchmarks to run (default: all)',
+        nargs='*',
+        choices=list(benchmark.BENCHMARKS),
+        metavar='BENCHMARK',
+    )
+    benchmark_cmd.add_argument(
+        '-n', '--repeat',
+        help='specify number of timed runs per benchmark (default: 5)',
+        dest='repeat',
+        default=5,
+        type=int,
+        metavar='INT',
+    )
+    benchmark_cmd.add_argument(
+        '-e', '--epochs',
+        help='specify number of hyperopt epochs per run (default: 10)',
+        dest='epochs',
+        default=10,
+        type=int,
+        metavar='INT',
+    )
+    benchmark_cmd.add_argument(
+        '--trades',
+        help='specify number of closed trades in the database (default: 5000)',
+        dest='trades',
+        default=5000,
+        type=int,
+        metavar='INT',
+    )
+    benchmark_cmd.add_argument(
+        '--export',
+        help='write the results to PATH (default: {})'.format(benchmark.RESULTS_FILE),
+        dest='export',
+        default=benchmark.RESULTS_FILE,
+        metavar='PATH',
+    )
+    benchmark_cmd.add_argument(
+        '--compare',
+        help='compare with the results of an earlier run stored in PATH',
+        dest='compare',
+        default=None,
+        metavar='PATH',
+    )
 
 
 # Required json-schema for user specified config
@@ -246,11 +327,26 @@ CONF_SCHEMA = {
             },
             'required': ['enabled', 'token', 'chat_id']
         },
+        'metrics': {
+            'type': 'object',
+            'properties': {
+                'enabled': {'type': 'boolean'},
+                'listen_ip': {'type': 'string'},
+                'listen_port': {'type': 'integer', 'minimum': 1, 'maximum': 65535},
+            },
+            'required': ['enabled']
+        },
         'initial_state': {'type': 'string', 'enum': ['running', 'stopped']},
         'internals': {
             'type': 'object',
             'properties': {
-                'process_throttle_secs': {'type': 'number'}
+                'process_throttle_secs': {'type': 'number'},
+                'candle_delay_secs': {'type': 'number', 'minimum': 0},
+                'check_open_trades': {'type': 'boolean'},
+                'write_behind': {'type': 'boolean'},
+                'dry_run_snapshot_secs': {'type': 'number', 'minimum': 0},
+                'archive_trades_days': {'type': 'number', 'minimum': 0},
+                'fiat_rates_file': {'type': 'string'}
             }
         }
     },
@@ -3,21 +3,38 @@
 import logging
 import json
 import os
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Iterator, Tuple
+import numpy as np
+from cachetools import LRUCache, cached
 from pandas import DataFrame
 from freqtrade.exchange import get_ticker_history
 from freqtrade.optimize.hyperopt_conf import hyperopt_optimize_conf
 from freqtrade.analyze import populate_indicators, parse_ticker_dataframe
+from freqtrade.resample import resample_ticker_history
 
 logger = logging.getLogger(__name__)
 
+# Ticker intervals downloaded from the exchange, all others are derived from 1 min candles
+DOWNLOAD_INTERVALS = [1]
+DERIVED_INTERVALS = [5]
+
+# Columns which compact_dataframe() keeps in double precision
+EXACT_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Maximum number of derived candles kept in memory, about 100 MB
+RESAMPLE_CACHE_CANDLES = 200000
+# Derived ticker histories by source file, its modification time and the ticker interval.
+# Histories larger than the whole cache are not cached at all.
+_RESAMPLE_CACHE: LRUCache = LRUCache(maxsize=RESAMPLE_CACHE_CANDLES, getsizeof=len)
+
 
 def load_data(ticker_interval: int = 5, pairs: Optional[List[str]] = None,
-              refresh_pairs: Optional[bool] = False) -> Dict[str, List]:
+              refresh_pairs: Optional[bool] = False, cache: bool = True) -> Dict[str, List]:
     """
     Loads ticker history data for the given parameters
     :param ticker_interval: ticker interval in minutes
     :param pairs: list of pairs
+    :param cache: keep derived ticker histories in memory, see load_resampled()
     :return: dict
     """
     path = testdata_path()
@@ -36,20 +53,89 @@ def load_data(ticker_interval: int = 5, pairs: Optional[List[str]] = None,
             pair=pair,
             ticker_interval=ticker_interval,
         )
-        # The file does not exist we download it
-        if not os.path.isfile(file):
-            download_backtesting_testdata(pair=pair, interval=ticker_interval)
-
-        # Read the file, load the json
-        with open(file) as tickerdata:
-            result[pair] = json.load(tickerdata)
+        if os.path.isfile(file):
+            # Read the file, load the json
+            with open(file) as tickerdata:
+                result[pair] = json.load(tickerdata)
+            continue
+
+        # The file does not exist, it is derived from the 1 min candles
+        source = '{abspath}/{pair}-1.json'.format(abspath=path, pair=pair)
+        if not os.path.isfile(source):
+            download_backtesting_testdata(pair=pair, interval=1)
+        result[pair] = load_resampled(source, ticker_interval, cache)
     return result
 
 
-def preprocess(tickerdata: Dict[str, List]) -> Dict[str, DataFrame]:
-    """Creates a dataframe and populates indicators for given ticker data"""
-    return {pair: populate_indicators(parse_ticker_dataframe(pair_data))
-            for pair, pair_data in tickerdata.items()}
+def iter_data(ticker_interval: int = 5,
+              pairs: Optional[List[str]] = None) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    Loads the ticker history of one pair after the other, see load_data().
+    Derived ticker histories are not cached, so only one pair is kept in memory.
+    :param ticker_interval: ticker interval in minutes
+    :param pairs: list of pairs
+    :return: iterator of (pair, list of candles)
+    """
+    for pair in pairs or hyperopt_optimize_conf()['exchange']['pair_whitelist']:
+        yield pair, load_data(ticker_interval=ticker_interval, pairs=[pair], cache=False)[pair]
+
+
+def load_resampled(file: str, ticker_interval: int, cache: bool = True) -> List[Dict]:
+    """
+    Loads the given file of 1 min candles and resamples them to the given ticker interval.
+    The result is cached until the file is modified. Every call returns a new list,
+    but the candles are shared between the callers and must not be modified.
+    :param file: path to the file
+    :param ticker_interval: ticker interval in minutes
+    :param cache: use and fill the cache
+    :return: list of candles
+    """
+    if not cache:
+        return _resample_file(file, ticker_interval)
+    return list(_load_resampled(file, os.path.getmtime(file), ticker_interval))
+
+
+@cached(_RESAMPLE_CACHE)
+def _load_resampled(file: str, mtime: float, ticker_interval: int) -> List[Dict]:
+    return _resample_file(file, ticker_interval)
+
+
+def _resample_file(file: str, ticker_interval: int) -> List[Dict]:
+    logger.info('Resampling %s to %s min ...', file, ticker_interval)
+    with open(file) as tickerdata:
+        return resample_ticker_history(json.load(tickerdata), ticker_interval)
+
+
+def preprocess(tickerdata: Dict[str, List], compact: bool = False) -> Dict[str, DataFrame]:
+    """
+    Creates a dataframe and populates indicators for given ticker data
+    :param tickerdata: dict, format: {pair: list of candles}
+    :param compact: store the indicators with single precision, see compact_dataframe()
+    :return: dict, format: {pair: DataFrame}
+    """
+    processed = {}
+    for pair, pair_data in tickerdata.items():
+        dataframe = populate_indicators(parse_ticker_dataframe(pair_data))
+        processed[pair] = compact_dataframe(dataframe) if compact else dataframe
+    return processed
+
+
+def compact_dataframe(dataframe: DataFrame) -> DataFrame:
+    """
+    Converts the indicator columns to float32 and int32, which halves their memory usage.
+    The rates and volume stay float64 as trades are opened and closed at these rates.
+    :param dataframe: DataFrame with populated indicators
+    :return: DataFrame
+    """
+    dtypes = {}
+    for column, dtype in dataframe.dtypes.items():
+        if column in EXACT_COLUMNS:
+            continue
+        if dtype == np.float64:
+            dtypes[column] = np.float32
+        elif dtype == np.int64:
+            dtypes[column] = np.int32
+    return dataframe.astype(dtypes)
 
 
 def testdata_path() -> str:
@@ -58,11 +144,16 @@ def testdata_path() -> str:
 
 
 def download_pairs(pairs: List[str]) -> bool:
-    """For each pairs passed in parameters, download 1 and 5 ticker intervals"""
+    """
+    For each pairs passed in parameters, download 1 min ticker intervals
+    and derive the 5 min ones from them
+    """
     for pair in pairs:
         try:
-            for interval in [1, 5]:
+            for interval in DOWNLOAD_INTERVALS:
                 download_backtesting_testdata(pair=pair, interval=interval)
+            for interval in DERIVED_INTERVALS:
+                derive_backtesting_testdata(pair=pair, interval=interval)
         except BaseException:
             logger.info('Failed to download the pair: "{pair}", Interval: {interval} min'.format(
                 pair=pair,
@@ -115,3 +206,36 @@ def download_backtesting_testdata(pair: str, interval: int = 5) -> bool:
         json.dump(data, fp)
 
     return True
+
+
+def derive_backtesting_testdata(pair: str, interval: int = 5) -> bool:
+    """
+    Resamples the stored 1 min ticker interval of the given pair and merges it into
+    the file of the given ticker interval. Candles already stored are replaced.
+    :param pair: pair to derive
+    :param interval: ticker interval in minutes
+    :return: bool
+    """
+    path = testdata_path()
+    filepair = pair.replace("-", "_")
+    source = os.path.join(path, '{pair}-1.json'.format(pair=filepair))
+    filename = os.path.join(path, '{pair}-{interval}.json'.format(
+        pair=filepair,
+        interval=interval,
+    ))
+    logger.info('Derive the pair: "{pair}", Interval: {interval} min'.format(
+        pair=pair,
+        interval=interval,
+    ))
+
+    data = {}
+    if os.path.isfile(filename):
+        with open(filename, "rt") as fp:
+            data = {row['T']: row for row in json.load(fp)}
+    for row in load_resampled(source, interval):
+        data[row['T']] = row
+
+    with open(filename, "wt") as fp:
+        json.dump([data[date] for date in sorted(data)], fp)
+
+    return True
@@ -2,22 +2,32 @@
 
 
 import logging
-from typing import Tuple, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import arrow
-from pandas import DataFrame
+import numpy as np
+from pandas import DataFrame, RangeIndex, Series
 from tabulate import tabulate
 
-from freqtrade import exchange
-from freqtrade.analyze import populate_buy_trend, populate_sell_trend
+from freqtrade import exchange, profiler
+from freqtrade.analyze import populate_buy_trend, populate_indicators, populate_sell_trend
+from freqtrade.candles import candles_to_dataframe, decode_candles
 from freqtrade.exchange import Bittrex
 from freqtrade.main import min_roi_reached
 from freqtrade.misc import load_config
-from freqtrade.optimize import load_data, preprocess
+from freqtrade.optimize import compact_dataframe, download_pairs, iter_data, load_data, \
+    preprocess
 from freqtrade.persistence import Trade
 
 logger = logging.getLogger(__name__)
 
+# Allowed deviation of backtests on compact data, see compare_results()
+COMPACT_TOLERANCE = 0.01
+# Candles per chunk of the streaming backtest, see backtest_stream()
+CHUNK_SIZE = 20000
+# Candles before every chunk used to warm up the indicators, see iter_chunks()
+WARMUP_SIZE = 2000
+
 
 def get_timeframe(data: Dict[str, Dict]) -> Tuple[arrow.Arrow, arrow.Arrow]:
     """
@@ -35,35 +45,160 @@ def get_timeframe(data: Dict[str, Dict]) -> Tuple[arrow.Arrow, arrow.Arrow]:
     return arrow.get(min_date), arrow.get(max_date)
 
 
+def calculate_pair_stats(data: Dict[str, Dict], results: DataFrame) -> DataFrame:
+    """
+    Calculates the statistics of every pair and the total in a single grouped pass
+    :param data: dictionary with backtesting data, its pairs are the rows of the result
+    :param results: results dataframe of backtest()
+    :return: DataFrame indexed by pair and 'TOTAL' with the columns
+        count, profit_mean, profit_sum, duration_mean, win_rate, profit_factor
+    """
+    profit = results.profit_BTC.values
+    sums = DataFrame({
+        'currency': results.currency.values,
+        'count': 1,
+        'profit_percent': results.profit_percent.values,
+        'profit_sum': profit,
+        'duration': results.duration.values,
+        'wins': (profit > 0).astype(int),
+        'gross_profit': np.clip(profit, 0, None),
+        'gross_loss': np.clip(-profit, 0, None),
+    }).groupby('currency', sort=False).sum()
+    sums = sums.reindex(list(data)).fillna(0)
+    sums.loc['TOTAL'] = sums.sum()
+
+    count = sums['count'].values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return DataFrame({
+            'count': count.astype(int),
+            'profit_mean': sums.profit_percent.values / count,
+            'profit_sum': sums.profit_sum.values,
+            'duration_mean': sums.duration.values / count,
+            'win_rate': sums.wins.values / count,
+            'profit_factor': sums.gross_profit.values / sums.gross_loss.values,
+        }, index=sums.index, columns=['count', 'profit_mean', 'profit_sum', 'duration_mean',
+                                      'win_rate', 'profit_factor'])
+
+
+def calculate_equity(results: DataFrame) -> Series:
+    """
+    Calculates the equity curve, the cumulated profit after every trade
+    :param results: results dataframe of backtest(), trades are ordered by close_date if given
+    :return: Series indexed by close_date (if given) of the cumulated profit in stake currency
+    """
+    if 'close_date' in results:
+        results = results.sort_values('close_date', kind='mergesort')
+        return Series(results.profit_BTC.cumsum().values, index=results.close_date.values)
+    return Series(results.profit_BTC.cumsum().values)
+
+
+def calculate_max_drawdown(equity: Series) -> Tuple[float, Any, Any]:
+    """
+    Calculates the largest drop of the equity curve from a previous high
+    :param equity: equity curve, see calculate_equity()
+    :return: tuple containing the drawdown in stake currency, index of the high and of the low
+    (the high is None if the drawdown started before the first trade)
+    """
+    values = equity.values
+    if not len(values):
+        return 0.0, None, None
+    # The equity before the first trade is 0
+    highs = np.maximum.accumulate(np.maximum(values, 0))
+    drawdowns = highs - values
+    low = int(np.argmax(drawdowns))
+    if not drawdowns[low]:
+        return 0.0, None, None
+    if highs[low] <= 0:
+        return float(drawdowns[low]), None, equity.index[low]
+    high = int(np.argmax(values[:low + 1]))
+    return float(drawdowns[low]), equity.index[high], equity.index[low]
+
+
+def compare_results(results: DataFrame, reference: DataFrame,
+                    tolerance: float = COMPACT_TOLERANCE) -> bool:
+    """
+    Checks the results of a backtest on compact data against those on double precision data.
+    Single precision indicators may flip a signal which sits right at its threshold,
+    so a few trades may differ. Trades are matched by pair and close date.
+    :param results: results dataframe of backtest() on compact data
+    :param reference: results dataframe of backtest() on double precision data
+    :param tolerance: allowed share of trades which are not matched, and allowed
+        difference of the profit percentages of all pairs and close dates,
+        relative to the summed up absolute profit percentages of the reference
+    :return: True if the results are within the tolerance
+    """
+    trades, reference_trades = _trades_by_close(results).align(
+        _trades_by_close(reference), fill_value=0
+    )
+    trade_diff = int((trades['count'] - reference_trades['count']).abs().sum())
+    profit_diff = float((trades['sum'] - reference_trades['sum']).abs().sum())
+    allowed_trades = tolerance * max(len(reference), 1)
+    allowed_profit = tolerance * float(reference.profit_percent.abs().sum())
+    if trade_diff > allowed_trades or profit_diff > allowed_profit:
+        logger.warning('Compact results differ by %s trades and %.4f profit percent',
+                       trade_diff, profit_diff)
+        return False
+    return True
+
+
+def _trades_by_close(results: DataFrame) -> DataFrame:
+    return results.groupby(['currency', 'close_date']).profit_percent.agg(['count', 'sum'])
+
+
 def generate_text_table(
         data: Dict[str, Dict], results: DataFrame, stake_currency, ticker_interval) -> str:
     """
     Generates and returns a text table for the given backtest data and the results dataframe
     :return: pretty printed table with tabulate as str
     """
-    tabular_data = []
-    headers = ['pair', 'buy count', 'avg profit', 'total profit', 'avg duration']
-    for pair in data:
-        result = results[results.currency == pair]
-        tabular_data.append([
+    stats = calculate_pair_stats(data, results)
+    headers = ['pair', 'buy count', 'avg profit', 'total profit', 'avg duration', 'win rate',
+               'profit factor']
+    tabular_data = [
+        [
             pair,
-            len(result.index),
-            '{:.2f}%'.format(result.profit_percent.mean() * 100.0),
-            '{:.08f} {}'.format(result.profit_BTC.sum(), stake_currency),
-            '{:.2f}'.format(result.duration.mean() * ticker_interval),
-        ])
-
-    # Append Total
-    tabular_data.append([
-        'TOTAL',
-        len(results.index),
-        '{:.2f}%'.format(results.profit_percent.mean() * 100.0),
-        '{:.08f} {}'.format(results.profit_BTC.sum(), stake_currency),
-        '{:.2f}'.format(results.duration.mean() * ticker_interval),
-    ])
+            row.count,
+            _format_stat('{:.2f}%', row.profit_mean * 100.0),
+            '{:.08f} {}'.format(row.profit_sum, stake_currency),
+            _format_stat('{:.2f}', row.duration_mean * ticker_interval),
+            _format_stat('{:.2f}%', row.win_rate * 100.0),
+            _format_stat('{:.2f}', row.profit_factor),
+        ]
+        for pair, row in zip(stats.index, stats.itertuples(index=False))
+    ]
     return tabulate(tabular_data, headers=headers)
 
 
+def _format_stat(fmt: str, value: float) -> str:
+    # Pairs without trades have no averages, pairs without losses no finite profit factor
+    if np.isnan(value):
+        return '-'
+    if np.isinf(value):
+        return '∞'
+    return fmt.format(value)
+
+
+def generate_summary_table(results: DataFrame, stake_currency) -> str:
+    """
+    Generates and returns a text table with the equity and drawdown of the given results
+    :return: pretty printed table with tabulate as str
+    """
+    equity = calculate_equity(results)
+    drawdown, high, low = calculate_max_drawdown(equity)
+    final_equity = equity.iloc[-1] if len(equity) else 0.0
+    highest_equity = max(equity.max(), 0.0) if len(equity) else 0.0
+    tabular_data = [
+        ['final equity', '{:.08f} {}'.format(final_equity, stake_currency)],
+        ['highest equity', '{:.08f} {}'.format(highest_equity, stake_currency)],
+        ['max drawdown', '{:.08f} {}'.format(drawdown, stake_currency)],
+    ]
+    if 'close_date' in results and low is not None:
+        tabular_data.append(['drawdown period', '{} - {}'.format(
+            'start' if high is None else arrow.get(high).isoformat(), arrow.get(low).isoformat()
+        )])
+    return tabulate(tabular_data, disable_numparse=True)
+
+
 def backtest(stake_amount: float, processed: Dict[str, DataFrame],
              max_open_trades: int = 0, realistic: bool = True) -> DataFrame:
     """
@@ -119,14 +254,176 @@ def backtest(stake_amount: float, processed: Dict[str, DataFrame],
                             pair,
                             current_profit_percent,
                             current_profit_btc,
-                            row2.Index - row.Index
+                            row2.Index - row.Index,
+                            row2.date
                         )
                     )
                     break
-    labels = ['currency', 'profit_percent', 'profit_BTC', 'duration']
+    labels = ['currency', 'profit_percent', 'profit_BTC', 'duration', 'close_date']
+    return DataFrame.from_records(trades, columns=labels)
+
+
+class _StreamLevel():
+    """
+    Trades of a pair in the streaming backtest.
+    In realistic mode backtest() only skips the buy signals up to the close of the last
+    closed trade, so the buy signals during a trade which never closes are traded as well.
+    Such trades are opened in a new level which is dropped when the trade closes after all.
+    """
+    def __init__(self, trade_count_lock: Dict) -> None:
+        # Open trades, format: [(index of the buy candle, trade)]
+        self.trades: List[Tuple[int, Trade]] = []
+        # Closed trades, format: [(index of the buy candle, result)]
+        self.results: List[Tuple[int, Tuple]] = []
+        self.lock_pair_until: Optional[int] = None
+        self.trade_count_lock = trade_count_lock
+
+
+def iter_chunks(ticker: List[Dict], chunk_size: int = CHUNK_SIZE, warmup: int = WARMUP_SIZE,
+                compact: bool = False) -> Iterator[Tuple[int, DataFrame]]:
+    """
+    Analyzes the ticker history of a pair in chunks of candles sorted by date.
+    The indicators of every chunk are populated together with the preceding warm-up candles,
+    so they match those of the whole history once the indicators converged.
+    :param ticker: list of candles, see exchange.get_ticker_history
+    :param chunk_size: number of candles per chunk
+    :param warmup: number of candles before every chunk used to warm up the indicators
+    :param compact: store the indicators with single precision, see compact_dataframe()
+    :return: iterator of (index of the first candle, DataFrame with buy and sell signals
+        indexed like the whole history)
+    """
+    columns = decode_candles(ticker)
+    count = len(columns['date'])
+    for start in range(0, count, chunk_size):
+        first = max(start - warmup, 0)
+        end = min(start + chunk_size, count)
+        dataframe = populate_indicators(candles_to_dataframe(
+            {name: column[first:end] for name, column in columns.items()}
+        ))
+        if compact:
+            dataframe = compact_dataframe(dataframe)
+        dataframe['buy'], dataframe['sell'] = 0, 0
+        dataframe = populate_sell_trend(populate_buy_trend(dataframe))
+        chunk = dataframe.iloc[start - first:]
+        # Index the candles like in the whole history
+        chunk.index = RangeIndex(start, end)
+        yield start, chunk
+
+
+def backtest_stream(stake_amount: float, tickerdata: Iterable[Tuple[str, List[Dict]]],
+                    max_open_trades: int = 0, realistic: bool = True,
+                    chunk_size: int = CHUNK_SIZE, warmup: int = WARMUP_SIZE,
+                    compact: bool = False) -> DataFrame:
+    """
+    Implements the backtesting of backtest() without keeping the processed data of all pairs
+    in memory. The pairs are analyzed one after the other in chunks of candles,
+    only the warm-up candles and the open trades are carried over to the next chunk.
+    :param stake_amount: btc amount to use for each trade
+    :param tickerdata: iterable of (pair, list of candles), e.g. optimize.iter_data()
+    :param max_open_trades: maximum number of concurrent trades (default: 0, disabled)
+    :param realistic: do we try to simulate realistic trades? (default: True)
+    :param chunk_size: number of candles per chunk
+    :param warmup: number of candles before every chunk used to warm up the indicators
+    :param compact: store the indicators with single precision, see compact_dataframe()
+    :return: DataFrame, see backtest()
+    """
+    trades = []
+    trade_count_lock: dict = {}
+    exchange._API = Bittrex({'key': '', 'secret': ''})
+    fee = exchange.get_fee()
+    for pair, ticker in tickerdata:
+        levels = [_StreamLevel(trade_count_lock)]
+        for start, chunk in iter_chunks(ticker, chunk_size, warmup, compact):
+            _backtest_chunk(levels, pair, start, chunk, stake_amount, fee,
+                            max_open_trades, realistic)
+        # Open trades never close, so the trades of all levels took place
+        results = []
+        for level in levels:
+            results.extend(level.results)
+            if level.trade_count_lock is not trade_count_lock:
+                for date, count in level.trade_count_lock.items():
+                    trade_count_lock[date] = trade_count_lock.get(date, 0) + count
+        results.sort(key=lambda result: result[0])
+        trades.extend(result for _, result in results)
+    labels = ['currency', 'profit_percent', 'profit_BTC', 'duration', 'close_date']
     return DataFrame.from_records(trades, columns=labels)
 
 
+def _backtest_chunk(levels: List[_StreamLevel], pair: str, start: int, chunk: DataFrame,
+                    stake_amount: float, fee: float, max_open_trades: int,
+                    realistic: bool) -> None:
+    """
+    Walks through the candles of a chunk in the order of backtest(), see backtest_stream()
+    """
+    dates = list(chunk['date'])
+    opens, closes = chunk['open'].tolist(), chunk['close'].tolist()
+    buys, sells = chunk['buy'].values == 1, chunk['sell'].values == 1
+    buy_positions = np.flatnonzero(buys)
+
+    position = 0
+    while position < len(dates):
+        if not any(level.trades for level in levels):
+            # Nothing happens until the next buy signal
+            next_buy = np.searchsorted(buy_positions, position)
+            if next_buy == len(buy_positions):
+                return
+            position = int(buy_positions[next_buy])
+
+        index, date, close = start + position, dates[position], closes[position]
+        for depth, level in enumerate(levels):
+            closed = False
+            for open_trade in list(level.trades):
+                buy_index, trade = open_trade
+                if max_open_trades > 0:
+                    level.trade_count_lock[date] = level.trade_count_lock.get(date, 0) + 1
+                if min_roi_reached(trade, close, date) or sells[position]:
+                    level.results.append((buy_index, (
+                        pair,
+                        trade.calc_profit_percent(rate=close),
+                        trade.calc_profit(rate=close),
+                        index - buy_index,
+                        date
+                    )))
+                    level.trades.remove(open_trade)
+                    level.lock_pair_until = index
+                    closed = True
+            if realistic and closed:
+                # The buy signals of the following levels are skipped after all
+                del levels[depth + 1:]
+                break
+
+        if buys[position]:
+            _open_stream_trade(levels, index, date, opens[position], close, stake_amount,
+                               fee, max_open_trades, realistic)
+        position += 1
+
+
+def _open_stream_trade(levels: List[_StreamLevel], index: int, date: Any, open_rate: float,
+                       close_rate: float, stake_amount: float, fee: float, max_open_trades: int,
+                       realistic: bool) -> None:
+    level = levels[-1]
+    if realistic and level.lock_pair_until is not None and index <= level.lock_pair_until:
+        return
+    if max_open_trades > 0:
+        # Check if max_open_trades has already been reached for the given date
+        open_trades = sum(lock_level.trade_count_lock.get(date, 0) for lock_level in levels)
+        if not open_trades < max_open_trades:
+            return
+    if realistic and level.trades:
+        # Only traded if the open trade never closes
+        level = _StreamLevel({})
+        levels.append(level)
+    if max_open_trades > 0:
+        level.trade_count_lock[date] = level.trade_count_lock.get(date, 0) + 1
+    level.trades.append((index, Trade(
+        open_rate=close_rate,
+        open_date=date,
+        stake_amount=stake_amount,
+        amount=stake_amount / open_rate,
+        fee=fee
+    )))
+
+
 def start(args):
     # Initialize logger
     logging.basicConfig(
@@ -147,17 +444,25 @@ def start(args):
         logger.info('Downloading data for all pairs in whitelist ...')
         for pair in pairs:
             data[pair] = exchange.get_ticker_history(pair, args.ticker_interval)
+    elif args.chunk_size:
+        logger.info('Streaming local backtesting data in chunks of %s candles ...',
+                    args.chunk_size)
+        if args.refresh_pairs:
+            download_pairs(pairs)
     else:
         logger.info('Using local backtesting data (using whitelist in given config) ...')
         data = load_data(pairs=pairs, ticker_interval=args.ticker_interval,
                          refresh_pairs=args.refresh_pairs)
 
+    if not args.live:
         logger.info('Using stake_currency: %s ...', config['stake_currency'])
         logger.info('Using stake_amount: %s ...', config['stake_amount'])
 
-    # Print timeframe
-    min_date, max_date = get_timeframe(data)
-    logger.info('Measuring data from %s up to %s ...', min_date.isoformat(), max_date.isoformat())
+    if data:
+        # Print timeframe
+        min_date, max_date = get_timeframe(data)
+        logger.info('Measuring data from %s up to %s ...',
+                    min_date.isoformat(), max_date.isoformat())
 
     max_open_trades = 0
     if args.realistic_simulation:
@@ -169,10 +474,26 @@ def start(args):
     main._CONF = config
 
     # Execute backtest and print results
-    results = backtest(
-        config['stake_amount'], preprocess(data), max_open_trades, args.realistic_simulation
-    )
+    with profiler.profile('backtest'):
+        if args.chunk_size:
+            results = backtest_stream(
+                config['stake_amount'],
+                data.items() if data else iter_data(args.ticker_interval, pairs),
+                max_open_trades, args.realistic_simulation,
+                chunk_size=args.chunk_size, compact=args.compact
+            )
+        else:
+            results = backtest(
+                config['stake_amount'], preprocess(data, compact=args.compact), max_open_trades,
+                args.realistic_simulation
+            )
     logger.info(
         '\n====================== BACKTESTING REPORT ======================================\n%s',
-        generate_text_table(data, results, config['stake_currency'], args.ticker_interval)
+        generate_text_table(
+            data or dict.fromkeys(pairs), results, config['stake_currency'], args.ticker_interval
+        )
+    )
+    logger.info(
+        '\n====================== EQUITY ==================================================\n%s',
+        generate_summary_table(results, config['stake_currency'])
     )
@@ -7,12 +7,12 @@ import sys
 from functools import reduce
 from math import exp
 from operator import itemgetter
+from typing import Dict, Optional
 
 from hyperopt import fmin, tpe, hp, Trials, STATUS_OK, STATUS_FAIL
-from hyperopt.mongoexp import MongoTrials
 from pandas import DataFrame
 
-from freqtrade import exchange, optimize
+from freqtrade import exchange, optimize, profiler
 from freqtrade.exchange import Bittrex
 from freqtrade.misc import load_config
 from freqtrade.optimize.backtesting import backtest
@@ -35,8 +35,8 @@ CURRENT_BEST_LOSS = 100
 # for example 3.5%, 1100 trades, EXPECTED_MAX_PROFIT = 3.85
 EXPECTED_MAX_PROFIT = 3.85
 
-# Configuration and data used by hyperopt
-PROCESSED = optimize.preprocess(optimize.load_data())
+# Configuration and data used by hyperopt, the data is loaded by start() or on first use
+PROCESSED: Optional[Dict[str, DataFrame]] = None
 OPTIMIZE_CONFIG = hyperopt_optimize_conf()
 
 # Monkey patch config
@@ -117,12 +117,16 @@ def calculate_loss(total_profit: float, trade_count: int):
 
 
 def optimizer(params):
-    global _CURRENT_TRIES
+    global _CURRENT_TRIES, PROCESSED
 
-    from freqtrade.optimize import backtesting
-    backtesting.populate_buy_trend = buy_strategy_generator(params)
+    if PROCESSED is None:
+        # Workers started by hyperopt-mongo-worker never run start()
+        PROCESSED = optimize.preprocess(optimize.load_data())
 
-    results = backtest(OPTIMIZE_CONFIG['stake_amount'], PROCESSED)
+    from freqtrade.optimize import backtesting
+    with profiler.profile('epoch'):
+        backtesting.populate_buy_trend = buy_strategy_generator(params)
+        results = backtest(OPTIMIZE_CONFIG['stake_amount'], PROCESSED)
     result_explanation = format_results(results)
 
     total_profit = results.profit_percent.sum()
@@ -224,9 +228,12 @@ def start(args):
     config = load_config(args.config)
     pairs = config['exchange']['pair_whitelist']
     PROCESSED = optimize.preprocess(optimize.load_data(
-        pairs=pairs, ticker_interval=args.ticker_interval))
+        pairs=pairs, ticker_interval=args.ticker_interval), compact=args.compact)
 
     if args.mongodb:
+        # Imports pymongo, which is only required for parallel evaluations
+        from hyperopt.mongoexp import MongoTrials
+
         logger.info('Using mongodb ...')
         logger.info('Start scripts/start-mongodb.sh and start-hyperopt-worker.sh manually!')
 
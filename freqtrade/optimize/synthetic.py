@@ -0,0 +1,101 @@
+"""
+Seeded generator of synthetic ticker history, used to test the bot at scale
+"""
+import json
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from scipy.signal import lfilter
+
+# Keys of a candle as returned by the exchange
+CANDLE_KEYS = ('O', 'H', 'L', 'C', 'V', 'T', 'BV')
+DEFAULT_START = '2017-11-20T00:00:00'
+
+
+def generate_ticker_history(count: int,
+                            ticker_interval: int = 5,
+                            seed: Union[int, List[int]] = 0,
+                            start: str = DEFAULT_START,
+                            start_price: Optional[float] = None) -> List[Dict]:
+    """
+    Generates a ticker history following a random walk with fat tailed returns
+    and volatility clustering. Volume rises with the size of the price moves.
+    The same seed always returns the same candles.
+    :param count: number of candles
+    :param ticker_interval: ticker interval in minutes
+    :param seed: seed of the random number generator
+    :param start: date of the first candle
+    :param start_price: open rate of the first candle (default: random)
+    :return: list of candles, format: [{'O', 'H', 'L', 'C', 'V', 'T', 'BV'}, ...]
+    """
+    rnd = np.random.RandomState(seed)
+    if start_price is None:
+        start_price = 10 ** rnd.uniform(-6, -1)
+    base_volume = 10 ** rnd.uniform(0, 3) / start_price
+    # Volatility per candle, scaled with the ticker interval
+    sigma = rnd.uniform(0.001, 0.003) * np.sqrt(ticker_interval)
+
+    # Slowly changing volatility regimes
+    regime = lfilter([0.05], [1, -0.95], rnd.standard_normal(count))
+    volatility = sigma * np.exp(regime)
+    shocks = rnd.standard_t(4, count) / np.sqrt(2)
+    returns = volatility * shocks
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    # Wicks beyond the body of the candle
+    high = np.maximum(open_, close) * np.exp(np.abs(rnd.standard_normal(count)) * volatility / 2)
+    low = np.minimum(open_, close) * np.exp(-np.abs(rnd.standard_normal(count)) * volatility / 2)
+    volume = base_volume * rnd.lognormal(0, 0.5, count) * (1 + np.abs(shocks))
+    base = volume * (open_ + high + low + close) / 4
+
+    dates = (np.datetime64(start, 's')
+             + np.arange(count) * np.timedelta64(ticker_interval * 60, 's')).astype(str)
+
+    columns = [np.round(column, 8).tolist()
+               for column in (open_, high, low, close, volume)]
+    columns.append(dates.tolist())
+    columns.append(np.round(base, 8).tolist())
+    return [dict(zip(CANDLE_KEYS, candle)) for candle in zip(*columns)]
+
+
+def generate_data(pairs: Union[int, List[str]],
+                  days: float = 20,
+                  ticker_interval: int = 5,
+                  seed: int = 0,
+                  start: str = DEFAULT_START) -> Dict[str, List[Dict]]:
+    """
+    Generates the ticker history of several pairs, in the format of load_data()
+    :param pairs: list of pairs or the number of pairs to generate
+    :param days: number of days per pair
+    :param ticker_interval: ticker interval in minutes
+    :param seed: seed of the random number generator
+    :param start: date of the first candle
+    :return: dict, format: {pair: list of candles}
+    """
+    if isinstance(pairs, int):
+        pairs = ['BTC_SYN{:04d}'.format(index) for index in range(pairs)]
+    count = int(days * 24 * 60 // ticker_interval)
+    # Every pair has its own stream, adding pairs leaves the others unchanged
+    return {
+        pair: generate_ticker_history(count, ticker_interval, [seed, index], start)
+        for index, pair in enumerate(pairs)
+    }
+
+
+def save_data(data: Dict[str, List[Dict]], path: str, ticker_interval: int = 5) -> None:
+    """
+    Stores the given ticker history with the file names used by load_data()
+    :param data: dict, format: {pair: list of candles}
+    :param path: target directory
+    :param ticker_interval: ticker interval in minutes
+    :return: None
+    """
+    os.makedirs(path, exist_ok=True)
+    for pair, candles in data.items():
+        file = os.path.join(path, '{pair}-{ticker_interval}.json'.format(
+            pair=pair.replace('-', '_'),
+            ticker_interval=ticker_interval,
+        ))
+        with open(file, 'wt') as fp:
+            json.dump(candles, fp)
@@ -1,21 +1,66 @@
 import logging
-from datetime import datetime
-from decimal import Decimal, getcontext
-from typing import Optional, Dict
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from decimal import Context, Decimal
+from queue import Queue
+from threading import RLock, Thread, local
+from typing import Optional, Dict, List, Any, Tuple, Callable, Iterator
 
 import arrow
-from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, create_engine
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Index, Table, \
+    create_engine, event, inspect, func, select, union_all
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm.scoping import scoped_session
-from sqlalchemy.orm.session import sessionmaker
+from sqlalchemy.orm.session import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 
+from freqtrade import OperationalException, metrics
+
 logger = logging.getLogger(__name__)
 
 _CONF = {}
 _DECL_BASE = declarative_base()
 
+# In-memory index of all open trades, kept in sync with the trades table
+_OPEN_TRADES: Dict[int, 'Trade'] = {}
+_OPEN_TRADES_BY_PAIR: Dict[str, Dict[int, 'Trade']] = {}
+_OPEN_TRADES_LOCK = RLock()
+metrics.OPEN_TRADES.set_function(lambda: len(_OPEN_TRADES))
+
+# Running aggregates over all trades, updated whenever a trade is created or closed
+_TRADE_STATS: Dict[str, Any] = {}
+_PAIR_PROFITS: Dict[str, float] = {}
+_TRADE_STATS_LOCK = RLock()
+
+# Bittrex do not go above 8 decimal. A private context is used for all price
+# calculations, so the global decimal context of the calling thread is left untouched.
+_PRICE_CONTEXT = Context(prec=8)
+
+# Callbacks of the unit of work in progress of the current thread in the attribute
+# 'callbacks', None if there is none. See unit_of_work()
+_UNIT_OF_WORK = local()
+# Held by every thread using the session, see _session_lock()
+_UNIT_OF_WORK_LOCK = RLock()
+# Background thread committing the units of work if internals.write_behind is enabled
+_WRITER: Optional['_Writer'] = None
+
+# Time of the last check_archive() run
+_LAST_ARCHIVE = 0.0
+# Seconds between two archive runs, see check_archive()
+ARCHIVE_INTERVAL = 3600
+
+DRY_RUN_DB_FILE = 'tradesv3.dry_run.sqlite'
+# In-memory dry run database which is snapshotted to DRY_RUN_DB_FILE, see snapshot()
+_SNAPSHOT_ENGINE: Optional[Engine] = None
+# sqlite3.Connection.backup() is available since python 3.7
+_BACKUP_API = hasattr(sqlite3.Connection, 'backup')
+_LAST_SNAPSHOT = 0.0
+
 
 def init(config: dict, engine: Optional[Engine] = None) -> None:
     """
@@ -26,37 +71,637 @@ def init(config: dict, engine: Optional[Engine] = None) -> None:
     :param engine: database engine for sqlalchemy (Optional)
     :return: None
     """
+    global _SNAPSHOT_ENGINE
     _CONF.update(config)
+    write_behind = _CONF.get('internals', {}).get('write_behind', False)
+    _SNAPSHOT_ENGINE = None
     if not engine:
+        # The writer thread commits on connections opened by the trading thread
+        connect_args = {'check_same_thread': False} if write_behind else {}
         if _CONF.get('dry_run', False):
             # the user wants dry run to use a DB
-            if _CONF.get('dry_run_db', False):
-                engine = create_engine('sqlite:///tradesv3.dry_run.sqlite')
+            if _CONF.get('dry_run_db', False) and not _CONF.get('dry_run_snapshot', False):
+                engine = create_engine('sqlite:///{}'.format(DRY_RUN_DB_FILE),
+                                       connect_args=connect_args)
             # Otherwise dry run will store in memory
             else:
                 engine = create_engine('sqlite://',
                                        connect_args={'check_same_thread': False},
                                        poolclass=StaticPool,
                                        echo=False)
+                # and keeps a copy on disk if wanted
+                if _CONF.get('dry_run_snapshot', False):
+                    _restore_snapshot(engine)
         else:
-            engine = create_engine('sqlite:///tradesv3.sqlite')
+            engine = create_engine('sqlite:///tradesv3.sqlite', connect_args=connect_args)
 
-    session = scoped_session(sessionmaker(bind=engine, autoflush=True, autocommit=True))
-    Trade.session = session()
-    Trade.query = session.query_property()
+    # Objects are not expired after a flush, this allows the open trades index
+    # to hand out trade instances without reloading them from the database.
+    # All threads share this session, see _session_lock()
+    Trade.session = sessionmaker(
+        bind=engine, autoflush=True, autocommit=True, expire_on_commit=False
+    )()
+    Trade.query = _QueryProperty()
+    if engine.dialect.name == 'sqlite' and \
+            not event.contains(engine, 'connect', _set_sqlite_pragmas):
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
     _DECL_BASE.metadata.create_all(engine)
+    check_migrate(engine)
+    load_open_trades()
+    load_trade_stats()
+
+    global _WRITER
+    _stop_writer()
+    if write_behind:
+        _WRITER = _Writer()
+        _WRITER.start()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Tunes every new sqlite connection for a single writer:
+    WAL allows readers (e.g. telegram) while the bot writes and
+    synchronous=NORMAL only syncs on checkpoints, which is safe in WAL mode.
+    With write_behind every commit is synced, as this happens off the trading thread.
+    """
+    synchronous = 'FULL' if _CONF.get('internals', {}).get('write_behind') else 'NORMAL'
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous={}'.format(synchronous))
+    cursor.close()
+
+
+# Table a statement reads from or writes to, used to label the query metrics
+_STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+"?(\w+)', re.IGNORECASE)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('query_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    """ Observes the duration of every statement by its type and table """
+    duration = time.time() - conn.info['query_start'].pop()
+    match = _STATEMENT_TABLE.search(statement)
+    metrics.DB_QUERY_SECONDS.observe(
+        duration, statement.split(None, 1)[0].upper(), match.group(1) if match else ''
+    )
+
+
+def check_migrate(engine: Engine) -> None:
+    """
+    Migrates existing databases in place by adding all missing
+    columns and indexes, and backfills the stored absolute profit.
+    :param engine: database engine for sqlalchemy
+    :return: None
+    """
+    inspector = inspect(engine)
+    columns = {column['name'] for column in inspector.get_columns(Trade.__tablename__)}
+    if 'close_profit_abs' not in columns:
+        logger.info('Adding column close_profit_abs to table %s ...', Trade.__tablename__)
+        engine.execute('ALTER TABLE {} ADD COLUMN close_profit_abs FLOAT'.format(
+            Trade.__tablename__
+        ))
+
+    existing = {index['name'] for index in inspector.get_indexes(Trade.__tablename__)}
+    for index in Trade.__table__.indexes:
+        if index.name not in existing:
+            logger.info('Creating index %s on table %s ...', index.name, Trade.__tablename__)
+            index.create(engine)
+
+    trades = Trade.query \
+        .filter(Trade.is_open.is_(False)) \
+        .filter(Trade.close_rate.isnot(None)) \
+        .filter(Trade.close_profit_abs.is_(None)) \
+        .all()
+    for trade in trades:
+        trade.close_profit_abs = trade.calc_profit()
+    if trades:
+        logger.info('Stored absolute profit for %d closed trades', len(trades))
+        Trade.session.flush()
 
 
 def cleanup() -> None:
     """
-    Flushes all pending operations to disk.
+    Waits for the writer thread and flushes all pending operations to disk.
+    :return: None
+    """
+    _stop_writer()
+    flush()
+    snapshot()
+
+
+def _restore_snapshot(engine: Engine) -> None:
+    """
+    Loads the last snapshot into the given in-memory database
+    and enables snapshots for it.
+    :param engine: engine of the in-memory database
+    :return: None
+    """
+    global _SNAPSHOT_ENGINE, _LAST_SNAPSHOT
+    if os.path.isfile(DRY_RUN_DB_FILE):
+        logger.info('Restoring dry run database from "%s" ...', DRY_RUN_DB_FILE)
+        _backup(DRY_RUN_DB_FILE, engine, to_file=False)
+    _SNAPSHOT_ENGINE = engine
+    _LAST_SNAPSHOT = time.time()
+
+
+def snapshot() -> None:
+    """
+    Copies the in-memory dry run database to DRY_RUN_DB_FILE
+    using SQLite's online backup API if available. Does nothing unless dry_run_snapshot is enabled.
+    :return: None
+    """
+    global _LAST_SNAPSHOT
+    if not _SNAPSHOT_ENGINE:
+        return
+    start = time.time()
+    _backup(DRY_RUN_DB_FILE, _SNAPSHOT_ENGINE, to_file=True)
+    _LAST_SNAPSHOT = time.time()
+    logger.debug('Stored dry run snapshot in %.3f secs', _LAST_SNAPSHOT - start)
+
+
+def _snapshot_if_due() -> None:
+    interval = _CONF.get('internals', {}).get('dry_run_snapshot_secs', 300)
+    if _SNAPSHOT_ENGINE and time.time() - _LAST_SNAPSHOT >= interval:
+        try:
+            snapshot()
+        except sqlite3.Error as error:
+            logger.warning('Unable to store dry run snapshot: %s', error)
+
+
+def _backup(path: str, engine: Engine, to_file: bool) -> None:
+    connection = engine.raw_connection()
+    try:
+        if not _BACKUP_API:
+            _copy_tables(connection.connection, path, to_file)
+            return
+        file_connection = sqlite3.connect(path)
+        try:
+            if to_file:
+                connection.connection.backup(file_connection)
+            else:
+                file_connection.backup(connection.connection)
+        finally:
+            file_connection.close()
+    finally:
+        connection.close()
+
+
+def _copy_tables(connection: sqlite3.Connection, path: str, to_file: bool) -> None:
+    """
+    Copies all tables and indexes between the given database and the file at path
+    in a single transaction, used without the backup API (python < 3.7).
+    A snapshot is written to a temporary file first, which then replaces the old one.
+    """
+    target_path = path + '.tmp' if to_file else path
+    if to_file and os.path.isfile(target_path):
+        os.remove(target_path)
+    source, target = ('main', 'snapshot') if to_file else ('snapshot', 'main')
+    connection.execute('ATTACH DATABASE ? AS snapshot', (target_path,))
+    try:
+        connection.execute('BEGIN')
+        try:
+            # Tables have to be created before their indexes
+            schema = connection.execute(
+                "SELECT type, name, sql FROM {}.sqlite_master "
+                "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+                "ORDER BY type = 'index'".format(source)
+            ).fetchall()
+            for type_, name, sql in schema:
+                connection.execute(re.sub(
+                    r'^CREATE (TABLE|(UNIQUE )?INDEX) ', r'CREATE \1 {}.'.format(target), sql
+                ))
+                if type_ == 'table':
+                    connection.execute('INSERT INTO {0}."{2}" SELECT * FROM {1}."{2}"'.format(
+                        target, source, name
+                    ))
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        connection.commit()
+    finally:
+        connection.execute('DETACH DATABASE snapshot')
+    if to_file:
+        os.replace(target_path, path)
+
+
+class _QueryProperty():
+    """
+    Query of the shared session, used as Trade.query
+    """
+    def __get__(self, instance, owner):
+        return owner.session.query(owner)
+
+
+@contextmanager
+def _session_lock() -> Iterator[None]:
+    """
+    Serializes the use of the session between threads. A commit handed over
+    to the writer thread still holds the session, so it is waited for.
+    Trades of the open trades index must only be changed while it is held,
+    other threads read them through copy_open_trades().
+    """
+    with _UNIT_OF_WORK_LOCK:
+        wait_for_writes()
+        yield
+
+
+def _pending_callbacks() -> Optional[List[Callable[[], Any]]]:
+    return getattr(_UNIT_OF_WORK, 'callbacks', None)
+
+
+@contextmanager
+def unit_of_work() -> Iterator[None]:
+    """
+    Groups all changes made within the block into a single transaction.
+    Changes are committed even if the block raises, as orders which have
+    been placed on the exchange must not get lost.
+    With internals.write_behind enabled the commit happens on a background thread,
+    the session is not used by any thread until it is done.
+    Nested calls of the same thread join the outer unit of work,
+    other threads wait until it is committed.
+    :return: None
+    """
+    if _pending_callbacks() is not None:
+        yield
+        return
+
+    with _session_lock():
+        session = Trade.session
+        session.begin()
+        callbacks: List[Callable[[], Any]] = []
+        _UNIT_OF_WORK.callbacks = callbacks
+        try:
+            yield
+        finally:
+            _UNIT_OF_WORK.callbacks = None
+            # Flushing happens on this thread, the objects may change right after
+            try:
+                session.flush()
+            except SQLAlchemyError as error:
+                session.rollback()
+                raise OperationalException('Unable to store trades: {}'.format(error))
+            if _WRITER:
+                _WRITER.submit(session, callbacks)
+            else:
+                _commit(session)
+                _run_callbacks(callbacks)
+
+
+def on_commit(callback: Callable[[], Any]) -> None:
+    """
+    Calls the given callback once the unit of work of the current thread has been committed,
+    right away if there is none. Used to acknowledge orders only once they are stored.
+    :param callback: function without arguments
+    :return: None
+    """
+    callbacks = _pending_callbacks()
+    if callbacks is not None:
+        callbacks.append(callback)
+    else:
+        callback()
+
+
+def flush() -> None:
+    """
+    Flushes pending changes, within a unit of work of the current thread
+    this is left to its commit.
+    :return: None
+    """
+    if _pending_callbacks() is None:
+        with _session_lock():
+            Trade.session.flush()
+
+
+def wait_for_writes() -> None:
+    """
+    Blocks until the writer thread has committed all units of work.
+    Raises OperationalException if one of them could not be stored.
+    :return: None
+    """
+    if _WRITER:
+        _WRITER.wait()
+
+
+def _commit(session: Session) -> None:
+    try:
+        session.commit()
+    except SQLAlchemyError as error:
+        session.rollback()
+        raise OperationalException('Unable to store trades: {}'.format(error))
+    _snapshot_if_due()
+
+
+def _run_callbacks(callbacks: List[Callable[[], Any]]) -> None:
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception('Unable to execute commit callback %s', callback)
+
+
+def _stop_writer() -> None:
+    global _WRITER
+    if _WRITER:
+        _WRITER.stop()
+        _WRITER = None
+
+
+class _Writer(Thread):
+    """
+    Commits the units of work handed over by unit_of_work() in the background.
+    The queue holds at most one unit of work, as every use of the session
+    waits for the previous commit, see _session_lock().
+    The callbacks are called once the session is released.
+    """
+    def __init__(self) -> None:
+        super().__init__(name='persistence-writer', daemon=True)
+        self._queue: Queue = Queue(maxsize=1)
+        self._error: Optional[OperationalException] = None
+
+    def submit(self, session: Session, callbacks: List[Callable[[], Any]]) -> None:
+        self._queue.put((session, callbacks))
+
+    def wait(self) -> None:
+        self._queue.join()
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self.join()
+        if self._error:
+            logger.error('Last unit of work could not be stored: %s', self._error)
+
+    def run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            session, callbacks = item
+            try:
+                _commit(session)
+            except OperationalException as error:
+                self._error = error
+                callbacks = []
+            finally:
+                self._queue.task_done()
+            _run_callbacks(callbacks)
+
+
+def load_open_trades() -> None:
+    """
+    (Re)builds the open trades index from the database.
+    :return: None
+    """
+    with _session_lock(), _OPEN_TRADES_LOCK:
+        _OPEN_TRADES.clear()
+        _OPEN_TRADES_BY_PAIR.clear()
+        for trade in Trade.query.filter(Trade.is_open.is_(True)).all():
+            _index_open_trade(trade)
+    logger.debug('Loaded %d open trades', len(_OPEN_TRADES))
+
+
+def _index_open_trade(trade: 'Trade') -> None:
+    with _OPEN_TRADES_LOCK:
+        _OPEN_TRADES[trade.id] = trade
+        _OPEN_TRADES_BY_PAIR.setdefault(trade.pair, {})[trade.id] = trade
+
+
+def register_trade(trade: 'Trade') -> None:
+    """
+    Adds the given newly persisted trade to the open trades index
+    and to the trade statistics.
+    :param trade: open trade which has already been flushed
+    :return: None
+    """
+    _index_open_trade(trade)
+    with _TRADE_STATS_LOCK:
+        _TRADE_STATS['trade_count'] += 1
+        _TRADE_STATS['first_trade_date'] = _TRADE_STATS['first_trade_date'] or trade.open_date
+        _TRADE_STATS['latest_trade_date'] = trade.open_date
+
+
+def unregister_trade(trade: 'Trade') -> None:
+    """
+    Removes the given trade from the open trades index, unknown trades are ignored.
+    :param trade: closed trade
+    :return: None
+    """
+    with _OPEN_TRADES_LOCK:
+        if _OPEN_TRADES.pop(trade.id, None) is None:
+            return
+        pair_trades = _OPEN_TRADES_BY_PAIR.get(trade.pair, {})
+        pair_trades.pop(trade.id, None)
+        if not pair_trades:
+            _OPEN_TRADES_BY_PAIR.pop(trade.pair, None)
+
+
+def get_open_trades() -> List['Trade']:
+    """
+    Returns all open trades ordered by id without querying the database.
+    :return: list of Trade instances
+    """
+    with _OPEN_TRADES_LOCK:
+        return [_OPEN_TRADES[trade_id] for trade_id in sorted(_OPEN_TRADES)]
+
+
+def copy_open_trades() -> List['Trade']:
+    """
+    Returns copies of all open trades ordered by id without waiting for the session,
+    so a unit of work in progress does not block the caller.
+    The values are read without loading them from the database.
+    The copies are not attached to the session and may be used by any thread.
+    :return: list of transient Trade instances
+    """
+    columns = [column.key for column in Trade.__table__.columns]
+    with _OPEN_TRADES_LOCK:
+        states = [inspect(trade).dict for trade in get_open_trades()]
+    return [Trade(**{key: state.get(key) for key in columns}) for state in states]
+
+
+def get_open_trade(trade_id: int) -> Optional['Trade']:
+    """
+    Returns the open trade with the given id.
+    :param trade_id: id of the trade
+    :return: Trade or None if there is no open trade with this id
+    """
+    with _OPEN_TRADES_LOCK:
+        return _OPEN_TRADES.get(trade_id)
+
+
+def get_open_trades_by_pair(pair: str) -> List['Trade']:
+    """
+    Returns all open trades for the given pair.
+    :param pair: Pair as str, format: BTC_ETH
+    :return: list of Trade instances
+    """
+    with _OPEN_TRADES_LOCK:
+        return list(_OPEN_TRADES_BY_PAIR.get(pair, {}).values())
+
+
+def check_open_trades() -> bool:
+    """
+    Compares the open trades index with the database.
+    The index gets rebuilt if both disagree.
+    :return: True if the index was consistent, False otherwise
+    """
+    with _session_lock():
+        db_ids = {trade_id for trade_id, in Trade.session.query(Trade.id)
+                  .filter(Trade.is_open.is_(True)).all()}
+        with _OPEN_TRADES_LOCK:
+            index_ids = set(_OPEN_TRADES)
+            if db_ids == index_ids:
+                return True
+            logger.warning(
+                'Open trades index is out of sync (missing: %s, unexpected: %s), reloading ...',
+                sorted(db_ids - index_ids), sorted(index_ids - db_ids)
+            )
+            load_open_trades()
+    return False
+
+
+def load_trade_stats() -> None:
+    """
+    (Re)builds the running trade statistics from the database.
     :return: None
     """
-    Trade.session.flush()
+    with _session_lock(), _TRADE_STATS_LOCK:
+        _TRADE_STATS.update({
+            'trade_count': Trade.session.query(func.count(Trade.id)).scalar(),
+            'first_trade_date': None,
+            'latest_trade_date': None,
+            'closed_trade_count': 0,
+            'closed_profit': 0.0,
+            'closed_profit_percent': 0.0,
+            'closed_duration': 0.0,
+        })
+        _PAIR_PROFITS.clear()
+        if _TRADE_STATS['trade_count']:
+            _TRADE_STATS['first_trade_date'], = Trade.session.query(Trade.open_date) \
+                .order_by(Trade.id).first()
+            _TRADE_STATS['latest_trade_date'], = Trade.session.query(Trade.open_date) \
+                .order_by(Trade.id.desc()).first()
+
+        # Archived trades are only known by their summary
+        for row in Trade.session.execute(_ARCHIVE_SUMMARY.select()):
+            _TRADE_STATS['trade_count'] += row.trade_count
+            _TRADE_STATS['closed_trade_count'] += row.trade_count
+            _TRADE_STATS['closed_profit'] += row.profit_abs
+            _TRADE_STATS['closed_profit_percent'] += row.profit_percent
+            _TRADE_STATS['closed_duration'] += row.duration
+            _PAIR_PROFITS[row.pair] = _PAIR_PROFITS.get(row.pair, 0.0) + row.profit_percent
+            first_trade_date = _TRADE_STATS['first_trade_date']
+            if not first_trade_date or row.first_open_date < first_trade_date:
+                _TRADE_STATS['first_trade_date'] = row.first_open_date
+
+        # Only fetch the required columns instead of whole entities
+        closed_trades = Trade.session.query(
+            Trade.pair,
+            Trade.open_date,
+            Trade.close_date,
+            Trade.close_profit,
+            Trade.close_profit_abs
+        ).filter(Trade.is_open.is_(False)).order_by(Trade.id).all()
+        for row in closed_trades:
+            _add_closed_trade_stats(*row)
+
+
+def update_trade_stats(trade: 'Trade') -> None:
+    """
+    Adds the given closed trade to the running statistics.
+    Trades which have not been persisted are ignored.
+    :param trade: Trade which has just been closed
+    :return: None
+    """
+    if trade.id is None:
+        return
+    _add_closed_trade_stats(
+        trade.pair, trade.open_date, trade.close_date, trade.close_profit, trade.close_profit_abs
+    )
+
+
+def _add_closed_trade_stats(pair: str, open_date: datetime, close_date: datetime,
+                            profit_percent: float, profit_abs: float) -> None:
+    with _TRADE_STATS_LOCK:
+        _TRADE_STATS['closed_trade_count'] += 1
+        _TRADE_STATS['closed_profit'] += profit_abs or 0.0
+        _TRADE_STATS['closed_profit_percent'] += profit_percent or 0.0
+        if open_date and close_date:
+            _TRADE_STATS['closed_duration'] += (close_date - open_date).total_seconds()
+        _PAIR_PROFITS[pair] = _PAIR_PROFITS.get(pair, 0.0) + (profit_percent or 0.0)
+
+
+def get_trade_stats() -> Dict[str, Any]:
+    """
+    Returns the running statistics without querying the database.
+    :return: dict, format: {
+        'trade_count': int,
+        'first_trade_date': datetime,
+        'latest_trade_date': datetime,
+        'closed_trade_count': int,
+        'closed_profit': float,
+        'closed_profit_percent': float,
+        'closed_duration': float (in seconds),
+    }
+    """
+    with _TRADE_STATS_LOCK:
+        return dict(_TRADE_STATS)
+
+
+def get_pair_profits() -> List[Tuple[str, float]]:
+    """
+    Returns the summed up profit in percentage of all closed trades per pair.
+    :return: list of (pair, profit) tuples, most profitable pair first
+    """
+    with _TRADE_STATS_LOCK:
+        return sorted(_PAIR_PROFITS.items(), key=lambda item: item[1], reverse=True)
+
+
+def get_daily_profit(end_date: date, days: int) -> Dict[date, float]:
+    """
+    Sums up the absolute profit of all trades closed per day with a single query,
+    including archived trades.
+    :param end_date: last day to include
+    :param days: number of days to include, counting backwards from end_date
+    :return: dict with an entry for every day, starting with end_date
+    """
+    start_date = end_date - timedelta(days=days - 1)
+    closed = union_all(*[
+        select([table.c.close_date, table.c.close_profit_abs])
+        .where(table.c.is_open.is_(False))
+        .where(table.c.close_date >= start_date)
+        .where(table.c.close_date < end_date + timedelta(days=1))
+        for table in (Trade.__table__, _ARCHIVE)
+    ]).alias('closed')
+    close_day = func.date(closed.c.close_date)
+    with _session_lock():
+        rows = Trade.session.query(close_day, func.sum(closed.c.close_profit_abs)) \
+            .group_by(close_day) \
+            .all()
+    profits = {datetime.strptime(day, '%Y-%m-%d').date(): profit for day, profit in rows}
+
+    result = {}
+    for offset in range(days):
+        day = end_date - timedelta(days=offset)
+        result[day] = profits.get(day) or 0.0
+    return result
 
 
 class Trade(_DECL_BASE):
     __tablename__ = 'trades'
+    __table_args__ = (
+        # Used by the /daily range scans on closed trades
+        Index('ix_trades_is_open_close_date', 'is_open', 'close_date'),
+        # Used by /performance and /profit grouping closed trades by pair
+        Index('ix_trades_is_open_pair', 'is_open', 'pair'),
+    )
 
     id = Column(Integer, primary_key=True)
     exchange = Column(String, nullable=False)
@@ -66,6 +711,7 @@ class Trade(_DECL_BASE):
     open_rate = Column(Float)
     close_rate = Column(Float)
     close_profit = Column(Float)
+    close_profit_abs = Column(Float)
     stake_amount = Column(Float, nullable=False)
     amount = Column(Float)
     open_date = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -93,29 +739,34 @@ class Trade(_DECL_BASE):
 
         logger.info('Updating trade (id=%d) ...', self.id)
 
-        getcontext().prec = 8  # Bittrex do not go above 8 decimal
         if order['type'] == 'LIMIT_BUY':
-            # Update open rate and actual amount
-            self.open_rate = Decimal(order['rate'])
-            self.amount = Decimal(order['amount'])
+            # Update open rate and actual amount. Instances are not expired on commit,
+            # so the values are never reloaded from the float columns and must be floats.
+            self.open_rate = float(order['rate'])
+            self.amount = float(order['amount'])
             logger.info('LIMIT_BUY has been fulfilled for %s.', self)
             self.open_order_id = None
         elif order['type'] == 'LIMIT_SELL':
             self.close(order['rate'])
         else:
             raise ValueError('Unknown order type: {}'.format(order['type']))
-        cleanup()
+        flush()
 
     def close(self, rate: float) -> None:
         """
         Sets close_rate to the given rate, calculates total profit
         and marks trade as closed
         """
-        self.close_rate = Decimal(rate)
+        was_open = self.is_open is not False
+        self.close_rate = float(rate)
         self.close_profit = self.calc_profit_percent()
+        self.close_profit_abs = self.calc_profit()
         self.close_date = datetime.utcnow()
         self.is_open = False
         self.open_order_id = None
+        unregister_trade(self)
+        if was_open:
+            update_trade_stats(self)
         logger.info(
             'Marking %s as closed as the trade is fulfilled and found no open orders for it.',
             self
@@ -130,11 +781,17 @@ class Trade(_DECL_BASE):
         If rate is not set self.fee will be used
         :return: Price in BTC of the open trade
         """
-        getcontext().prec = 8
+        if fee:
+            return _calc_open_trade_price(self.amount, self.open_rate, fee)
 
-        buy_trade = (Decimal(self.amount) * Decimal(self.open_rate))
-        fees = buy_trade * Decimal(fee or self.fee)
-        return float(buy_trade + fees)
+        # The open price is needed for every profit calculation,
+        # so it is cached until one of its inputs changes
+        key = (self.amount, self.open_rate, self.fee)
+        cached = getattr(self, '_open_trade_price', None)
+        if cached is None or cached[0] != key:
+            cached = (key, _calc_open_trade_price(*key))
+            self._open_trade_price = cached
+        return cached[1]
 
     def calc_close_trade_price(
             self,
@@ -148,14 +805,9 @@ class Trade(_DECL_BASE):
         If rate is not set self.close_rate will be used
         :return: Price in BTC of the open trade
         """
-        getcontext().prec = 8
-
         if rate is None and not self.close_rate:
             return 0.0
-
-        sell_trade = (Decimal(self.amount) * Decimal(rate or self.close_rate))
-        fees = sell_trade * Decimal(fee or self.fee)
-        return float(sell_trade - fees)
+        return _calc_close_trade_price(self.amount, rate or self.close_rate, fee or self.fee)
 
     def calc_profit(
             self,
@@ -170,11 +822,11 @@ class Trade(_DECL_BASE):
         :return:  profit in BTC as float
         """
         open_trade_price = self.calc_open_trade_price()
-        close_trade_price = self.calc_close_trade_price(
-            rate=Decimal(rate or self.close_rate),
-            fee=Decimal(fee or self.fee)
+        close_trade_price = _calc_close_trade_price(
+            self.amount, rate or self.close_rate, fee or self.fee
         )
-        return float("{0:.8f}".format(close_trade_price - open_trade_price))
+        # round() is correctly rounded, same as formatting with '.8f'
+        return round(close_trade_price - open_trade_price, 8)
 
     def calc_profit_percent(
             self,
@@ -186,12 +838,121 @@ class Trade(_DECL_BASE):
         If rate is not set self.close_rate will be used
         :return: profit in percentage as float
         """
-        getcontext().prec = 8
-
         open_trade_price = self.calc_open_trade_price()
-        close_trade_price = self.calc_close_trade_price(
-            rate=Decimal(rate or self.close_rate),
-            fee=Decimal(fee or self.fee)
+        close_trade_price = _calc_close_trade_price(
+            self.amount, rate or self.close_rate, fee or self.fee
         )
+        return round((close_trade_price / open_trade_price) - 1, 8)
+
+
+def _calc_open_trade_price(amount: float, rate: float, fee: float) -> float:
+    """
+    Price in BTC of buying amount at rate, including fee.
+    Every step is rounded to 8 digits using _PRICE_CONTEXT.
+    """
+    buy_trade = _PRICE_CONTEXT.multiply(Decimal(amount), Decimal(rate))
+    fees = _PRICE_CONTEXT.multiply(buy_trade, Decimal(fee))
+    return float(_PRICE_CONTEXT.add(buy_trade, fees))
+
+
+def _calc_close_trade_price(amount: float, rate: float, fee: float) -> float:
+    """
+    Price in BTC of selling amount at rate, minus fee.
+    Raises TypeError if rate is None.
+    """
+    sell_trade = _PRICE_CONTEXT.multiply(Decimal(amount), Decimal(rate))
+    fees = _PRICE_CONTEXT.multiply(sell_trade, Decimal(fee))
+    return float(_PRICE_CONTEXT.subtract(sell_trade, fees))
+
+
+# Closed trades moved out of the trades table by archive_trades()
+_ARCHIVE = Table(
+    'trades_archive', _DECL_BASE.metadata,
+    *[column.copy() for column in Trade.__table__.columns],
+    Index('ix_trades_archive_close_date', 'close_date')
+)
+
+# Aggregates of all archived trades per pair, the statistics are built from these
+_ARCHIVE_SUMMARY = Table(
+    'trades_archive_summary', _DECL_BASE.metadata,
+    Column('pair', String, primary_key=True),
+    Column('trade_count', Integer, nullable=False),
+    Column('profit_abs', Float, nullable=False),
+    Column('profit_percent', Float, nullable=False),
+    Column('duration', Float, nullable=False),
+    Column('first_open_date', DateTime, nullable=False),
+)
+
+
+def check_archive() -> None:
+    """
+    Archives old closed trades if internals.archive_trades_days is set,
+    at most once every ARCHIVE_INTERVAL seconds.
+    :return: None
+    """
+    global _LAST_ARCHIVE
+    days = _CONF.get('internals', {}).get('archive_trades_days')
+    if days is None or time.time() - _LAST_ARCHIVE < ARCHIVE_INTERVAL:
+        return
+    _LAST_ARCHIVE = time.time()
+    archive_trades(timedelta(days=days))
+
+
+def archive_trades(max_age: timedelta) -> int:
+    """
+    Moves all trades closed longer than max_age ago into the archive table
+    and adds them to the archive summary. The running statistics are not affected.
+    :param max_age: minimum time since the trade has been closed
+    :return: number of archived trades
+    """
+    threshold = datetime.utcnow() - max_age
+    trades = Trade.__table__
+    with unit_of_work():
+        # The trade with the highest id always stays, otherwise sqlite would reuse archived ids
+        max_id = Trade.session.query(func.max(Trade.id)).scalar()
+        if max_id is None:
+            return 0
+        condition = trades.c.is_open.is_(False) & \
+            (trades.c.close_date < threshold) & \
+            (trades.c.id < max_id)
+        rows = Trade.session.execute(select([
+            trades.c.pair, trades.c.open_date, trades.c.close_date,
+            trades.c.close_profit, trades.c.close_profit_abs
+        ]).where(condition)).fetchall()
+        if not rows:
+            return 0
+
+        summaries = {
+            row.pair: dict(row)
+            for row in Trade.session.execute(_ARCHIVE_SUMMARY.select().where(
+                _ARCHIVE_SUMMARY.c.pair.in_({row.pair for row in rows})
+            ))
+        }
+        new_pairs = {row.pair for row in rows} - set(summaries)
+        for row in rows:
+            summary = summaries.setdefault(row.pair, {
+                'pair': row.pair, 'trade_count': 0, 'profit_abs': 0.0, 'profit_percent': 0.0,
+                'duration': 0.0, 'first_open_date': row.open_date,
+            })
+            summary['trade_count'] += 1
+            summary['profit_abs'] += row.close_profit_abs or 0.0
+            summary['profit_percent'] += row.close_profit or 0.0
+            if row.open_date and row.close_date:
+                summary['duration'] += (row.close_date - row.open_date).total_seconds()
+            summary['first_open_date'] = min(summary['first_open_date'], row.open_date)
+
+        for pair, summary in summaries.items():
+            if pair in new_pairs:
+                Trade.session.execute(_ARCHIVE_SUMMARY.insert().values(**summary))
+            else:
+                Trade.session.execute(_ARCHIVE_SUMMARY.update()
+                                      .where(_ARCHIVE_SUMMARY.c.pair == pair)
+                                      .values(**summary))
+        columns = [column.name for column in trades.columns]
+        Trade.session.execute(_ARCHIVE.insert().from_select(
+            columns, select([trades.c[name] for name in columns]).where(condition)
+        ))
+        Trade.session.execute(trades.delete().where(condition))
 
-        return float("{0:.8f}".format((close_trade_price / open_trade_price) - 1))
+    logger.info('Archived %d trades closed before %s', len(rows), threshold)
+    return len(rows)
@@ -0,0 +1,236 @@
+"""
+Sampling profiler for the trading loop and the optimize commands
+"""
+import logging
+import os
+import sys
+from collections import Counter, deque
+from contextlib import contextmanager
+from threading import Event, RLock, Thread, get_ident
+from types import CodeType
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+_PROFILER: Optional['Profiler'] = None
+
+# Components the wall-clock time is attributed to, by the innermost frame within them
+COMPONENTS = (
+    ('analyze', os.path.join('freqtrade', 'analyze.py')),
+    ('exchange', os.path.join('freqtrade', 'exchange', '')),
+    ('persistence', os.path.join('freqtrade', 'persistence.py')),
+    ('rpc', os.path.join('freqtrade', 'rpc', '')),
+)
+_SITE_PACKAGES = 'site-packages' + os.sep
+_PACKAGE = os.sep + 'freqtrade' + os.sep
+
+
+class Profiler():
+    """
+    Samples the stacks of all threads which are within a profile() block.
+    The stacks are sampled from a background thread, so the profiled code
+    runs unmodified and the overhead stays low.
+    The samples of every `every` blocks are written to a file in the folded
+    stack format understood by flamegraph.pl and speedscope.
+    """
+    def __init__(self,
+                 every: int = 1,
+                 output_dir: str = 'profiles',
+                 interval: float = 0.005,
+                 keep: int = 20) -> None:
+        """
+        :param every: number of profiled blocks per dump
+        :param output_dir: directory of the dumps
+        :param interval: seconds between two samples
+        :param keep: number of dumps kept, older ones are removed
+        """
+        self.every = every
+        self.output_dir = output_dir
+        self.interval = interval
+        self.keep = keep
+        self._lock = RLock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        # Thread ids within a profile() block
+        self._active: Dict[int, str] = {}
+        # Samples since the last dump and since the start
+        self._samples: Counter = Counter()
+        self._total: Counter = Counter()
+        self._blocks = 0
+        self._dump_count = 0
+        self._dumps: Deque[str] = deque()
+        self._labels: Dict[CodeType, str] = {}
+
+    def start(self) -> None:
+        """ Starts sampling on a background thread """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread = Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Stops sampling and dumps the remaining samples """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._samples:
+                self._dump('final')
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        """
+        Samples the calling thread within the block
+        :param name: name of the block, e.g. the loop or epoch, used for the dump file name
+        """
+        thread_id = get_ident()
+        with self._lock:
+            self._active[thread_id] = name
+        try:
+            yield
+        finally:
+            with self._lock:
+                del self._active[thread_id]
+                self._blocks += 1
+                if self._blocks % self.every == 0:
+                    self._dump(name)
+
+    def summary(self, top: int = 10) -> str:
+        """
+        Returns the wall-clock time per component and the functions taking most time
+        :param top: number of functions to show
+        :return: str
+        """
+        with self._lock:
+            total = Counter(self._total)
+        count = sum(total.values())
+        if not count:
+            return 'No samples have been taken'
+
+        components: Counter = Counter()
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, samples in total.items():
+            components[self._component(stack)] += samples
+            own[stack[-1]] += samples
+            for code in set(stack):
+                inclusive[code] += samples
+
+        def rows(counter: Counter, label) -> List[Tuple]:
+            return [
+                (label(key), '{:.1f}%'.format(samples / count * 100), samples * self.interval)
+                for key, samples in counter.most_common(top)
+            ]
+
+        headers = ['', 'share', 'seconds']
+        return '\n'.join([
+            'Profiled {} samples ({:.2f} seconds):'.format(count, count * self.interval),
+            tabulate(rows(components, str), headers=['component'] + headers[1:],
+                     floatfmt='.2f'),
+            '',
+            tabulate(rows(own, self._label), headers=['self time'] + headers[1:],
+                     floatfmt='.2f'),
+            '',
+            tabulate(rows(inclusive, self._label), headers=['total time'] + headers[1:],
+                     floatfmt='.2f'),
+        ])
+
+    def _run(self) -> None:
+        own_id = get_ident()
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()  # pylint: disable=W0212
+            with self._lock:
+                for thread_id in self._active:
+                    frame = frames.get(thread_id)
+                    if frame is None or thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    stack.reverse()
+                    self._samples[tuple(stack)] += 1
+            del frames
+
+    def _dump(self, name: str) -> None:
+        self._dump_count += 1
+        file_name = os.path.join(
+            self.output_dir, 'profile-{:05d}-{}.txt'.format(self._dump_count, name)
+        )
+        try:
+            with open(file_name, 'w') as file:
+                for stack, samples in self._samples.items():
+                    file.write('{} {}\n'.format(';'.join(map(self._label, stack)), samples))
+        except OSError as error:
+            logger.warning('Unable to write profile %s: %s', file_name, error)
+        self._total.update(self._samples)
+        self._samples.clear()
+        self._dumps.append(file_name)
+
+        # Rotate the dumps
+        while len(self._dumps) > self.keep:
+            old_file = self._dumps.popleft()
+            if os.path.exists(old_file):
+                os.remove(old_file)
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # Paths relative to the installed packages or the repository
+            path = code.co_filename
+            if _SITE_PACKAGES in path:
+                path = path[path.rindex(_SITE_PACKAGES) + len(_SITE_PACKAGES):]
+            elif _PACKAGE in path:
+                path = path[path.rindex(_PACKAGE) + 1:]
+            else:
+                path = os.path.basename(path)
+            label = self._labels[code] = '{} ({}:{})'.format(
+                code.co_name, path, code.co_firstlineno
+            )
+        return label
+
+    @staticmethod
+    def _component(stack: Tuple[CodeType, ...]) -> str:
+        for code in reversed(stack):
+            for component, marker in COMPONENTS:
+                if marker in code.co_filename:
+                    return component
+        return 'other'
+
+
+@contextmanager
+def profile(name: str) -> Iterator[None]:
+    """
+    Samples the calling thread within the block, if profiling has been enabled
+    :param name: name of the block
+    """
+    if _PROFILER is None:
+        yield
+        return
+    with _PROFILER.profile(name):
+        yield
+
+
+@contextmanager
+def profiling(every: Optional[int], top: int = 20) -> Iterator[None]:
+    """
+    Enables profiling within the block and logs a summary at its end
+    :param every: number of profiled blocks per dump, profiling is disabled if not set
+    :param top: number of functions in the summary
+    """
+    global _PROFILER
+    if not every:
+        yield
+        return
+
+    _PROFILER = Profiler(every=every)
+    _PROFILER.start()
+    logger.info('Profiling enabled, writing profiles to %s/ ...', _PROFILER.output_dir)
+    try:
+        yield
+    finally:
+        profiler, _PROFILER = _PROFILER, None
+        profiler.stop()
+        logger.info('Profile summary:\n%s', profiler.summary(top))
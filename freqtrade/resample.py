@@ -0,0 +1,81 @@
+"""
+Aggregation of candles to higher ticker intervals
+"""
+from operator import itemgetter
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+def resample_ticker_history(ticker: List[Dict], tick_interval: int,
+                            source_interval: int = 1) -> List[Dict]:
+    """
+    Aggregates the given candles to a higher ticker interval.
+    The new candles start at multiples of the interval since the epoch (UTC), e.g. every
+    full hour. They take the open rate of their first candle, the highest high, the lowest low,
+    the close rate of their last candle and the summed up volumes.
+    Like the candles returned by the exchange, the last candle may not be complete yet.
+    The first candle is left out if the given candles start within its interval.
+    :param ticker: candles, format: [{'O', 'H', 'L', 'C', 'V', 'T', 'BV'}, ...]
+    :param tick_interval: ticker interval of the result in minutes
+    :param source_interval: ticker interval of the given candles in minutes
+    :return: list of candles in the same format, sorted by date
+    """
+    if tick_interval % source_interval:
+        raise ValueError('Cannot resample tick_interval {} to {}'.format(
+            source_interval, tick_interval
+        ))
+    ticker = sorted(ticker, key=itemgetter('T'))
+    if tick_interval == source_interval or not ticker:
+        return ticker
+
+    interval_secs = tick_interval * 60
+    dates = np.array([candle['T'] for candle in ticker], dtype='datetime64[s]').astype(np.int64)
+    if dates[0] % interval_secs:
+        # Leave out the incomplete first candle
+        first = int(np.searchsorted(dates, (dates[0] // interval_secs + 1) * interval_secs))
+        ticker, dates = ticker[first:], dates[first:]
+        if not ticker:
+            return []
+
+    buckets = dates // interval_secs
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(ticker)])) - 1
+
+    def column(key: str) -> np.ndarray:
+        return np.array([candle[key] for candle in ticker], dtype=float)
+
+    columns = {
+        'O': column('O')[starts],
+        'H': np.maximum.reduceat(column('H'), starts),
+        'L': np.minimum.reduceat(column('L'), starts),
+        'C': column('C')[ends],
+        'V': np.round(np.add.reduceat(column('V'), starts), 8),
+    }
+    if all('BV' in candle for candle in ticker):
+        columns['BV'] = np.round(np.add.reduceat(column('BV'), starts), 8)
+    dates = (buckets[starts] * interval_secs).astype('datetime64[s]').astype(str)
+
+    keys: Sequence[str] = list(columns)
+    values = [columns[key].tolist() for key in keys]
+    result = []
+    for date, candle in zip(dates.tolist(), zip(*values)):
+        candle = dict(zip(keys, candle))
+        candle['T'] = date
+        result.append(candle)
+    return result
+
+
+def get_source_interval(tick_interval: int, intervals: Sequence[int]) -> int:
+    """
+    Returns the largest of the given intervals which the ticker interval can be derived from
+    :param tick_interval: ticker interval in minutes
+    :param intervals: available ticker intervals in minutes
+    :return: ticker interval in minutes
+    """
+    sources = [interval for interval in intervals if tick_interval % interval == 0]
+    if not sources:
+        raise ValueError('Cannot derive tick_interval {} from {}'.format(
+            tick_interval, list(intervals)
+        ))
+    return max(sources)
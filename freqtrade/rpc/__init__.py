@@ -1,7 +1,5 @@
 import logging
 
-from . import telegram
-
 logger = logging.getLogger(__name__)
 
 
@@ -17,6 +15,8 @@ def init(config: dict) -> None:
 
     if config['telegram'].get('enabled', False):
         logger.info('Enabling rpc.telegram ...')
+        # Imported on demand, python-telegram-bot takes a while to load
+        from freqtrade.rpc import telegram
         REGISTERED_MODULES.append('telegram')
         telegram.init(config)
 
@@ -28,6 +28,7 @@ def cleanup() -> None:
     """
     if 'telegram' in REGISTERED_MODULES:
         logger.debug('Cleaning up rpc.telegram ...')
+        from freqtrade.rpc import telegram
         telegram.cleanup()
 
 
@@ -39,4 +40,5 @@ def send_msg(msg: str) -> None:
     """
     logger.info(msg)
     if 'telegram' in REGISTERED_MODULES:
+        from freqtrade.rpc import telegram
         telegram.send_msg(msg)
@@ -0,0 +1,144 @@
+""" Background delivery of outgoing rpc messages """
+import logging
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher():
+    """
+    Sends messages from a bounded queue on a background thread, so callers never block.
+    Messages which pile up while waiting for the rate limit are combined into one message,
+    if they share the same key (e.g. the parse mode).
+    """
+    def __init__(self,
+                 send: Callable[[str, Any], None],
+                 max_queue_size: int = 100,
+                 min_interval: float = 1.0,
+                 max_length: int = 4096,
+                 separator: str = '\n\n') -> None:
+        """
+        :param send: called with the message and its key for every batch
+        :param max_queue_size: messages queued beyond this are dropped
+        :param min_interval: minimum seconds between two sends
+        :param max_length: combined messages do not exceed this length
+        :param separator: inserted between combined messages
+        """
+        self._send = send
+        self._max_queue_size = max_queue_size
+        self._min_interval = min_interval
+        self._max_length = max_length
+        self._separator = separator
+        self._queue: Deque[Tuple[str, Any, float]] = deque()
+        self._condition = Condition()
+        self._running = False
+        self._thread: Optional[Thread] = None
+        self._last_send = 0.0
+        self._stats: Dict[str, float] = {
+            'queued': 0,
+            'dropped': 0,
+            'sent': 0,
+            'failed': 0,
+            'batches': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def start(self) -> None:
+        """ Starts the background thread """
+        with self._condition:
+            self._running = True
+        self._thread = Thread(target=self._run, name='rpc-dispatcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Sends all queued messages and stops the background thread
+        :param timeout: maximum seconds to wait for the queue to drain
+        :return: None
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def put(self, msg: str, key: Any = None) -> bool:
+        """
+        Queues the given message without blocking
+        :param msg: message
+        :param key: only messages with the same key are combined
+        :return: False if the queue is full and the message has been dropped
+        """
+        with self._condition:
+            if len(self._queue) >= self._max_queue_size:
+                self._stats['dropped'] += 1
+                logger.warning('Message queue is full, dropping message: %s', msg)
+                return False
+            self._queue.append((msg, key, time.time()))
+            self._stats['queued'] += 1
+            self._condition.notify()
+            return True
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Returns the delivery metrics
+        :return: dict, format: {
+            'queued': int, 'dropped': int, 'sent': int, 'failed': int, 'batches': int,
+            'pending': int, 'latency_avg': float, 'latency_max': float (in seconds)
+        }
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._queue)
+        delivered = stats['sent'] + stats['failed']
+        stats['latency_avg'] = stats.pop('latency_total') / delivered if delivered else 0.0
+        return stats
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+
+            # Messages queued in the meantime are combined with this one
+            delay = self._last_send + self._min_interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._condition:
+                batch = self._take_batch()
+            self._deliver(batch)
+
+    def _take_batch(self) -> List[Tuple[str, Any, float]]:
+        batch = [self._queue.popleft()]
+        length = len(batch[0][0])
+        while self._queue and self._queue[0][1] == batch[0][1]:
+            length += len(self._separator) + len(self._queue[0][0])
+            if length > self._max_length:
+                break
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _deliver(self, batch: List[Tuple[str, Any, float]]) -> None:
+        result = 'sent'
+        try:
+            self._send(self._separator.join(msg for msg, _, _ in batch), batch[0][1])
+        except Exception:
+            logger.exception('Unable to send %d message(s)', len(batch))
+            result = 'failed'
+        self._last_send = time.time()
+
+        with self._condition:
+            self._stats[result] += len(batch)
+            self._stats['batches'] += 1
+            for _, _, queued_at in batch:
+                latency = self._last_send - queued_at
+                self._stats['latency_total'] += latency
+                self._stats['latency_max'] = max(self._stats['latency_max'], latency)
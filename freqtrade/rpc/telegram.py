@@ -1,12 +1,11 @@
 import logging
 import re
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import timedelta, datetime
-from typing import Callable, Any
+from typing import Callable, Any, Optional, Dict, List
 
 import arrow
 from pandas import DataFrame
-from sqlalchemy import and_, func, text
 from tabulate import tabulate
 from telegram import ParseMode, Bot, Update, ReplyKeyboardMarkup
 from telegram.error import NetworkError, TelegramError
@@ -14,8 +13,10 @@ from telegram.ext import CommandHandler, Updater
 
 from freqtrade import exchange, __version__
 from freqtrade.misc import get_state, State, update_state
-from freqtrade.persistence import Trade
-from freqtrade.fiat_convert import CryptoToFiatConverter
+from freqtrade.persistence import Trade, get_open_trades, get_open_trade, get_daily_profit, \
+    get_trade_stats, get_pair_profits, unit_of_work, copy_open_trades
+from freqtrade.fiat_convert import get_converter
+from freqtrade.rpc.dispatcher import Dispatcher
 
 # Remove noisy log messages
 logging.getLogger('requests.packages.urllib3').setLevel(logging.INFO)
@@ -23,8 +24,18 @@ logging.getLogger('telegram').setLevel(logging.INFO)
 logger = logging.getLogger(__name__)
 
 _UPDATER: Updater = None
+# Delivers messages which are not replies to a command, see send_msg()
+_DISPATCHER: Optional[Dispatcher] = None
 _CONF = {}
-_FIAT_CONVERT = CryptoToFiatConverter()
+
+# Exchange lookups of /status which take longer are not waited for
+STATUS_TIMEOUT = 10
+# Used to fetch orders and rates of all open trades concurrently
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+# Latest bid rate per pair seen by /status, shown if a lookup times out
+_LAST_RATES: Dict[str, float] = {}
+# Maximum length of a telegram message
+MAX_MESSAGE_LENGTH = 4096
 
 
 def init(config: dict) -> None:
@@ -35,13 +46,16 @@ def init(config: dict) -> None:
     :param config: config to use
     :return: None
     """
-    global _UPDATER
+    global _UPDATER, _DISPATCHER
 
     _CONF.update(config)
     if not is_enabled():
         return
 
     _UPDATER = Updater(token=config['telegram']['token'], workers=0)
+    # Telegram allows about one message per second and chat
+    _DISPATCHER = Dispatcher(lambda msg, parse_mode: _send_message(msg, _UPDATER.bot, parse_mode))
+    _DISPATCHER.start()
 
     # Register command handler and start telegram message polling
     handles = [
@@ -73,11 +87,16 @@ def init(config: dict) -> None:
 
 def cleanup() -> None:
     """
-    Stops all running telegram threads.
+    Sends all queued messages and stops all running telegram threads.
     :return: None
     """
+    global _DISPATCHER
     if not is_enabled():
         return
+    if _DISPATCHER:
+        _DISPATCHER.stop()
+        logger.info('rpc.telegram message stats: %s', _DISPATCHER.get_stats())
+        _DISPATCHER = None
     _UPDATER.stop()
 
 
@@ -129,22 +148,28 @@ def _status(bot: Bot, update: Update) -> None:
         return
 
     # Fetch open trade
-    trades = Trade.query.filter(Trade.is_open.is_(True)).all()
+    trades = copy_open_trades()
     if get_state() != State.RUNNING:
         send_msg('*Status:* `trader is not running`', bot=bot)
     elif not trades:
         send_msg('*Status:* `no active trade`', bot=bot)
     else:
+        details = _fetch_trade_details(trades, with_orders=True)
+        messages = []
         for trade in trades:
-            order = None
-            if trade.open_order_id:
-                order = exchange.get_order(trade.open_order_id)
-            # calculate profit and send message to user
-            current_rate = exchange.get_ticker(trade.pair)['bid']
-            current_profit = trade.calc_profit_percent(current_rate)
+            order, current_rate, stale = details[trade.id]
             fmt_close_profit = '{:.2f}%'.format(
                 round(trade.close_profit * 100, 2)
             ) if trade.close_profit else None
+            fmt_current_rate, fmt_current_profit = 'unknown', 'unknown'
+            if current_rate:
+                fmt_current_rate = '{:.8f}{}'.format(current_rate, ' (stale)' if stale else '')
+                fmt_current_profit = '{:.2f}%'.format(
+                    round(trade.calc_profit_percent(current_rate) * 100, 2)
+                )
+            fmt_open_order = 'unknown' if trade.open_order_id else None
+            if order:
+                fmt_open_order = '({} rem={:.8f})'.format(order['type'], order['remaining'])
             message = """
 *Trade ID:* `{trade_id}`
 *Current Pair:* [{pair}]({market_url})
@@ -152,9 +177,9 @@ def _status(bot: Bot, update: Update) -> None:
 *Amount:* `{amount}`
 *Open Rate:* `{open_rate:.8f}`
 *Close Rate:* `{close_rate}`
-*Current Rate:* `{current_rate:.8f}`
+*Current Rate:* `{current_rate}`
 *Close Profit:* `{close_profit}`
-*Current Profit:* `{current_profit:.2f}%`
+*Current Profit:* `{current_profit}`
 *Open Order:* `{open_order}`
             """.format(
                 trade_id=trade.id,
@@ -163,14 +188,14 @@ def _status(bot: Bot, update: Update) -> None:
                 date=arrow.get(trade.open_date).humanize(),
                 open_rate=trade.open_rate,
                 close_rate=trade.close_rate,
-                current_rate=current_rate,
+                current_rate=fmt_current_rate,
                 amount=round(trade.amount, 8),
                 close_profit=fmt_close_profit,
-                current_profit=round(current_profit * 100, 2),
-                open_order='({} rem={:.8f})'.format(
-                    order['type'], order['remaining']
-                ) if order else None,
+                current_profit=fmt_current_profit,
+                open_order=fmt_open_order,
             )
+            messages.append(message)
+        for message in _join_messages(messages):
             send_msg(message, bot=bot)
 
 
@@ -184,21 +209,24 @@ def _status_table(bot: Bot, update: Update) -> None:
     :return: None
     """
     # Fetch open trade
-    trades = Trade.query.filter(Trade.is_open.is_(True)).all()
+    trades = copy_open_trades()
     if get_state() != State.RUNNING:
         send_msg('*Status:* `trader is not running`', bot=bot)
     elif not trades:
         send_msg('*Status:* `no active order`', bot=bot)
     else:
+        details = _fetch_trade_details(trades, with_orders=False)
         trades_list = []
         for trade in trades:
             # calculate profit and send message to user
-            current_rate = exchange.get_ticker(trade.pair)['bid']
+            _, current_rate, stale = details[trade.id]
             trades_list.append([
                 trade.id,
                 trade.pair,
                 shorten_date(arrow.get(trade.open_date).humanize(only_distance=True)),
-                '{:.2f}%'.format(100 * trade.calc_profit_percent(current_rate))
+                '{:.2f}%{}'.format(
+                    100 * trade.calc_profit_percent(current_rate), '*' if stale else ''
+                ) if current_rate else '?'
             ])
 
         columns = ['ID', 'Pair', 'Since', 'Profit']
@@ -206,9 +234,64 @@ def _status_table(bot: Bot, update: Update) -> None:
         df_statuses = df_statuses.set_index(columns[0])
 
         message = tabulate(df_statuses, headers='keys', tablefmt='simple')
+        if any(stale for _, _, stale in details.values()):
+            message += '\n* stale rate'
         message = "<pre>{}</pre>".format(message)
 
-        send_msg(message, parse_mode=ParseMode.HTML)
+        send_msg(message, bot=bot, parse_mode=ParseMode.HTML)
+
+
+def _fetch_trade_details(trades: List[Trade], with_orders: bool) -> Dict[int, tuple]:
+    """
+    Fetches the open orders and current bid rates of all given trades concurrently.
+    Lookups which fail or do not finish within STATUS_TIMEOUT are not waited for,
+    the last known rate is used instead and marked as stale.
+    :param trades: open trades
+    :param with_orders: fetch the open orders as well
+    :return: dict, trade id -> (order or None, bid rate or None, rate is stale)
+    """
+    tickers = {pair: _EXECUTOR.submit(exchange.get_ticker, pair)
+               for pair in {trade.pair for trade in trades}}
+    orders = {trade.id: _EXECUTOR.submit(exchange.get_order, trade.open_order_id)
+              for trade in trades if with_orders and trade.open_order_id}
+    wait(list(tickers.values()) + list(orders.values()), timeout=STATUS_TIMEOUT)
+
+    rates = {}
+    for pair, future in tickers.items():
+        ticker = _future_result(future, 'ticker of {}'.format(pair))
+        if ticker:
+            rates[pair] = _LAST_RATES[pair] = ticker['bid']
+
+    details = {}
+    for trade in trades:
+        order = None
+        if trade.id in orders:
+            order = _future_result(orders[trade.id], 'order {}'.format(trade.open_order_id))
+        rate = rates.get(trade.pair, _LAST_RATES.get(trade.pair))
+        details[trade.id] = (order, rate, trade.pair not in rates)
+    return details
+
+
+def _future_result(future, name: str) -> Optional[Dict]:
+    if not future.done():
+        logger.warning('Fetching %s took longer than %s seconds', name, STATUS_TIMEOUT)
+        return None
+    if future.exception():
+        logger.warning('Unable to fetch %s: %s', name, future.exception())
+        return None
+    return future.result()
+
+
+def _join_messages(messages: List[str]) -> List[str]:
+    """
+    Joins the given messages into as few messages as the maximum message length allows
+    """
+    joined = ['']
+    for message in messages:
+        if joined[-1] and len(joined[-1]) + len(message) > MAX_MESSAGE_LENGTH:
+            joined.append('')
+        joined[-1] += message
+    return joined
 
 
 @authorized_only
@@ -221,7 +304,6 @@ def _daily(bot: Bot, update: Update) -> None:
     :return: None
     """
     today = datetime.utcnow().date()
-    profit_days = {}
 
     try:
         timescale = int(update.message.text.replace('/daily', '').strip())
@@ -232,23 +314,16 @@ def _daily(bot: Bot, update: Update) -> None:
         send_msg('*Daily [n]:* `must be an integer greater than 0`', bot=bot)
         return
 
-    for day in range(0, timescale):
-        profitday = today - timedelta(days=day)
-        trades = Trade.query \
-            .filter(Trade.is_open.is_(False)) \
-            .filter(Trade.close_date >= profitday)\
-            .filter(Trade.close_date < (profitday + timedelta(days=1)))\
-            .order_by(Trade.close_date)\
-            .all()
-        curdayprofit = sum(trade.calc_profit() for trade in trades)
-        profit_days[profitday] = format(curdayprofit, '.8f')
+    profit_days = {
+        day: format(profit, '.8f') for day, profit in get_daily_profit(today, timescale).items()
+    }
 
     stats = [
         [
             key,
             '{value:.8f} {symbol}'.format(value=float(value), symbol=_CONF['stake_currency']),
             '{value:.3f} {symbol}'.format(
-                value=_FIAT_CONVERT.convert_amount(
+                value=get_converter().convert_amount(
                     value,
                     _CONF['stake_currency'],
                     _CONF['fiat_display_currency']
@@ -279,57 +354,36 @@ def _profit(bot: Bot, update: Update) -> None:
     :param update: message update
     :return: None
     """
-    trades = Trade.query.order_by(Trade.id).all()
-
-    profit_all_coin = []
-    profit_all_percent = []
-    profit_closed_coin = []
-    profit_closed_percent = []
-    durations = []
+    stats = get_trade_stats()
+    pair_profits = get_pair_profits()
+    if not pair_profits:
+        send_msg('*Status:* `no closed trade`', bot=bot)
+        return
 
-    for trade in trades:
-        current_rate = None
+    bp_pair, bp_rate = pair_profits[0]
 
+    # Closed trades are covered by the running statistics,
+    # only open trades have to be evaluated with the current rate
+    profit_all_coin = [stats['closed_profit']]
+    profit_all_percent = [stats['closed_profit_percent']]
+    for trade in copy_open_trades():
         if not trade.open_rate:
             continue
-        if trade.close_date:
-            durations.append((trade.close_date - trade.open_date).total_seconds())
-
-        if not trade.is_open:
-            profit_percent = trade.calc_profit_percent()
-            profit_closed_coin.append(trade.calc_profit())
-            profit_closed_percent.append(profit_percent)
-        else:
-            # Get current rate
-            current_rate = exchange.get_ticker(trade.pair)['bid']
-            profit_percent = trade.calc_profit_percent(rate=current_rate)
-
-        profit_all_coin.append(trade.calc_profit(rate=Decimal(trade.close_rate or current_rate)))
-        profit_all_percent.append(profit_percent)
-
-    best_pair = Trade.session.query(Trade.pair, func.sum(Trade.close_profit).label('profit_sum')) \
-        .filter(Trade.is_open.is_(False)) \
-        .group_by(Trade.pair) \
-        .order_by(text('profit_sum DESC')) \
-        .first()
-
-    if not best_pair:
-        send_msg('*Status:* `no closed trade`', bot=bot)
-        return
-
-    bp_pair, bp_rate = best_pair
+        current_rate = exchange.get_ticker(trade.pair)['bid']
+        profit_all_coin.append(trade.calc_profit(rate=current_rate))
+        profit_all_percent.append(trade.calc_profit_percent(rate=current_rate))
 
     # Prepare data to display
-    profit_closed_coin = round(sum(profit_closed_coin), 8)
-    profit_closed_percent = round(sum(profit_closed_percent) * 100, 2)
-    profit_closed_fiat = _FIAT_CONVERT.convert_amount(
+    profit_closed_coin = round(stats['closed_profit'], 8)
+    profit_closed_percent = round(stats['closed_profit_percent'] * 100, 2)
+    profit_closed_fiat = get_converter().convert_amount(
         profit_closed_coin,
         _CONF['stake_currency'],
         _CONF['fiat_display_currency']
     )
     profit_all_coin = round(sum(profit_all_coin), 8)
     profit_all_percent = round(sum(profit_all_percent) * 100, 2)
-    profit_all_fiat = _FIAT_CONVERT.convert_amount(
+    profit_all_fiat = get_converter().convert_amount(
         profit_all_coin,
         _CONF['stake_currency'],
         _CONF['fiat_display_currency']
@@ -358,10 +412,12 @@ def _profit(bot: Bot, update: Update) -> None:
         profit_all_coin=profit_all_coin,
         profit_all_percent=profit_all_percent,
         profit_all_fiat=profit_all_fiat,
-        trade_count=len(trades),
-        first_trade_date=arrow.get(trades[0].open_date).humanize(),
-        latest_trade_date=arrow.get(trades[-1].open_date).humanize(),
-        avg_duration=str(timedelta(seconds=sum(durations) / float(len(durations)))).split('.')[0],
+        trade_count=stats['trade_count'],
+        first_trade_date=arrow.get(stats['first_trade_date']).humanize(),
+        latest_trade_date=arrow.get(stats['latest_trade_date']).humanize(),
+        avg_duration=str(timedelta(
+            seconds=stats['closed_duration'] / float(stats['closed_trade_count'])
+        )).split('.')[0],
         best_pair=bp_pair,
         best_rate=round(bp_rate * 100, 2),
     )
@@ -389,7 +445,7 @@ def _balance(bot: Bot, update: Update) -> None:
 *Pending*: {Pending}
 
 """.format(**currency)
-    send_msg(output)
+    send_msg(output, bot=bot)
 
 
 @authorized_only
@@ -439,17 +495,17 @@ def _forcesell(bot: Bot, update: Update) -> None:
     trade_id = update.message.text.replace('/forcesell', '').strip()
     if trade_id == 'all':
         # Execute sell for all open orders
-        for trade in Trade.query.filter(Trade.is_open.is_(True)).all():
+        for trade in get_open_trades():
             _exec_forcesell(trade)
         return
 
     # Query for trade
-    trade = Trade.query.filter(and_(
-        Trade.id == trade_id,
-        Trade.is_open.is_(True)
-    )).first()
+    try:
+        trade = get_open_trade(int(trade_id))
+    except ValueError:
+        trade = None
     if not trade:
-        send_msg('Invalid argument. See `/help` to view usage')
+        send_msg('Invalid argument. See `/help` to view usage', bot=bot)
         logger.warning('/forcesell: Invalid argument received')
         return
 
@@ -469,11 +525,7 @@ def _performance(bot: Bot, update: Update) -> None:
         send_msg('`trader is not running`', bot=bot)
         return
 
-    pair_rates = Trade.session.query(Trade.pair, func.sum(Trade.close_profit).label('profit_sum')) \
-        .filter(Trade.is_open.is_(False)) \
-        .group_by(Trade.pair) \
-        .order_by(text('profit_sum DESC')) \
-        .all()
+    pair_rates = get_pair_profits()
 
     stats = '\n'.join('{index}.\t<code>{pair}\t{profit:.2f}%</code>'.format(
         index=i + 1,
@@ -483,7 +535,7 @@ def _performance(bot: Bot, update: Update) -> None:
 
     message = '<b>Performance:</b>\n{}'.format(stats)
     logger.debug(message)
-    send_msg(message, parse_mode=ParseMode.HTML)
+    send_msg(message, bot=bot, parse_mode=ParseMode.HTML)
 
 
 @authorized_only
@@ -499,7 +551,7 @@ def _count(bot: Bot, update: Update) -> None:
         send_msg('`trader is not running`', bot=bot)
         return
 
-    trades = Trade.query.filter(Trade.is_open.is_(True)).all()
+    trades = get_open_trades()
 
     message = tabulate({
         'current': [len(trades)],
@@ -507,7 +559,7 @@ def _count(bot: Bot, update: Update) -> None:
     }, headers=['current', 'max'], tablefmt='simple')
     message = "<pre>{}</pre>".format(message)
     logger.debug(message)
-    send_msg(message, parse_mode=ParseMode.HTML)
+    send_msg(message, bot=bot, parse_mode=ParseMode.HTML)
 
 
 @authorized_only
@@ -561,30 +613,38 @@ def shorten_date(_date):
 
 
 def _exec_forcesell(trade: Trade) -> None:
-    # Check if there is there is an open order
-    if trade.open_order_id:
-        order = exchange.get_order(trade.open_order_id)
-
-        # Cancel open LIMIT_BUY orders and close trade
-        if order and not order['closed'] and order['type'] == 'LIMIT_BUY':
-            exchange.cancel_order(trade.open_order_id)
-            trade.close(order.get('rate') or trade.open_rate)
-            # TODO: sell amount which has been bought already
+    # Store all changes in one transaction before the sell is acknowledged
+    with unit_of_work():
+        # The trade may have been sold by the exit loop in the meantime
+        if trade.is_open is False:
             return
 
-        # Ignore trades with an attached LIMIT_SELL order
-        if order and not order['closed'] and order['type'] == 'LIMIT_SELL':
-            return
+        # Check if there is there is an open order
+        if trade.open_order_id:
+            order = exchange.get_order(trade.open_order_id)
+
+            # Cancel open LIMIT_BUY orders and close trade
+            if order and not order['closed'] and order['type'] == 'LIMIT_BUY':
+                exchange.cancel_order(trade.open_order_id)
+                trade.close(order.get('rate') or trade.open_rate)
+                # TODO: sell amount which has been bought already
+                return
 
-    # Get current rate and execute sell
-    current_rate = exchange.get_ticker(trade.pair)['bid']
-    from freqtrade.main import execute_sell
-    execute_sell(trade, current_rate)
+            # Ignore trades with an attached LIMIT_SELL order
+            if order and not order['closed'] and order['type'] == 'LIMIT_SELL':
+                return
+
+        # Get current rate and execute sell
+        current_rate = exchange.get_ticker(trade.pair)['bid']
+        from freqtrade.main import execute_sell
+        execute_sell(trade, current_rate)
 
 
 def send_msg(msg: str, bot: Bot = None, parse_mode: ParseMode = ParseMode.MARKDOWN) -> None:
     """
-    Send given markdown message
+    Send given markdown message.
+    Without a bot the message is queued and sent in the background,
+    this never blocks the caller.
     :param msg: message
     :param bot: alternative bot
     :param parse_mode: telegram parse mode
@@ -593,8 +653,13 @@ def send_msg(msg: str, bot: Bot = None, parse_mode: ParseMode = ParseMode.MARKDO
     if not is_enabled():
         return
 
-    bot = bot or _UPDATER.bot
+    if bot is None and _DISPATCHER:
+        _DISPATCHER.put(msg, parse_mode)
+        return
+    _send_message(msg, bot or _UPDATER.bot, parse_mode)
+
 
+def _send_message(msg: str, bot: Bot, parse_mode: ParseMode) -> None:
     keyboard = [['/daily', '/profit', '/balance'],
                 ['/status', '/status table', '/performance'],
                 ['/count', '/start', '/stop', '/help']]
@@ -0,0 +1,153 @@
+""" Runs the jobs of the trading loop at their own cadence """
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from freqtrade import metrics, profiler
+
+logger = logging.getLogger(__name__)
+
+
+class Job():
+    """
+    A callable which is run every `interval` seconds.
+    Aligned jobs run `offset` seconds after every multiple of their interval,
+    e.g. just after a candle has been closed.
+    """
+    def __init__(self,
+                 name: str,
+                 func: Callable[..., Any],
+                 interval: float,
+                 offset: float = 0.0,
+                 align: bool = False,
+                 budget: Optional[float] = None) -> None:
+        """
+        :param name: name used in logs and metrics
+        :param func: callable without arguments
+        :param interval: seconds between two runs
+        :param offset: seconds after the interval boundary (only used if align is set,
+            otherwise the start of the first run)
+        :param align: run at multiples of the interval instead of relative to the first run
+        :param budget: runs longer than this are counted as overrun (defaults to interval)
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.offset = offset
+        self.align = align
+        self.budget = budget if budget is not None else interval
+        # The first run is due right away
+        self.next_run = 0.0
+        self.stats: Dict[str, float] = {
+            'runs': 0,
+            'overruns': 0,
+            'skipped': 0,
+            'lateness_total': 0.0,
+            'lateness_max': 0.0,
+            'duration_total': 0.0,
+            'duration_max': 0.0,
+        }
+
+    def schedule(self, start: float, end: float) -> None:
+        """
+        Calculates the next run after the given run, missed runs are skipped
+        :param start: start time of the last run in seconds since the epoch
+        :param end: end time of the last run in seconds since the epoch
+        :return: None
+        """
+        if not self.align and not self.next_run:
+            # The first run defines the cadence of unaligned jobs
+            self.offset = start
+        next_run = self.offset + ((end - self.offset) // self.interval + 1) * self.interval
+        if self.next_run:
+            self.stats['skipped'] += max((next_run - self.next_run) // self.interval - 1, 0)
+        self.next_run = next_run
+
+
+class Scheduler():
+    """
+    Runs its jobs in the calling thread, records how late each run started
+    and how long it took, and logs runs exceeding their budget.
+    """
+    def __init__(self,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self._clock = clock
+        self._sleep = sleep
+        self._jobs: List[Job] = []
+
+    def add_job(self, *args, **kwargs) -> Job:
+        """
+        Adds a new job, see Job() for the arguments
+        :return: the new job
+        """
+        job = Job(*args, **kwargs)
+        self._jobs.append(job)
+        return job
+
+    def run_pending(self) -> int:
+        """
+        Runs all jobs which are due
+        :return: number of jobs run
+        """
+        count = 0
+        for job in self._jobs:
+            now = self._clock()
+            if job.next_run <= now:
+                self._run(job, now)
+                count += 1
+        return count
+
+    def sleep(self, max_secs: Optional[float] = None) -> None:
+        """
+        Sleeps until the next job is due
+        :param max_secs: maximum time to sleep
+        :return: None
+        """
+        delay = min(job.next_run for job in self._jobs) - self._clock() if self._jobs else 0.0
+        if max_secs is not None:
+            delay = min(delay, max_secs)
+        if delay > 0:
+            self._sleep(delay)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the metrics of all jobs
+        :return: dict, format: {job name: {
+            'runs': int, 'overruns': int, 'skipped': int,
+            'lateness_avg': float, 'lateness_max': float,
+            'duration_avg': float, 'duration_max': float (in seconds)
+        }}
+        """
+        result = {}
+        for job in self._jobs:
+            stats = dict(job.stats)
+            runs = stats['runs'] or 1
+            stats['lateness_avg'] = stats.pop('lateness_total') / runs
+            stats['duration_avg'] = stats.pop('duration_total') / runs
+            result[job.name] = stats
+        return result
+
+    def _run(self, job: Job, now: float) -> None:
+        # The first run has no schedule to be late for
+        lateness = now - job.next_run if job.next_run else 0.0
+        metrics.LOOP_LAG.set(lateness, job.name)
+        try:
+            with profiler.profile(job.name):
+                job.func()
+        finally:
+            end = self._clock()
+            duration = end - now
+            job.stats['runs'] += 1
+            job.stats['lateness_total'] += lateness
+            job.stats['lateness_max'] = max(job.stats['lateness_max'], lateness)
+            job.stats['duration_total'] += duration
+            job.stats['duration_max'] = max(job.stats['duration_max'], duration)
+            if duration > job.budget:
+                job.stats['overruns'] += 1
+                logger.warning(
+                    'Job %s took %.2f seconds, exceeding its budget of %.2f seconds '
+                    '(started %.2f seconds late)',
+                    job.name, duration, job.budget, lateness
+                )
+            job.schedule(now, end)
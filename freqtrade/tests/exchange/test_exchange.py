@@ -5,9 +5,9 @@ from random import randint
 import logging
 import pytest
 
-from freqtrade import OperationalException
+from freqtrade import OperationalException, exchange, metrics
 from freqtrade.exchange import init, validate_pairs, buy, sell, get_balance, get_balances, \
-    get_ticker, cancel_order, get_name, get_fee
+    get_ticker, get_ticker_history, cancel_order, get_name, get_fee, get_order
 
 
 def test_init(default_conf, mocker, caplog):
@@ -160,10 +160,31 @@ def test_get_ticker(mocker, ticker):
     api_mock.get_ticker = MagicMock(return_value=ticker())
     mocker.patch('freqtrade.exchange._API', api_mock)
 
+    requests = metrics.EXCHANGE_SECONDS.get_count('get_ticker')
     ticker = get_ticker(pair='BTC_ETH')
     assert ticker['bid'] == 0.00001098
     assert ticker['ask'] == 0.00001099
     assert ticker['bid'] == 0.00001098
+    assert metrics.EXCHANGE_SECONDS.get_count('get_ticker') == requests + 1
+
+
+def test_get_ticker_history_derived_interval(mocker, ticker_history):
+    api_mock = MagicMock()
+    api_mock.get_ticker_history = MagicMock(return_value=ticker_history)
+    mocker.patch('freqtrade.exchange._API', api_mock)
+    exchange._TICKER_HISTORY_CACHE.clear()
+
+    # Served by the exchange
+    assert get_ticker_history('BTC_ETH', 5) == ticker_history
+    assert api_mock.get_ticker_history.call_args[0] == ('BTC_ETH', 5)
+
+    # Derived from 5 min candles
+    history = get_ticker_history('BTC_ETH', 15)
+    assert api_mock.get_ticker_history.call_args[0] == ('BTC_ETH', 5)
+    assert history == [{
+        'O': 8.891e-05, 'H': 8.893e-05, 'L': 8.875e-05, 'C': 8.877e-05, 'V': 7920.73570705,
+        'BV': 0.7039405, 'T': '2017-11-26T09:00:00',
+    }]
 
 
 def test_cancel_order_dry_run(default_conf, mocker):
@@ -186,3 +207,14 @@ def test_get_fee(default_conf, mocker):
     init(default_conf)
 
     assert get_fee() == 0.0025
+
+
+def test_get_order_dry_run(default_conf, mocker):
+    default_conf['dry_run'] = True
+    mocker.patch.dict('freqtrade.exchange._CONF', default_conf)
+
+    order_id = buy(pair='BTC_ETH', rate=200, amount=1)
+    order = get_order(order_id)
+    assert order['id'] == order_id
+    assert order['type'] == 'LIMIT_BUY'
+    assert order['closed'] is not None
@@ -30,3 +30,11 @@ def test_validate_response_min_trade_requirement_not_met():
     }
     with pytest.raises(ContentDecodingError, match=r'.*MIN_TRADE_REQUIREMENT_NOT_MET.*'):
         Bittrex._validate_response(response)
+
+
+def test_get_ticker_history_missing_property(default_conf, mocker, ticker_history):
+    del ticker_history[1]['C']
+    api_mock = mocker.patch('freqtrade.exchange.bittrex._Bittrex').return_value
+    api_mock.get_candles.return_value = {'success': True, 'message': '', 'result': ticker_history}
+    with pytest.raises(ContentDecodingError, match=r'Required property C not present'):
+        Bittrex(default_conf['exchange']).get_ticker_history('BTC_ETH', 5)
@@ -0,0 +1,74 @@
+# pragma pylint: disable=missing-docstring,C0103
+import pytest
+
+from freqtrade.exchange.dry_run import DryRun
+
+
+def test_dry_run_unique_ids():
+    dry_run = DryRun()
+    buy_id = dry_run.buy('BTC_ETH', 0.00001099, 90.0)
+    sell_id = dry_run.sell('BTC_ETH', 0.00001172, 90.0)
+    assert buy_id.startswith('dry_run_buy_')
+    assert sell_id.startswith('dry_run_sell_')
+    assert int(buy_id.split('_')[-1]) < int(sell_id.split('_')[-1])
+
+
+def test_dry_run_fill_without_ticker():
+    dry_run = DryRun()
+    order_id = dry_run.buy('BTC_ETH', 0.00001099, 90.0)
+    order = dry_run.get_order(order_id)
+    assert order['id'] == order_id
+    assert order['type'] == 'LIMIT_BUY'
+    assert order['remaining'] == 0.0
+    assert order['closed'] is not None
+
+
+def test_dry_run_fill_against_ticker():
+    dry_run = DryRun()
+    dry_run.update_ticker('BTC_ETH', {'bid': 0.00001098, 'ask': 0.00001099, 'last': 0.00001098})
+
+    buy_id = dry_run.buy('BTC_ETH', 0.00001000, 90.0)
+    sell_id = dry_run.sell('BTC_ETH', 0.00001172, 90.0)
+    assert dry_run.get_order(buy_id)['closed'] is None
+    assert dry_run.get_order(sell_id)['closed'] is None
+    assert dry_run.open_orders_count == 2
+
+    # Market moves down, only the buy order gets filled
+    dry_run.update_ticker('BTC_ETH', {'bid': 0.00000999, 'ask': 0.00001000, 'last': 0.00001000})
+    assert dry_run.get_order(buy_id)['closed'] is not None
+    assert dry_run.get_order(sell_id)['closed'] is None
+    assert dry_run.open_orders_count == 1
+
+    # Market moves up, the sell order gets filled
+    dry_run.update_ticker('BTC_ETH', {'bid': 0.00001172, 'ask': 0.00001173, 'last': 0.00001172})
+    assert dry_run.get_order(sell_id)['remaining'] == 0.0
+    assert dry_run.open_orders_count == 0
+
+
+def test_dry_run_evicts_closed_orders():
+    dry_run = DryRun()
+    order_ids = [
+        dry_run.buy('BTC_ETH', 0.00001099, 1.0)
+        for _ in range(DryRun.CLOSED_ORDERS_CACHE_SIZE * 2)
+    ]
+    for order_id in order_ids:
+        dry_run.get_order(order_id)
+    assert dry_run.open_orders_count == 0
+    assert len(dry_run._closed_orders) == DryRun.CLOSED_ORDERS_CACHE_SIZE
+
+    # Recently closed orders can still be retrieved
+    assert dry_run.get_order(order_ids[-1])['closed'] is not None
+    with pytest.raises(KeyError):
+        dry_run.get_order(order_ids[0])
+
+
+def test_dry_run_cancel_order():
+    dry_run = DryRun()
+    dry_run.update_ticker('BTC_ETH', {'bid': 0.00001098, 'ask': 0.00001099, 'last': 0.00001098})
+    order_id = dry_run.buy('BTC_ETH', 0.00001000, 90.0)
+    assert dry_run.open_orders_count == 1
+
+    dry_run.cancel_order(order_id)
+    assert dry_run.open_orders_count == 0
+    with pytest.raises(KeyError):
+        dry_run.get_order(order_id)
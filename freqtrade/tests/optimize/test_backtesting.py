@@ -1,28 +1,101 @@
 # pragma pylint: disable=missing-docstring,W0212
 
 import math
+from datetime import datetime, timedelta
+
 import pandas as pd
+import pytest
 # from unittest.mock import MagicMock
 from freqtrade import exchange, optimize
 from freqtrade.exchange import Bittrex
-from freqtrade.optimize.backtesting import backtest, generate_text_table, get_timeframe
+from freqtrade.optimize.backtesting import backtest, calculate_equity, calculate_max_drawdown, \
+    backtest_stream, calculate_pair_stats, compare_results, generate_summary_table, \
+    generate_text_table, get_timeframe, iter_chunks
 # import freqtrade.optimize.backtesting as backtesting
 
 
 def test_generate_text_table():
     results = pd.DataFrame(
         {
-            'currency': ['BTC_ETH', 'BTC_ETH'],
-            'profit_percent': [0.1, 0.2],
-            'profit_BTC': [0.2, 0.4],
-            'duration': [10, 30]
+            'currency': ['BTC_ETH', 'BTC_ETH', 'BTC_LTC', 'BTC_LTC'],
+            'profit_percent': [0.1, 0.2, 0.1, -0.05],
+            'profit_BTC': [0.2, 0.4, 0.2, -0.1],
+            'duration': [10, 30, 20, 20]
+        }
+    )
+    # BTC_ETH has no losing trade, BTC_XMR no trade at all
+    data = {'BTC_ETH': {}, 'BTC_LTC': {}, 'BTC_XMR': {}}
+    assert generate_text_table(data, results, 'BTC', 5) == (
+        'pair       buy count  avg profit    total profit    avg duration    win rate    '
+        'profit factor\n'
+        '-------  -----------  ------------  --------------  --------------  ----------  '
+        '---------------\n'
+        'BTC_ETH            2  15.00%        0.60000000 BTC  100.00          100.00%     '
+        '∞\n'
+        'BTC_LTC            2  2.50%         0.10000000 BTC  100.00          50.00%      '
+        '2.00\n'
+        'BTC_XMR            0  -             0.00000000 BTC  -               -           '
+        '-\n'
+        'TOTAL              4  8.75%         0.70000000 BTC  100.00          75.00%      '
+        '8.00')
+
+
+def test_calculate_pair_stats():
+    results = pd.DataFrame(
+        {
+            'currency': ['BTC_ETH', 'BTC_LTC', 'BTC_ETH', 'BTC_LTC', 'BTC_ETH'],
+            'profit_percent': [0.1, -0.2, 0.05, 0.3, -0.1],
+            'profit_BTC': [1.0, -2.0, 0.5, 3.0, -1.5],
+            'duration': [1, 2, 3, 4, 5],
+        }
+    )
+    stats = calculate_pair_stats({'BTC_ETH': {}, 'BTC_LTC': {}, 'BTC_XMR': {}}, results)
+    assert list(stats.index) == ['BTC_ETH', 'BTC_LTC', 'BTC_XMR', 'TOTAL']
+    assert list(stats['count']) == [3, 2, 0, 5]
+    assert stats.loc['BTC_ETH', 'profit_sum'] == 0.0
+    assert round(stats.loc['BTC_LTC', 'profit_mean'], 8) == 0.05
+    assert stats.loc['BTC_LTC', 'duration_mean'] == 3
+    assert stats.loc['BTC_LTC', 'win_rate'] == 0.5
+    assert stats.loc['BTC_LTC', 'profit_factor'] == 1.5
+    assert stats.loc['TOTAL', 'profit_sum'] == 1.0
+    assert stats.loc['TOTAL', 'win_rate'] == 0.6
+    assert round(stats.loc['TOTAL', 'profit_factor'], 4) == round(4.5 / 3.5, 4)
+    # Pairs without trades have no averages
+    assert stats.loc['BTC_XMR', 'profit_sum'] == 0.0
+    assert math.isnan(stats.loc['BTC_XMR', 'profit_mean'])
+    assert math.isnan(stats.loc['BTC_XMR', 'win_rate'])
+
+
+def test_calculate_equity_and_drawdown():
+    results = pd.DataFrame(
+        {
+            'currency': ['BTC_ETH'] * 5,
+            'profit_percent': [0.1] * 5,
+            'profit_BTC': [2.0, -1.0, -2.0, 3.0, 0.5],
+            'duration': [1] * 5,
+            'close_date': pd.to_datetime(['2018-01-01', '2018-01-03', '2018-01-02',
+                                          '2018-01-04', '2018-01-05']),
         }
     )
-    assert generate_text_table({'BTC_ETH': {}}, results, 'BTC', 5) == (
-        'pair       buy count  avg profit    total profit      avg duration\n'
-        '-------  -----------  ------------  --------------  --------------\n'
-        'BTC_ETH            2  15.00%        0.60000000 BTC             100\n'
-        'TOTAL              2  15.00%        0.60000000 BTC             100')
+    equity = calculate_equity(results)
+    # Ordered by the close date
+    assert list(equity.values) == [2.0, 0.0, -1.0, 2.0, 2.5]
+    drawdown, high, low = calculate_max_drawdown(equity)
+    assert drawdown == 3.0
+    assert high == pd.Timestamp('2018-01-01')
+    assert low == pd.Timestamp('2018-01-03')
+
+    summary = generate_summary_table(results, 'BTC')
+    assert 'final equity     2.50000000 BTC' in summary
+    assert 'max drawdown     3.00000000 BTC' in summary
+    assert '2018-01-01T00:00:00+00:00 - 2018-01-03T00:00:00+00:00' in summary
+
+
+def test_calculate_max_drawdown_from_start():
+    drawdown, high, low = calculate_max_drawdown(pd.Series([-1.0, -3.0, 1.0]))
+    assert (drawdown, high, low) == (3.0, None, 1)
+    assert calculate_max_drawdown(pd.Series([1.0, 2.0])) == (0.0, None, None)
+    assert calculate_max_drawdown(pd.Series([])) == (0.0, None, None)
 
 
 def test_get_timeframe():
@@ -41,6 +114,146 @@ def test_backtest(default_conf, mocker):
     assert not results.empty
 
 
+def test_backtest_compact(default_conf, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    exchange._API = Bittrex({'key': '', 'secret': ''})
+
+    data = optimize.load_data(ticker_interval=5, pairs=['BTC_ETH', 'BTC_LTC'])
+    reference = backtest(default_conf['stake_amount'], optimize.preprocess(data), 0, False)
+    results = backtest(
+        default_conf['stake_amount'], optimize.preprocess(data, compact=True), 0, False
+    )
+    assert not results.empty
+    assert compare_results(results, reference)
+
+
+def _results(profits, pair='BTC_ETH'):
+    return pd.DataFrame({
+        'currency': pair,
+        'profit_percent': profits,
+        'close_date': pd.date_range('2018-01-01', periods=len(profits), freq='5min'),
+    })
+
+
+def test_compare_results():
+    reference = _results([0.01] * 99 + [0.005])
+    assert compare_results(reference, reference)
+    assert compare_results(_results([0.01] * 99), reference)
+    assert not compare_results(_results([0.01] * 98), reference)
+    assert compare_results(_results([]), _results([]))
+
+    # The same number of trades, but other pairs
+    assert not compare_results(_results([0.01] * 100, pair='BTC_LTC'), reference)
+
+
+def test_compare_results_profit_diverges():
+    reference = _results([0.01] * 100)
+    assert compare_results(_results([0.01] * 99 + [0.0105]), reference)
+    # Totals diverge by 50% of the reference profit
+    assert not compare_results(_results([0.015] * 100), reference)
+    # Totals match, but single trades differ
+    assert not compare_results(_results([0.0] * 50 + [0.02] * 50), reference)
+
+
+def test_backtest_stream(default_conf, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+
+    data = optimize.load_data(ticker_interval=1, pairs=['BTC_ETH', 'BTC_LTC'])
+    for realistic, max_open_trades in [(False, 0), (True, 1)]:
+        results = backtest(
+            default_conf['stake_amount'], optimize.preprocess(data), max_open_trades, realistic
+        )
+        stream_results = backtest_stream(
+            default_conf['stake_amount'], data.items(), max_open_trades, realistic,
+            chunk_size=1000
+        )
+        assert not results.empty
+        pd.testing.assert_frame_equal(stream_results, results)
+
+
+def test_iter_chunks(mocker):
+    data = optimize.load_data(ticker_interval=5, pairs=['BTC_ETH'])['BTC_ETH']
+    populate_indicators = _patch_signals(mocker)
+    chunks = list(iter_chunks(data, chunk_size=1000, warmup=100))
+    assert [start for start, _ in chunks] == list(range(0, len(data), 1000))
+    assert sum(len(chunk) for _, chunk in chunks) == len(data)
+    assert chunks[1][1].index[0] == 1000
+    # Every chunk but the first is analyzed with the warm-up candles
+    assert len(populate_indicators.call_args_list[1][0][0]) == 1100
+    assert list(chunks[1][1].date)[0] == pd.Timestamp(data[1000]['T'], tz='UTC')
+
+
+def _signal_candles(closes, signals):
+    """ Candles with the given close rates, the volume carries the signal (1: buy, 2: sell) """
+    start = datetime(2017, 11, 14)
+    return [{'O': close, 'H': close, 'L': close, 'C': close, 'V': signal, 'BV': 0,
+             'T': (start + timedelta(minutes=5 * index)).isoformat()}
+            for index, (close, signal) in enumerate(zip(closes, signals))]
+
+
+def _patch_signals(mocker):
+    """ Replaces the strategy by the signals of _signal_candles() """
+    def populate_buy_trend(dataframe):
+        dataframe.loc[dataframe['volume'] == 1, 'buy'] = 1
+        return dataframe
+
+    def populate_sell_trend(dataframe):
+        dataframe.loc[dataframe['volume'] == 2, 'sell'] = 1
+        return dataframe
+
+    mocker.patch('freqtrade.optimize.populate_indicators', side_effect=lambda frame: frame)
+    mocker.patch('freqtrade.optimize.backtesting.populate_buy_trend', populate_buy_trend)
+    mocker.patch('freqtrade.optimize.backtesting.populate_sell_trend', populate_sell_trend)
+    return mocker.patch('freqtrade.optimize.backtesting.populate_indicators',
+                        side_effect=lambda frame: frame)
+
+
+@pytest.mark.parametrize('realistic,final_close,durations', [
+    # The first trade never closes, the second one is traded in realistic mode too
+    (True, 0.5, [2]),
+    (False, 0.5, [2]),
+    # The first trade closes at the last candle, the second one is skipped in realistic mode
+    (True, 1.2, [7]),
+    (False, 1.2, [7, 2]),
+])
+def test_backtest_stream_open_trade(default_conf, mocker, realistic, final_close, durations):
+    conf = dict(default_conf)
+    del conf['stoploss']
+    mocker.patch.dict('freqtrade.main._CONF', conf, clear=True)
+    _patch_signals(mocker)
+
+    ticker = _signal_candles(
+        [1.0, 0.5, 0.5, 0.5, 0.6, 0.5, 0.5, final_close],
+        [1, 0, 1, 0, 0, 0, 0, 0]
+    )
+    results = backtest(1, optimize.preprocess({'BTC_ETH': ticker}), 0, realistic)
+    assert results.duration.tolist() == durations
+    for chunk_size in [1, 2, 3, 100]:
+        stream_results = backtest_stream(
+            1, [('BTC_ETH', ticker)], 0, realistic, chunk_size=chunk_size, warmup=0
+        )
+        pd.testing.assert_frame_equal(stream_results, results)
+
+
+def test_backtest_stream_max_open_trades(default_conf, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    _patch_signals(mocker)
+
+    closes = [1.0, 0.99, 0.98, 0.99, 1.0, 1.1, 1.0, 0.9, 1.0, 1.2]
+    data = {
+        'BTC_ETH': _signal_candles(closes, [1, 1, 0, 1, 0, 0, 1, 0, 2, 0]),
+        'BTC_LTC': _signal_candles(closes, [0, 1, 1, 0, 1, 0, 0, 1, 1, 0]),
+    }
+    for realistic in [False, True]:
+        results = backtest(1, optimize.preprocess(data), 2, realistic)
+        assert not results.empty
+        for chunk_size in [1, 3, 100]:
+            stream_results = backtest_stream(
+                1, data.items(), 2, realistic, chunk_size=chunk_size, warmup=0
+            )
+            pd.testing.assert_frame_equal(stream_results, results)
+
+
 def test_backtest_1min_ticker_interval(default_conf, mocker):
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     exchange._API = Bittrex({'key': '', 'secret': ''})
@@ -42,7 +42,7 @@ def test_start_calls_fmin(mocker):
 
 
 def test_start_uses_mongotrials(mocker):
-    mock_mongotrials = mocker.patch('freqtrade.optimize.hyperopt.MongoTrials',
+    mock_mongotrials = mocker.patch('hyperopt.mongoexp.MongoTrials',
                                     return_value=create_trials(mocker))
     mocker.patch('freqtrade.optimize.preprocess')
     mocker.patch('freqtrade.optimize.load_data')
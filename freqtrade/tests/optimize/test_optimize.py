@@ -1,11 +1,16 @@
 # pragma pylint: disable=missing-docstring,W0212
 
+import json
 import os
 import logging
 from shutil import copyfile
+import numpy as np
+import pandas as pd
 from freqtrade import exchange, optimize
 from freqtrade.exchange import Bittrex
-from freqtrade.optimize.__init__ import testdata_path, download_pairs, download_backtesting_testdata
+from freqtrade.optimize.__init__ import testdata_path, download_pairs, \
+    download_backtesting_testdata, derive_backtesting_testdata, compact_dataframe
+from freqtrade.resample import resample_ticker_history
 
 
 def _backup_file(file: str, copy_file: bool = False) -> None:
@@ -90,12 +95,87 @@ def test_load_data_with_new_pair_1min(default_conf, ticker_history, mocker, capl
     _clean_test_file(file)
 
 
+def test_load_data_derived_interval(default_conf, mocker, caplog):
+    download_mock = mocker.patch('freqtrade.optimize.download_backtesting_testdata')
+    resample_mock = mocker.patch('freqtrade.optimize.resample_ticker_history',
+                                 side_effect=resample_ticker_history)
+    optimize._RESAMPLE_CACHE.clear()
+
+    # There are no stored 15 min candles
+    data = optimize.load_data(ticker_interval=15, pairs=['BTC_ETH'])
+    assert download_mock.call_count == 0
+    with open('freqtrade/tests/testdata/BTC_ETH-1.json') as file:
+        assert data['BTC_ETH'] == resample_ticker_history(json.load(file), 15)
+
+    # The derived candles are cached, every caller gets its own list
+    cached_data = optimize.load_data(ticker_interval=15, pairs=['BTC_ETH'])
+    assert cached_data == data
+    assert cached_data['BTC_ETH'] is not data['BTC_ETH']
+    assert resample_mock.call_count == 1
+
+
+def test_load_data_derived_interval_cache_size(mocker):
+    sizes = {15: 150000, 30: 150000, 60: 250000}
+    resample_mock = mocker.patch('freqtrade.optimize.resample_ticker_history',
+                                 side_effect=lambda ticker, interval: [{}] * sizes[interval])
+    optimize._RESAMPLE_CACHE.clear()
+
+    # The cache holds at most RESAMPLE_CACHE_CANDLES candles
+    optimize.load_data(ticker_interval=15, pairs=['BTC_ETH'])
+    optimize.load_data(ticker_interval=30, pairs=['BTC_ETH'])
+    assert optimize._RESAMPLE_CACHE.currsize == 150000
+    optimize.load_data(ticker_interval=30, pairs=['BTC_ETH'])
+    assert resample_mock.call_count == 2
+
+    # Larger histories are not cached at all
+    optimize.load_data(ticker_interval=60, pairs=['BTC_ETH'])
+    assert optimize._RESAMPLE_CACHE.currsize == 150000
+    optimize._RESAMPLE_CACHE.clear()
+
+
+def test_load_data_derived_interval_new_pair(default_conf, ticker_history, mocker, caplog):
+    ticker_mock = mocker.patch('freqtrade.optimize.get_ticker_history',
+                               return_value=ticker_history)
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    exchange._API = Bittrex({'key': '', 'secret': ''})
+
+    file = 'freqtrade/tests/testdata/BTC_MEME-1.json'
+    _backup_file(file)
+    data = optimize.load_data(ticker_interval=5, pairs=['BTC_MEME'])
+    assert os.path.isfile(file) is True
+    assert not os.path.isfile('freqtrade/tests/testdata/BTC_MEME-5.json')
+    assert ticker_mock.call_args[1]['tick_interval'] == 1
+    assert data['BTC_MEME'] == ticker_history
+    _clean_test_file(file)
+
+
+def test_derive_backtesting_testdata(default_conf, ticker_history, mocker):
+    file1 = 'freqtrade/tests/testdata/BTC_MEME-1.json'
+    file5 = 'freqtrade/tests/testdata/BTC_MEME-5.json'
+    _backup_file(file1)
+    _backup_file(file5)
+    stored = dict(ticker_history[0], T='2017-11-26T08:00:00')
+    replaced = dict(ticker_history[0], V=1.0)
+    with open(file1, 'w') as file:
+        json.dump(ticker_history, file)
+    with open(file5, 'w') as file:
+        json.dump([replaced, stored], file)
+
+    assert derive_backtesting_testdata(pair='BTC-MEME', interval=5) is True
+    with open(file5) as file:
+        assert json.load(file) == [stored] + ticker_history
+
+    _clean_test_file(file1)
+    _clean_test_file(file5)
+
+
 def test_testdata_path():
     assert os.path.join('freqtrade', 'tests', 'testdata') in testdata_path()
 
 
 def test_download_pairs(default_conf, ticker_history, mocker):
-    mocker.patch('freqtrade.optimize.__init__.get_ticker_history', return_value=ticker_history)
+    ticker_mock = mocker.patch('freqtrade.optimize.__init__.get_ticker_history',
+                               return_value=ticker_history)
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     exchange._API = Bittrex({'key': '', 'secret': ''})
 
@@ -115,6 +195,8 @@ def test_download_pairs(default_conf, ticker_history, mocker):
     assert os.path.isfile(file1_5) is True
     assert os.path.isfile(file2_1) is True
     assert os.path.isfile(file2_5) is True
+    # The 5 min candles are derived from the 1 min candles
+    assert [call[1]['tick_interval'] for call in ticker_mock.call_args_list] == [1, 1]
 
     # clean files freshly downloaded
     _clean_test_file(file1_1)
@@ -164,3 +246,53 @@ def test_download_backtesting_testdata(default_conf, ticker_history, mocker):
     download_backtesting_testdata(pair="BTC-STORJ", interval=5)
     assert os.path.isfile(file2) is True
     _clean_test_file(file2)
+
+
+def test_compact_dataframe():
+    dataframe = pd.DataFrame({
+        'close': [0.1, 0.2],
+        'volume': [1.5, 2.5],
+        'rsi': [30.5, 70.25],
+        'cdl': np.array([0, 100], dtype=np.int64),
+        'date': pd.to_datetime(['2017-11-26T08:50:00', '2017-11-26T08:55:00'], utc=True),
+    })
+    compact = compact_dataframe(dataframe)
+    assert compact['close'].dtype == np.float64
+    assert compact['volume'].dtype == np.float64
+    assert compact['rsi'].dtype == np.float32
+    assert compact['cdl'].dtype == np.int32
+    assert compact['date'].dtype == dataframe['date'].dtype
+    assert compact['rsi'].tolist() == [30.5, 70.25]
+    # The given dataframe is unchanged
+    assert dataframe['rsi'].dtype == np.float64
+
+
+def test_preprocess_compact(mocker):
+    mocker.patch('freqtrade.optimize.populate_indicators', side_effect=lambda frame: frame.assign(
+        rsi=frame['close'] * 2
+    ))
+    data = optimize.load_data(ticker_interval=5, pairs=['BTC_ETH'])
+    processed = optimize.preprocess(data, compact=True)['BTC_ETH']
+    assert processed['rsi'].dtype == np.float32
+    assert processed['close'].dtype == np.float64
+    assert optimize.preprocess(data)['BTC_ETH']['rsi'].dtype == np.float64
+
+
+def test_iter_data():
+    data = optimize.iter_data(ticker_interval=5, pairs=['BTC_ETH', 'BTC_LTC'])
+    pair, ticker = next(data)
+    assert pair == 'BTC_ETH'
+    assert ticker == optimize.load_data(ticker_interval=5, pairs=['BTC_ETH'])['BTC_ETH']
+    assert [pair for pair, _ in data] == ['BTC_LTC']
+
+
+def test_iter_data_derived_interval():
+    optimize._RESAMPLE_CACHE.clear()
+    data = optimize.iter_data(ticker_interval=15, pairs=['BTC_ETH', 'BTC_LTC'])
+    pair, ticker = next(data)
+    assert ticker == optimize.load_data(ticker_interval=15, pairs=['BTC_ETH'])['BTC_ETH']
+    optimize._RESAMPLE_CACHE.clear()
+
+    # Streamed pairs are not kept in memory
+    assert [pair for pair, _ in data] == ['BTC_LTC']
+    assert len(optimize._RESAMPLE_CACHE) == 0
@@ -0,0 +1,50 @@
+# pragma pylint: disable=missing-docstring, C0103
+import json
+import os
+
+from freqtrade.optimize.synthetic import CANDLE_KEYS, generate_data, generate_ticker_history, \
+    save_data
+
+
+def test_generate_ticker_history():
+    candles = generate_ticker_history(1000, ticker_interval=5, seed=1,
+                                      start='2017-11-20T08:55:00', start_price=0.05)
+    assert len(candles) == 1000
+    assert candles[0]['O'] == 0.05
+    assert candles[0]['T'] == '2017-11-20T08:55:00'
+    assert candles[1]['T'] == '2017-11-20T09:00:00'
+    assert candles[-1]['T'] == '2017-11-23T20:10:00'
+    for previous, candle in zip(candles, candles[1:]):
+        assert tuple(candle) == CANDLE_KEYS
+        assert candle['O'] == previous['C']
+        assert candle['L'] <= min(candle['O'], candle['C'])
+        assert candle['H'] >= max(candle['O'], candle['C'])
+        assert candle['V'] > 0
+        assert candle['BV'] > 0
+
+
+def test_generate_ticker_history_seed():
+    assert generate_ticker_history(100, seed=1) == generate_ticker_history(100, seed=1)
+    assert generate_ticker_history(100, seed=1) != generate_ticker_history(100, seed=2)
+
+
+def test_generate_data():
+    data = generate_data(3, days=1, ticker_interval=1, seed=5)
+    assert sorted(data) == ['BTC_SYN0000', 'BTC_SYN0001', 'BTC_SYN0002']
+    assert all(len(candles) == 1440 for candles in data.values())
+    assert data['BTC_SYN0000'] != data['BTC_SYN0001']
+
+    # Adding pairs leaves the existing ones unchanged
+    more_data = generate_data(5, days=1, ticker_interval=1, seed=5)
+    assert more_data['BTC_SYN0002'] == data['BTC_SYN0002']
+
+    data = generate_data(['BTC_ETH', 'BTC_LTC'], days=2)
+    assert sorted(data) == ['BTC_ETH', 'BTC_LTC']
+    assert len(data['BTC_ETH']) == 576
+
+
+def test_save_data(tmpdir):
+    data = generate_data(['BTC-ETH'], days=1)
+    save_data(data, str(tmpdir), ticker_interval=5)
+    with open(os.path.join(str(tmpdir), 'BTC_ETH-5.json')) as file:
+        assert json.load(file) == data['BTC-ETH']
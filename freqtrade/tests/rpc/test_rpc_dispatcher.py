@@ -0,0 +1,84 @@
+# pragma pylint: disable=missing-docstring, C0103
+import threading
+from unittest.mock import MagicMock
+
+from freqtrade.rpc.dispatcher import Dispatcher
+
+
+def test_dispatcher_sends_in_background():
+    sent = []
+    release = threading.Event()
+
+    def send(msg, key):
+        release.wait(5)
+        sent.append((msg, key, threading.current_thread().name))
+
+    dispatcher = Dispatcher(send, min_interval=0)
+    dispatcher.start()
+    assert dispatcher.put('first', 'markdown') is True
+    # put() returns while the first message is still being sent
+    release.set()
+    dispatcher.stop()
+    assert sent == [('first', 'markdown', 'rpc-dispatcher')]
+
+    stats = dispatcher.get_stats()
+    assert stats['queued'] == 1
+    assert stats['sent'] == 1
+    assert stats['batches'] == 1
+    assert stats['pending'] == 0
+    assert stats['latency_max'] >= stats['latency_avg'] > 0
+
+
+def test_dispatcher_coalesces_burst():
+    send = MagicMock()
+    dispatcher = Dispatcher(send, min_interval=0, max_length=20, separator='|')
+    for msg, key in [('a', 'md'), ('b', 'md'), ('c', 'html'), ('d', 'html'),
+                     ('x' * 17, 'html'), ('e', 'md')]:
+        dispatcher.put(msg, key)
+
+    # Messages are combined as long as key and maximum length allow
+    dispatcher.start()
+    dispatcher.stop()
+    assert [call[0] for call in send.call_args_list] == [
+        ('a|b', 'md'), ('c|d', 'html'), ('x' * 17, 'html'), ('e', 'md')
+    ]
+    assert dispatcher.get_stats()['sent'] == 6
+    assert dispatcher.get_stats()['batches'] == 4
+
+
+def test_dispatcher_rate_limit(mocker):
+    sleep_mock = mocker.patch('freqtrade.rpc.dispatcher.time.sleep')
+    send = MagicMock()
+    dispatcher = Dispatcher(send, min_interval=3600)
+    dispatcher._last_send = 1.0e12
+    dispatcher.put('test')
+    dispatcher.start()
+    dispatcher.stop()
+
+    assert sleep_mock.call_count == 1
+    assert sleep_mock.call_args[0][0] > 3000
+    assert send.call_count == 1
+
+
+def test_dispatcher_drops_when_full():
+    send = MagicMock()
+    dispatcher = Dispatcher(send, max_queue_size=2)
+    assert dispatcher.put('1') is True
+    assert dispatcher.put('2') is True
+    assert dispatcher.put('3') is False
+
+    stats = dispatcher.get_stats()
+    assert stats['queued'] == 2
+    assert stats['dropped'] == 1
+    assert stats['pending'] == 2
+
+
+def test_dispatcher_send_failure():
+    dispatcher = Dispatcher(MagicMock(side_effect=ValueError('Oh snap')))
+    dispatcher.put('test')
+    dispatcher.start()
+    dispatcher.stop()
+
+    stats = dispatcher.get_stats()
+    assert stats['failed'] == 1
+    assert stats['sent'] == 0
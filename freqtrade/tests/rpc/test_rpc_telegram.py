@@ -1,21 +1,23 @@
 # pragma pylint: disable=missing-docstring, too-many-arguments, too-many-ancestors, C0103
 import re
+import threading
+from copy import deepcopy
 from datetime import datetime
 from random import randint
 from unittest.mock import MagicMock
 
 from sqlalchemy import create_engine
-from telegram import Update, Message, Chat
+from telegram import Update, Message, Chat, ParseMode
 from telegram.error import NetworkError
 
 from freqtrade import __version__
 from freqtrade.main import init, create_trade
 from freqtrade.misc import update_state, State, get_state
-from freqtrade.persistence import Trade
+from freqtrade.persistence import Trade, unit_of_work
 from freqtrade.rpc import telegram
 from freqtrade.rpc.telegram import authorized_only, is_enabled, send_msg, _status, _status_table, \
     _profit, _forcesell, _performance, _daily, _count, _start, _stop, _balance, _version, _help, \
-    _exec_forcesell
+    _exec_forcesell, _join_messages
 
 
 def test_is_enabled(default_conf, mocker):
@@ -110,6 +112,112 @@ def test_status_handle(default_conf, update, ticker, mocker):
     assert '[BTC_ETH]' in msg_mock.call_args_list[0][0][0]
 
 
+def test_status_handle_multiple_trades(default_conf, update, ticker, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    msg_mock = MagicMock()
+    mocker.patch('freqtrade.main.rpc.send_msg', MagicMock())
+    mocker.patch.multiple('freqtrade.rpc.telegram',
+                          _CONF=default_conf,
+                          init=MagicMock(),
+                          send_msg=msg_mock)
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker)
+    init(default_conf, create_engine('sqlite://'))
+    update_state(State.RUNNING)
+    create_trade(0.001)
+    create_trade(0.001)
+
+    _status(bot=MagicMock(), update=update)
+    # All trades are reported in a single message
+    assert msg_mock.call_count == 1
+    assert msg_mock.call_args[0][0].count('*Trade ID:*') == 2
+    assert 'stale' not in msg_mock.call_args[0][0]
+
+
+def test_status_handle_timeout(default_conf, update, ticker, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    msg_mock = MagicMock()
+    mocker.patch('freqtrade.main.rpc.send_msg', MagicMock())
+    mocker.patch.multiple('freqtrade.rpc.telegram',
+                          _CONF=default_conf,
+                          init=MagicMock(),
+                          send_msg=msg_mock,
+                          STATUS_TIMEOUT=0.1,
+                          _LAST_RATES={})
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker)
+    init(default_conf, create_engine('sqlite://'))
+    update_state(State.RUNNING)
+    create_trade(0.001)
+
+    release = threading.Event()
+    mocker.patch('freqtrade.main.exchange.get_ticker',
+                 side_effect=lambda pair: release.wait(5) and ticker(pair))
+    try:
+        _status(bot=MagicMock(), update=update)
+        assert '*Current Rate:* `unknown`' in msg_mock.call_args[0][0]
+
+        # The last known rate is shown and flagged
+        telegram._LAST_RATES['BTC_ETH'] = 0.00001098
+        _status(bot=MagicMock(), update=update)
+        assert '*Current Rate:* `0.00001098 (stale)`' in msg_mock.call_args[0][0]
+
+        _status_table(bot=MagicMock(), update=update)
+        assert '* stale rate' in msg_mock.call_args[0][0]
+    finally:
+        release.set()
+
+
+def test_status_handle_unit_of_work_in_progress(default_conf, update, ticker, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    msg_mock = MagicMock()
+    mocker.patch('freqtrade.main.rpc.send_msg', MagicMock())
+    mocker.patch.multiple('freqtrade.rpc.telegram',
+                          _CONF=default_conf,
+                          init=MagicMock(),
+                          send_msg=msg_mock)
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker)
+    init(default_conf, create_engine('sqlite://'))
+    update_state(State.RUNNING)
+    create_trade(0.001)
+
+    entered = threading.Event()
+    release = threading.Event()
+
+    def exit_loop():
+        with unit_of_work():
+            entered.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=exit_loop)
+    thread.start()
+    try:
+        assert entered.wait(5)
+        # Neither /status nor /status table wait for the unit of work
+        _status(bot=MagicMock(), update=update)
+        assert '[BTC_ETH]' in msg_mock.call_args[0][0]
+        _status_table(bot=MagicMock(), update=update)
+        assert 'BTC_ETH' in msg_mock.call_args[0][0]
+        assert thread.is_alive()
+    finally:
+        release.set()
+        thread.join(5)
+
+
+def test_join_messages(mocker):
+    mocker.patch('freqtrade.rpc.telegram.MAX_MESSAGE_LENGTH', 10)
+    assert _join_messages(['abc', 'def', 'ghij', 'klmnopqrstuvw', 'x']) == [
+        'abcdefghij', 'klmnopqrstuvw', 'x'
+    ]
+
+
 def test_status_table_handle(default_conf, update, ticker, mocker):
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
@@ -140,7 +248,9 @@ def test_status_table_handle(default_conf, update, ticker, mocker):
     # Create some test data
     create_trade(15.0)
 
-    _status_table(bot=MagicMock(), update=update)
+    bot = MagicMock()
+    _status_table(bot=bot, update=update)
+    assert msg_mock.call_args[1]['bot'] is bot
 
     text = re.sub('</?pre>', '', msg_mock.call_args_list[-1][0][0])
     line = text.split("\n")
@@ -305,6 +415,19 @@ def test_exec_forcesell_open_orders(default_conf, ticker, mocker):
     assert trade.is_open is False
 
 
+def test_exec_forcesell_closed_trade(default_conf, ticker, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    get_order_mock = MagicMock()
+    mocker.patch.multiple('freqtrade.main.exchange', get_ticker=ticker, get_order=get_order_mock)
+    sell_mock = mocker.patch('freqtrade.main.execute_sell')
+    trade = Trade(pair='BTC_ETH', open_rate=1, exchange='BITTREX', open_order_id='123456789',
+                  amount=1, fee=0.0, is_open=False)
+    _exec_forcesell(trade)
+
+    assert get_order_mock.call_count == 0
+    assert sell_mock.call_count == 0
+
+
 def test_forcesell_all_handle(default_conf, update, ticker, mocker):
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
@@ -367,7 +490,9 @@ def test_forcesell_handle_invalid(default_conf, update, mocker):
     msg_mock.reset_mock()
     update_state(State.RUNNING)
     update.message.text = '/forcesell 123456'
-    _forcesell(bot=MagicMock(), update=update)
+    bot = MagicMock()
+    _forcesell(bot=bot, update=update)
+    assert msg_mock.call_args[1]['bot'] is bot
     assert msg_mock.call_count == 1
     assert 'Invalid argument.' in msg_mock.call_args_list[0][0][0]
 
@@ -401,7 +526,9 @@ def test_performance_handle(
     trade.close_date = datetime.utcnow()
     trade.is_open = False
 
-    _performance(bot=MagicMock(), update=update)
+    bot = MagicMock()
+    _performance(bot=bot, update=update)
+    assert msg_mock.call_args[1]['bot'] is bot
     assert msg_mock.call_count == 1
     assert 'Performance' in msg_mock.call_args_list[0][0][0]
     assert '<code>BTC_ETH\t6.20%</code>' in msg_mock.call_args_list[0][0][0]
@@ -481,7 +608,9 @@ def test_count_handle(default_conf, update, ticker, mocker):
     # Create some test data
     create_trade(0.001)
     msg_mock.reset_mock()
-    _count(bot=MagicMock(), update=update)
+    bot = MagicMock()
+    _count(bot=bot, update=update)
+    assert msg_mock.call_args[1]['bot'] is bot
 
     msg = '<pre>  current    max\n---------  -----\n        1      {}</pre>'.format(
         default_conf['max_open_trades']
@@ -606,7 +735,9 @@ def test_balance_handle(default_conf, update, mocker):
     mocker.patch.multiple('freqtrade.main.exchange',
                           get_balances=MagicMock(return_value=mock_balance))
 
-    _balance(bot=MagicMock(), update=update)
+    bot = MagicMock()
+    _balance(bot=bot, update=update)
+    assert msg_mock.call_args[1]['bot'] is bot
     assert msg_mock.call_count == 1
     assert '*Currency*: BTC' in msg_mock.call_args_list[0][0][0]
     assert 'Balance' in msg_mock.call_args_list[0][0][0]
@@ -665,3 +796,22 @@ def test_send_msg_network_error(default_conf, mocker):
 
     # Bot should've tried to send it twice
     assert len(bot.method_calls) == 2
+
+
+def test_send_msg_dispatcher(default_conf, mocker):
+    conf = deepcopy(default_conf)
+    conf['telegram']['enabled'] = True
+    dispatcher = MagicMock()
+    mocker.patch.multiple('freqtrade.rpc.telegram',
+                          _CONF=conf,
+                          _DISPATCHER=dispatcher,
+                          init=MagicMock())
+    # Messages without a bot are queued
+    send_msg('test')
+    dispatcher.put.assert_called_once_with('test', ParseMode.MARKDOWN)
+
+    # Replies to commands are sent right away
+    bot = MagicMock()
+    send_msg('test', bot)
+    assert len(bot.method_calls) == 1
+    assert dispatcher.put.call_count == 1
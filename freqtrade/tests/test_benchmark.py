@@ -0,0 +1,81 @@
+# pragma pylint: disable=missing-docstring, C0103
+import json
+from argparse import Namespace
+from collections import OrderedDict
+from unittest.mock import MagicMock
+
+from freqtrade import benchmark
+from freqtrade.benchmark import BENCHMARKS, generate_text_table, run_benchmark, \
+    run_benchmarks
+
+
+def test_benchmarks_registered():
+    assert list(BENCHMARKS) == [
+        'parse_ticker_dataframe', 'populate_indicators', 'backtest_simple',
+        'backtest_realistic', 'backtest_stream', 'hyperopt', 'calc_profit_percent', 'trade_stats',
+        'startup'
+    ]
+
+
+def test_run_benchmark():
+    func = MagicMock(side_effect=lambda: [0] * 100000)
+    result = run_benchmark(func, repeat=3)
+    # The memory is measured in an additional run
+    assert func.call_count == 4
+    assert result['runs'] == 3
+    assert 0 <= result['min'] <= result['median'] <= result['max']
+    assert result['min'] <= result['mean'] <= result['max']
+    assert result['peak_memory'] >= 100000 * 8
+
+
+def test_run_benchmarks_calc_profit_percent():
+    results = run_benchmarks(['calc_profit_percent'], {'repeat': 1, 'epochs': 1, 'trades': 1})
+    assert results['options'] == {'repeat': 1, 'epochs': 1, 'trades': 1}
+    assert list(results['results']) == ['calc_profit_percent']
+    assert results['results']['calc_profit_percent']['runs'] == 1
+
+
+def test_trade_stats_benchmark():
+    run = BENCHMARKS['trade_stats']({'trades': 50})
+    run()
+    from freqtrade.persistence import get_trade_stats, get_pair_profits
+    assert get_trade_stats()['closed_trade_count'] == 50
+    assert len(get_pair_profits()) == 10
+
+
+def test_startup_benchmark(mocker):
+    run_mock = mocker.patch('freqtrade.benchmark.subprocess.run', MagicMock())
+    BENCHMARKS['startup']({})()
+    assert run_mock.call_args[0][0][1:] == ['-m', 'freqtrade.main', '--version']
+
+
+def test_generate_text_table():
+    results = {'results': OrderedDict([
+        ('first', {'runs': 2, 'min': 1.0, 'median': 1.5, 'max': 2.0, 'peak_memory': 2 ** 20}),
+        ('second', {'runs': 2, 'min': 0.1, 'median': 0.2, 'max': 0.3, 'peak_memory': 0}),
+    ])}
+    table = generate_text_table(results)
+    assert 'median change' not in table
+    assert 'first' in table and '1.5000' in table and '1.00' in table
+
+    previous = {'results': {'first': {'median': 1.0}}}
+    table = generate_text_table(results, previous)
+    assert 'median change' in table
+    assert '+50.0%' in table
+
+
+def test_start(mocker, tmpdir):
+    export = str(tmpdir.join('results.json'))
+    mocker.patch.dict(BENCHMARKS, {'dummy': lambda options: lambda: None}, clear=True)
+    args = Namespace(loglevel=20, benchmarks=[], repeat=2, epochs=1, trades=1,
+                     export=export, compare=None)
+    benchmark.start(args)
+    with open(export) as file:
+        results = json.load(file)
+    assert results['results']['dummy']['runs'] == 2
+    assert 'version' in results and 'python' in results
+
+    text_table_mock = mocker.patch('freqtrade.benchmark.generate_text_table', MagicMock())
+    args.compare = export
+    benchmark.start(args)
+    assert text_table_mock.call_args[0][1] == results
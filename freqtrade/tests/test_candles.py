@@ -0,0 +1,89 @@
+# pragma pylint: disable=missing-docstring, C0103
+import warnings
+
+import numpy as np
+import pytest
+from pandas import Timestamp
+
+from freqtrade.candles import candles_to_dataframe, decode_candles, get_rows
+
+
+def test_get_rows(ticker_history):
+    rows = get_rows(ticker_history)
+    assert rows[0] == (8.794e-05, 8.948e-05, 8.794e-05, 8.88e-05, 991.09056638,
+                       '2017-11-26T08:50:00')
+    assert len(rows) == 3
+
+
+def test_get_rows_missing_property(ticker_history):
+    del ticker_history[1]['L']
+    with pytest.raises(ValueError, match=r'Required property L not present'):
+        get_rows(ticker_history)
+
+
+def test_decode_candles(ticker_history):
+    columns = decode_candles(ticker_history)
+    assert sorted(columns) == ['close', 'date', 'high', 'low', 'open', 'volume']
+    assert columns['close'].dtype == np.float64
+    assert columns['close'].tolist() == [8.88e-05, 8.893e-05, 8.877e-05]
+    assert columns['volume'].tolist() == [991.09056638, 658.77935965, 7920.73570705]
+    assert columns['date'].dtype == np.dtype('datetime64[ns]')
+    assert str(columns['date'][0]) == '2017-11-26T08:50:00.000000000'
+
+
+def test_decode_candles_unsorted(ticker_history):
+    columns = decode_candles(list(reversed(ticker_history)))
+    assert columns['open'].tolist() == [8.794e-05, 8.88e-05, 8.891e-05]
+    assert (np.diff(columns['date']) > np.timedelta64(0)).all()
+
+
+def test_decode_candles_timezone(ticker_history):
+    for candle in ticker_history:
+        candle['T'] = candle['T'] + '+01:00'
+    columns = decode_candles(ticker_history)
+    assert str(columns['date'][0]) == '2017-11-26T07:50:00.000000000'
+
+
+def test_decode_candles_negative_timezone(ticker_history):
+    for candle in ticker_history:
+        candle['T'] = candle['T'] + '-05:00'
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        columns = decode_candles(ticker_history)
+    assert str(columns['date'][0]) == '2017-11-26T13:50:00.000000000'
+
+
+def test_decode_candles_later_timezone(ticker_history):
+    # Only later candles carry an offset
+    ticker_history[2]['T'] = '2017-11-26T09:00:00+01:00'
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        columns = decode_candles(ticker_history)
+    assert str(columns['date'][0]) == '2017-11-26T08:00:00.000000000'
+    assert str(columns['date'][1]) == '2017-11-26T08:50:00.000000000'
+
+
+def test_decode_candles_empty():
+    columns = decode_candles([])
+    assert all(len(column) == 0 for column in columns.values())
+    assert len(candles_to_dataframe(columns)) == 0
+
+
+@pytest.mark.parametrize('key,value,message', [
+    ('H', float('nan'), 'Invalid high'),
+    ('V', None, 'Invalid volume'),
+    ('C', 'abc', 'Invalid rate or volume'),
+    ('T', 'abc', 'Invalid date'),
+])
+def test_decode_candles_invalid(ticker_history, key, value, message):
+    ticker_history[2][key] = value
+    with pytest.raises(ValueError, match=message):
+        decode_candles(ticker_history)
+
+
+def test_candles_to_dataframe(ticker_history):
+    frame = candles_to_dataframe(decode_candles(ticker_history))
+    assert frame.columns.tolist() == ['close', 'high', 'low', 'open', 'date', 'volume']
+    assert frame['date'][0] == Timestamp('2017-11-26T08:50:00', tz='UTC')
+    assert frame['high'].tolist() == [8.948e-05, 8.942e-05, 8.893e-05]
+    assert frame.index.tolist() == [0, 1, 2]
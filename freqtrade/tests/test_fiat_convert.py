@@ -1,10 +1,12 @@
 # pragma pylint: disable=missing-docstring, too-many-arguments, too-many-ancestors, C0103
 
+import json
 import time
 import pytest
 from unittest.mock import MagicMock
 
-from freqtrade.fiat_convert import CryptoToFiatConverter, CryptoFiat
+from freqtrade import fiat_convert as fiat_convert_module
+from freqtrade.fiat_convert import CryptoToFiatConverter, CryptoFiat, get_converter
 
 
 def test_pair_convertion_object():
@@ -34,6 +36,12 @@ def test_pair_convertion_object():
     assert pair_convertion._expiration >= time_reference
     assert pair_convertion.price == 30000.123
 
+    # The price is refreshed before it expires
+    assert pair_convertion.needs_refresh() is False
+    pair_convertion._expiration = time.time() + 30 * 60
+    assert pair_convertion.is_expired() is False
+    assert pair_convertion.needs_refresh() is True
+
 
 def test_fiat_convert_is_supported():
     fiat_convert = CryptoToFiatConverter()
@@ -50,15 +58,15 @@ def test_fiat_convert_add_pair():
 
     fiat_convert._add_pair(crypto_symbol='btc', fiat_symbol='usd', price=12345.0)
     assert len(fiat_convert._pairs) == 1
-    assert fiat_convert._pairs[0].crypto_symbol == 'BTC'
-    assert fiat_convert._pairs[0].fiat_symbol == 'USD'
-    assert fiat_convert._pairs[0].price == 12345.0
+    assert fiat_convert._pairs[('BTC', 'USD')].crypto_symbol == 'BTC'
+    assert fiat_convert._pairs[('BTC', 'USD')].fiat_symbol == 'USD'
+    assert fiat_convert._pairs[('BTC', 'USD')].price == 12345.0
 
     fiat_convert._add_pair(crypto_symbol='btc', fiat_symbol='Eur', price=13000.2)
     assert len(fiat_convert._pairs) == 2
-    assert fiat_convert._pairs[1].crypto_symbol == 'BTC'
-    assert fiat_convert._pairs[1].fiat_symbol == 'EUR'
-    assert fiat_convert._pairs[1].price == 13000.2
+    assert fiat_convert._pairs[('BTC', 'EUR')].crypto_symbol == 'BTC'
+    assert fiat_convert._pairs[('BTC', 'EUR')].fiat_symbol == 'EUR'
+    assert fiat_convert._pairs[('BTC', 'EUR')].price == 13000.2
 
 
 def test_fiat_convert_find_price(mocker):
@@ -92,20 +100,138 @@ def test_fiat_convert_get_price(mocker):
     # Check the value return by the method
     assert len(fiat_convert._pairs) == 0
     assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
-    assert fiat_convert._pairs[0].crypto_symbol == 'BTC'
-    assert fiat_convert._pairs[0].fiat_symbol == 'USD'
-    assert fiat_convert._pairs[0].price == 28000.0
-    assert fiat_convert._pairs[0]._expiration is not 0
+    assert fiat_convert._pairs[('BTC', 'USD')].crypto_symbol == 'BTC'
+    assert fiat_convert._pairs[('BTC', 'USD')].fiat_symbol == 'USD'
+    assert fiat_convert._pairs[('BTC', 'USD')].price == 28000.0
+    assert fiat_convert._pairs[('BTC', 'USD')]._expiration is not 0
     assert len(fiat_convert._pairs) == 1
 
     # Verify the cached is used
-    fiat_convert._pairs[0].price = 9867.543
-    expiration = fiat_convert._pairs[0]._expiration
+    fiat_convert._pairs[('BTC', 'USD')].price = 9867.543
+    expiration = fiat_convert._pairs[('BTC', 'USD')]._expiration
     assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 9867.543
-    assert fiat_convert._pairs[0]._expiration == expiration
+    assert fiat_convert._pairs[('BTC', 'USD')]._expiration == expiration
 
-    # Verify the cache expiration
+    # Verify the cache expiration, the old price is used until the refresh is done
     expiration = time.time() - 2 * 60 * 60
-    fiat_convert._pairs[0]._expiration = expiration
+    fiat_convert._pairs[('BTC', 'USD')]._expiration = expiration
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 9867.543
+    fiat_convert._refreshing[('BTC', 'USD')].result()
     assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
-    assert fiat_convert._pairs[0]._expiration is not expiration
+    assert fiat_convert._pairs[('BTC', 'USD')]._expiration is not expiration
+    assert api_mock.call_count == 2
+
+
+def test_fiat_convert_refresh_failure(mocker):
+    api_mock = MagicMock(return_value={'price_usd': 28000.0})
+    mocker.patch('freqtrade.fiat_convert.Pymarketcap.ticker', api_mock)
+    fiat_convert = CryptoToFiatConverter()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
+
+    # A failed refresh keeps the old price and is retried on the next lookup
+    api_mock.side_effect = ValueError('Oh snap')
+    fiat_convert._pairs[('BTC', 'USD')]._expiration = time.time()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
+    fiat_convert._refreshing[('BTC', 'USD')].result()
+    assert fiat_convert._pairs[('BTC', 'USD')].needs_refresh() is True
+
+    api_mock.side_effect = None
+    api_mock.return_value = {'price_usd': 29000.0}
+    fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD')
+    fiat_convert._refreshing[('BTC', 'USD')].result()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 29000.0
+    assert fiat_convert._pairs[('BTC', 'USD')].needs_refresh() is False
+
+
+def test_get_converter():
+    assert isinstance(get_converter(), CryptoToFiatConverter)
+    assert get_converter() is get_converter()
+
+
+def test_fiat_convert_bulk_fetch(mocker):
+    api_mock = MagicMock(return_value={
+        'price_usd': 12345.0,
+        'price_eur': 13000.2
+    })
+    mocker.patch('freqtrade.fiat_convert.Pymarketcap.ticker', api_mock)
+    fiat_convert = CryptoToFiatConverter(fiat_symbols=['eur'])
+
+    # One request fills the configured currency as well
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 12345.0
+    assert api_mock.call_count == 1
+    assert api_mock.call_args[1] == {'currency': 'BTC', 'convert': 'EUR'}
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='EUR') == 13000.2
+    assert api_mock.call_count == 1
+
+    # Currencies missing from the response are requested separately
+    api_mock.return_value = {'price_usd': 12345.0, 'price_eur': 13000.2, 'price_cad': 15000.1}
+    assert fiat_convert._find_prices('BTC', ['USD', 'CAD', 'EUR']) == {
+        'USD': 12345.0, 'EUR': 13000.2, 'CAD': 15000.1
+    }
+    assert api_mock.call_count == 2
+
+
+def test_fiat_convert_rates_file(mocker, tmpdir):
+    rates_file = str(tmpdir.join('fiat_rates.json'))
+    api_mock = MagicMock(return_value={'price_usd': 12345.0})
+    mocker.patch('freqtrade.fiat_convert.Pymarketcap.ticker', api_mock)
+    fiat_convert = CryptoToFiatConverter(rates_file=rates_file)
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 12345.0
+
+    with open(rates_file) as file:
+        rates = json.load(file)
+    assert len(rates) == 1
+    assert rates[0]['crypto_symbol'] == 'BTC'
+    assert rates[0]['fiat_symbol'] == 'USD'
+    assert rates[0]['price'] == 12345.0
+
+    # A valid rate is used without asking the API
+    api_mock.side_effect = ValueError('Oh snap')
+    fiat_convert = CryptoToFiatConverter(rates_file=rates_file)
+    fiat_convert.load_rates()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 12345.0
+    assert api_mock.call_count == 1
+
+
+def test_fiat_convert_offline_rates(mocker, tmpdir):
+    rates_file = tmpdir.join('fiat_rates.json')
+    rates_file.write(json.dumps([{
+        'crypto_symbol': 'BTC', 'fiat_symbol': 'USD', 'price': 12345.0, 'expiration': time.time()
+    }]))
+    api_mock = MagicMock(return_value={'price_usd': 28000.0})
+    mocker.patch('freqtrade.fiat_convert.Pymarketcap.ticker', api_mock)
+
+    # An expired rate is only used if the API is unavailable
+    fiat_convert = CryptoToFiatConverter(rates_file=str(rates_file))
+    fiat_convert.load_rates()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
+
+    api_mock.side_effect = ValueError('Oh snap')
+    fiat_convert = CryptoToFiatConverter(rates_file=str(rates_file))
+    fiat_convert.load_rates()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 28000.0
+
+    rates_file.write(json.dumps([{
+        'crypto_symbol': 'BTC', 'fiat_symbol': 'USD', 'price': 12345.0, 'expiration': time.time()
+    }]))
+    fiat_convert = CryptoToFiatConverter(rates_file=str(rates_file))
+    fiat_convert.load_rates()
+    assert fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='USD') == 12345.0
+    with pytest.raises(ValueError, match=r'Oh snap'):
+        fiat_convert.get_price(crypto_symbol='BTC', fiat_symbol='EUR')
+
+    # A broken rate table is ignored
+    rates_file.write('{broken')
+    fiat_convert = CryptoToFiatConverter(rates_file=str(rates_file))
+    fiat_convert.load_rates()
+    assert fiat_convert._pairs == {}
+
+
+def test_fiat_convert_init(default_conf, tmpdir):
+    conf = dict(default_conf)
+    conf['internals'] = {'fiat_rates_file': str(tmpdir.join('fiat_rates.json'))}
+    fiat_convert_module.init(conf)
+
+    converter = get_converter()
+    assert converter._fiat_symbols == ['USD']
+    assert converter._rates_file == conf['internals']['fiat_rates_file']
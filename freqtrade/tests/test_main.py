@@ -1,17 +1,20 @@
 # pragma pylint: disable=missing-docstring,C0103
 import copy
+import threading
 from unittest.mock import MagicMock
 
 import pytest
 import requests
 import logging
 from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
 
 from freqtrade import DependencyException, OperationalException
 from freqtrade.analyze import SignalType
 from freqtrade.exchange import Exchanges
-from freqtrade.main import create_trade, handle_trade, init, \
-    get_target_bid, _process, execute_sell
+from freqtrade import persistence
+from freqtrade.main import create_trade, handle_trade, init, process_exits, \
+    get_target_bid, _process, execute_sell, update_dry_run_db, create_scheduler, _ExitLoop
 from freqtrade.misc import get_state, State
 from freqtrade.persistence import Trade
 
@@ -45,6 +48,51 @@ def test_process_trade_creation(default_conf, ticker, health, mocker):
     assert trade.amount == 90.99181073703367
 
 
+def test_process_several_trade_creations(default_conf, ticker, health, mocker):
+    conf = dict(default_conf, max_open_trades=2)
+    mocker.patch.dict('freqtrade.main._CONF', conf)
+    mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=MagicMock())
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    buy_mock = MagicMock(return_value='mocked_limit_buy')
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker,
+                          get_wallet_health=health,
+                          buy=buy_mock)
+    init(conf, create_engine('sqlite://'))
+
+    # All trades allowed are opened within one run
+    assert _process() is True
+    trades = Trade.query.filter(Trade.is_open.is_(True)).all()
+    assert buy_mock.call_count == 2
+    assert len({trade.pair for trade in trades}) == 2
+
+    # Stops once there is no healthy pair left in the whitelist
+    mocker.patch.dict('freqtrade.main._CONF', max_open_trades=10)
+    assert _process(handle_exits=False) is True
+    assert buy_mock.call_count == 3
+    assert _process(handle_exits=False) is False
+
+
+def test_process_acknowledges_after_commit(default_conf, ticker, health, mocker):
+    pending = []
+    msg_mock = MagicMock(side_effect=lambda msg: pending.append(Trade.session.transaction))
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=msg_mock)
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker,
+                          get_wallet_health=health,
+                          buy=MagicMock(return_value='mocked_limit_buy'))
+    init(default_conf, create_engine('sqlite://'))
+
+    assert _process() is True
+    # The buy message is sent once the transaction of the iteration has been committed
+    assert msg_mock.call_count == 1
+    assert pending == [None]
+
+
 def test_process_exchange_failures(default_conf, ticker, health, mocker):
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=MagicMock())
@@ -104,6 +152,98 @@ def test_process_trade_handling(default_conf, ticker, limit_buy_order, health, m
     assert result is False
 
 
+def test_process_exits_only(default_conf, ticker, limit_buy_order, health, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=MagicMock())
+    signal = mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker,
+                          get_wallet_health=health,
+                          buy=MagicMock(return_value='mocked_limit_buy'),
+                          get_order=MagicMock(return_value=limit_buy_order))
+    init(default_conf, create_engine('sqlite://'))
+
+    # Neither the whitelist nor buy signals are checked
+    assert _process(scan_entries=False) is False
+    assert health.call_count == 0
+    assert signal.call_count == 0
+    assert not Trade.query.filter(Trade.is_open.is_(True)).all()
+
+    # Open orders are still updated
+    assert _process() is True
+    trade = Trade.query.filter(Trade.is_open.is_(True)).first()
+    assert trade.open_order_id == 'mocked_limit_buy'
+    _process(scan_entries=False)
+    assert trade.open_order_id is None
+
+
+def test_create_scheduler(default_conf, mocker):
+    conf = copy.deepcopy(default_conf)
+    conf['internals'] = {'process_throttle_secs': 3, 'candle_delay_secs': 2}
+    mocker.patch.dict('freqtrade.main._CONF', conf)
+    process = mocker.patch('freqtrade.main._process')
+
+    scheduler = create_scheduler(10)
+    entries, = scheduler._jobs
+    assert (entries.interval, entries.offset, entries.align) == (300, 2, True)
+
+    assert scheduler.run_pending() == 1
+    assert process.call_args[1] == {'nb_assets': 10, 'handle_exits': False}
+    assert entries.next_run % 300 == 2
+
+    # Open trades are handled on their own thread
+    exit_loop = _ExitLoop()
+    exits, = exit_loop.scheduler._jobs
+    assert (exits.interval, exits.align) == (3, False)
+
+
+def test_exit_loop(default_conf, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    called = threading.Event()
+    process = mocker.patch('freqtrade.main._process', side_effect=lambda **kwargs: called.set())
+    mocker.patch('freqtrade.main.get_state', return_value=State.RUNNING)
+
+    exit_loop = _ExitLoop()
+    exit_loop.start()
+    assert called.wait(5)
+    exit_loop.stop()
+    assert not exit_loop.is_alive()
+    assert process.call_args[1] == {'scan_entries': False}
+    assert exit_loop.scheduler.get_stats()['exits']['runs'] >= 1
+
+
+def test_exit_loop_failure(default_conf, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch('freqtrade.main._process', side_effect=ValueError('Oh snap'))
+    mocker.patch('freqtrade.main.get_state', return_value=State.RUNNING)
+    state = mocker.patch('freqtrade.main.update_state')
+
+    exit_loop = _ExitLoop()
+    exit_loop.start()
+    exit_loop.join(5)
+    assert not exit_loop.is_alive()
+    state.assert_called_once_with(State.STOPPED)
+
+
+def test_create_trade_open_trades_changed(default_conf, ticker, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=MagicMock())
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    buy = MagicMock(return_value='mocked_limit_buy')
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker,
+                          buy=buy)
+    init(default_conf, create_engine('sqlite://'))
+    assert create_trade(0.001) is True
+
+    # A trade for the pair has been opened during the signal analysis
+    mocker.patch('freqtrade.main.get_buy_pair', return_value=Trade.query.first().pair)
+    assert create_trade(0.001) is False
+    assert buy.call_count == 1
+
+
 def test_create_trade(default_conf, ticker, limit_buy_order, mocker):
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
     mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
@@ -234,6 +374,43 @@ def test_handle_trade(default_conf, limit_buy_order, limit_sell_order, mocker):
     assert trade.close_date is not None
 
 
+def test_process_exits_releases_session(default_conf, ticker, limit_buy_order, mocker):
+    mocker.patch.dict('freqtrade.main._CONF', default_conf)
+    mocker.patch.multiple('freqtrade.rpc', init=MagicMock(), send_msg=MagicMock())
+    mocker.patch('freqtrade.main.get_signal', side_effect=lambda s, t: True)
+    mocker.patch('freqtrade.main.min_roi_reached', return_value=True)
+    sell_mock = MagicMock(return_value='mocked_limit_sell')
+    mocker.patch.multiple('freqtrade.main.exchange',
+                          validate_pairs=MagicMock(),
+                          get_ticker=ticker,
+                          buy=MagicMock(return_value='mocked_limit_buy'),
+                          get_order=MagicMock(return_value=limit_buy_order),
+                          sell=sell_mock)
+    init(default_conf, create_engine('sqlite://', connect_args={'check_same_thread': False},
+                                     poolclass=StaticPool))
+    create_trade(0.001)
+    trade = Trade.query.first()
+    units = []
+
+    def forcesell(pair):
+        # Other threads are able to use the session while the exchange is queried
+        def other_thread():
+            with persistence.unit_of_work():
+                trade.open_order_id = 'forcesell'
+                units.append(threading.current_thread().name)
+        thread = threading.Thread(target=other_thread, name='telegram')
+        thread.start()
+        thread.join(5)
+        return ticker(pair)
+
+    mocker.patch('freqtrade.main.exchange.get_ticker', side_effect=forcesell)
+    assert process_exits() is False
+    assert units == ['telegram']
+    # The trade has been changed in the meantime, so it is not sold again
+    assert sell_mock.call_count == 0
+    assert trade.open_order_id == 'forcesell'
+
+
 def test_handle_trade_roi(default_conf, ticker, limit_buy_order, mocker, caplog):
     default_conf.update({'experimental': {'use_sell_signal': True}})
     mocker.patch.dict('freqtrade.main._CONF', default_conf)
@@ -432,3 +609,19 @@ def test_execute_sell_without_conf(default_conf, ticker, ticker_sell_up, mocker)
     assert '0.00001172' in rpc_mock.call_args_list[-1][0][0]
     assert '(profit: ~6.11%, 0.00006126)' in rpc_mock.call_args_list[-1][0][0]
     assert 'USD' not in rpc_mock.call_args_list[-1][0][0]
+
+
+def test_update_dry_run_db(default_conf, mocker):
+    conf = copy.deepcopy(default_conf)
+    main_conf = mocker.patch.dict('freqtrade.main._CONF', conf)
+    update_dry_run_db(MagicMock(dry_run_db=False, dry_run_snapshot=True))
+    assert main_conf['dry_run_snapshot'] is True
+    assert 'dry_run_db' not in main_conf
+
+
+def test_update_dry_run_db_disabled(default_conf, mocker):
+    conf = dict(copy.deepcopy(default_conf), dry_run=False)
+    main_conf = mocker.patch.dict('freqtrade.main._CONF', conf)
+    update_dry_run_db(MagicMock(dry_run_db=True, dry_run_snapshot=True))
+    assert 'dry_run_snapshot' not in main_conf
+    assert 'dry_run_db' not in main_conf
@@ -0,0 +1,111 @@
+# pragma pylint: disable=missing-docstring,C0103
+import urllib.request
+from urllib.error import HTTPError
+
+import pytest
+from cachetools import TTLCache, cached
+
+from freqtrade import metrics
+from freqtrade.metrics import Counter, Gauge, Histogram
+
+
+def test_counter():
+    counter = Counter('test_requests', 'Test requests', ('result',))
+    counter.inc('hit')
+    counter.inc('hit', amount=2)
+    counter.inc('miss')
+    assert counter.get('hit') == 3
+    assert counter.collect() == [
+        '# HELP test_requests Test requests',
+        '# TYPE test_requests counter',
+        'test_requests_total{result="hit"} 3.0',
+        'test_requests_total{result="miss"} 1.0',
+    ]
+
+
+def test_gauge():
+    gauge = Gauge('test_lag', 'Test lag', ('loop',))
+    gauge.set(1.5, 'exits')
+    gauge.set(0.5, 'exits')
+    assert gauge.collect()[2:] == ['test_lag{loop="exits"} 0.5']
+
+    gauge = Gauge('test_trades', 'Test trades')
+    gauge.set_function(lambda: 3)
+    assert gauge.get() == 3
+    assert gauge.collect()[2:] == ['test_trades 3.0']
+
+
+def test_histogram():
+    histogram = Histogram('test_seconds', 'Test duration', ('endpoint',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'get_ticker')
+    histogram.observe(0.1, 'get_ticker')
+    histogram.observe(5.0, 'get_ticker')
+    assert histogram.get_count('get_ticker') == 3
+    assert histogram.get_count('buy') == 0
+    assert histogram.collect()[2:] == [
+        'test_seconds_bucket{endpoint="get_ticker",le="0.1"} 2.0',
+        'test_seconds_bucket{endpoint="get_ticker",le="1.0"} 2.0',
+        'test_seconds_bucket{endpoint="get_ticker",le="+Inf"} 3.0',
+        'test_seconds_sum{endpoint="get_ticker"} 5.15',
+        'test_seconds_count{endpoint="get_ticker"} 3.0',
+    ]
+
+    with histogram.time('buy'):
+        pass
+    assert histogram.get_count('buy') == 1
+
+
+def test_timed():
+    histogram = Histogram('test_timed_seconds', 'Test duration')
+
+    @metrics.timed(histogram)
+    def func(value):
+        if value is None:
+            raise ValueError('Oh snap')
+        return value
+
+    assert func(42) == 42
+    with pytest.raises(ValueError, match=r'Oh snap'):
+        func(None)
+    assert histogram.get_count() == 2
+
+
+def test_count_cache():
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    @metrics.count_cache(cache, 'test_cache')
+    @cached(cache)
+    def func(value):
+        return value
+
+    hits = metrics.CACHE_REQUESTS.get('test_cache', 'hit')
+    misses = metrics.CACHE_REQUESTS.get('test_cache', 'miss')
+    func(1)
+    func(1)
+    func(2)
+    assert metrics.CACHE_REQUESTS.get('test_cache', 'hit') == hits + 1
+    assert metrics.CACHE_REQUESTS.get('test_cache', 'miss') == misses + 2
+
+
+def test_init_disabled():
+    metrics.init({})
+    assert metrics._SERVER is None
+    metrics.init({'metrics': {'enabled': False}})
+    assert metrics._SERVER is None
+
+
+def test_http_server():
+    metrics.init({'metrics': {'enabled': True, 'listen_port': 0}})
+    try:
+        url = 'http://127.0.0.1:{}'.format(metrics._SERVER.server_address[1])
+        with urllib.request.urlopen(url + '/metrics', timeout=5) as response:
+            assert response.status == 200
+            body = response.read().decode('utf-8')
+        assert '# TYPE freqtrade_process_seconds histogram' in body
+        assert '# TYPE freqtrade_open_trades gauge' in body
+
+        with pytest.raises(HTTPError):
+            urllib.request.urlopen(url + '/unknown', timeout=5)
+    finally:
+        metrics.cleanup()
+    assert metrics._SERVER is None
@@ -1,41 +1,14 @@
 # pragma pylint: disable=missing-docstring,C0103
 import json
-import time
+import subprocess
+import sys
 from copy import deepcopy
 from unittest.mock import MagicMock
 
 import pytest
 from jsonschema import ValidationError
 
-from freqtrade.misc import throttle, parse_args, load_config
-
-
-def test_throttle():
-
-    def func():
-        return 42
-
-    start = time.time()
-    result = throttle(func, min_secs=0.1)
-    end = time.time()
-
-    assert result == 42
-    assert end - start > 0.1
-
-    result = throttle(func, min_secs=-1)
-    assert result == 42
-
-
-def test_throttle_with_assets():
-
-    def func(nb_assets=-1):
-        return nb_assets
-
-    result = throttle(func, min_secs=0.1, nb_assets=666)
-    assert result == 666
-
-    result = throttle(func, min_secs=0.1)
-    assert result == -1
+from freqtrade.misc import parse_args, load_config
 
 
 def test_parse_args_defaults():
@@ -79,6 +52,25 @@ def test_parse_args_dynamic_whitelist_10():
     assert args.dynamic_whitelist is 10
 
 
+def test_parse_args_dry_run_snapshot():
+    assert parse_args([]).dry_run_snapshot is False
+    assert parse_args(['--dry-run-snapshot']).dry_run_snapshot is True
+
+
+def test_parse_args_profile():
+    assert parse_args([]).profile is None
+    assert parse_args(['--profile']).profile == 1
+    assert parse_args(['--profile', '10']).profile == 10
+
+
+def test_parse_args_profile_backtesting(mocker):
+    backtesting_mock = mocker.patch('freqtrade.optimize.backtesting.start', MagicMock())
+    profiling_mock = mocker.patch('freqtrade.misc.profiler.profiling', MagicMock())
+    assert parse_args(['--profile', '5', 'backtesting']) is None
+    assert backtesting_mock.call_count == 1
+    profiling_mock.assert_called_once_with(5)
+
+
 def test_parse_args_dynamic_whitelist_invalid_values():
     with pytest.raises(SystemExit, match=r'2'):
         parse_args(['--dynamic-whitelist', 'abc'])
@@ -159,6 +151,26 @@ def test_parse_args_hyperopt_custom(mocker):
     assert call_args.func is not None
 
 
+def test_parse_args_compact(mocker):
+    backtesting_mock = mocker.patch('freqtrade.optimize.backtesting.start', MagicMock())
+    parse_args(['backtesting'])
+    assert backtesting_mock.call_args[0][0].compact is False
+    parse_args(['backtesting', '--compact'])
+    assert backtesting_mock.call_args[0][0].compact is True
+
+    hyperopt_mock = mocker.patch('freqtrade.optimize.hyperopt.start', MagicMock())
+    parse_args(['hyperopt', '--compact'])
+    assert hyperopt_mock.call_args[0][0].compact is True
+
+
+def test_parse_args_chunk_size(mocker):
+    backtesting_mock = mocker.patch('freqtrade.optimize.backtesting.start', MagicMock())
+    parse_args(['backtesting'])
+    assert backtesting_mock.call_args[0][0].chunk_size is None
+    parse_args(['backtesting', '--chunk-size', '5000'])
+    assert backtesting_mock.call_args[0][0].chunk_size == 5000
+
+
 def test_load_config(default_conf, mocker):
     file_mock = mocker.patch('freqtrade.misc.open', mocker.mock_open(
         read_data=json.dumps(default_conf)
@@ -188,3 +200,31 @@ def test_load_config_missing_attributes(default_conf, mocker):
             read_data=json.dumps(conf)))
     with pytest.raises(ValidationError, match=r'.*\'exchange\' is a required property.*'):
         load_config('somefile')
+
+
+def test_parse_args_benchmark(mocker):
+    benchmark_mock = mocker.patch('freqtrade.benchmark.start', MagicMock())
+    args = parse_args(['benchmark', 'trade_stats', '-n', '3', '--compare', 'before.json'])
+    assert args is None
+    assert benchmark_mock.call_count == 1
+
+    call_args = benchmark_mock.call_args[0][0]
+    assert call_args.subparser == 'benchmark'
+    assert call_args.benchmarks == ['trade_stats']
+    assert call_args.repeat == 3
+    assert call_args.epochs == 10
+    assert call_args.export == 'benchmark.json'
+    assert call_args.compare == 'before.json'
+
+
+def test_parse_args_imports_subcommands_lazily():
+    # A new interpreter, as the modules may already have been imported by other tests
+    code = '; '.join([
+        'import sys',
+        'from freqtrade.misc import parse_args',
+        'parse_args([])',
+        'print(sorted(m for m in ("freqtrade.optimize.backtesting", '
+        '"freqtrade.optimize.hyperopt", "hyperopt", "pymongo") if m in sys.modules))',
+    ])
+    output = subprocess.check_output([sys.executable, '-c', code])
+    assert output.decode().strip() == '[]'
@@ -2,8 +2,20 @@
 import pytest
 
 import os
+import threading
+from unittest.mock import MagicMock
+from datetime import datetime, date, timedelta
+from decimal import getcontext
+
+from sqlalchemy import create_engine, inspect
+
+from freqtrade import metrics
 from freqtrade.exchange import Exchanges
-from freqtrade.persistence import init, Trade
+from freqtrade.persistence import init, Trade, register_trade, load_open_trades, \
+    get_open_trades, get_open_trade, get_open_trades_by_pair, check_open_trades, check_migrate, \
+    get_daily_profit, get_trade_stats, get_pair_profits, load_trade_stats, unit_of_work, \
+    on_commit, wait_for_writes, cleanup, snapshot, archive_trades, check_archive, \
+    copy_open_trades
 
 
 def test_init_create_session(default_conf, mocker):
@@ -139,9 +151,34 @@ def test_update_with_bittrex(limit_buy_order, limit_sell_order):
     assert trade.open_order_id is None
     assert trade.close_rate == 0.00001173
     assert trade.close_profit == 0.06201057
+    assert trade.close_profit_abs == 0.00006217
     assert trade.close_date is not None
 
 
+def test_update_stores_rates_unchanged(default_conf, limit_buy_order, limit_sell_order):
+    init(default_conf, create_engine('sqlite://'))
+    trade = Trade(pair='BTC_ETH', stake_amount=0.001, fee=0.0025,
+                  exchange=Exchanges.BITTREX.name, open_order_id='something')
+    Trade.session.add(trade)
+    Trade.session.flush()
+    register_trade(trade)
+
+    # More decimals than Bittrex uses are not rounded
+    limit_buy_order = dict(limit_buy_order, rate=0.000010991234567, amount=90.991810737033671)
+    limit_sell_order = dict(limit_sell_order, rate=0.000011731234567)
+    trade.update(limit_buy_order)
+    trade.update(limit_sell_order)
+
+    stored = Trade.session.execute(
+        'SELECT open_rate, amount, close_rate FROM trades WHERE id = :id', {'id': trade.id}
+    ).fetchone()
+    expected = (limit_buy_order['rate'], limit_buy_order['amount'], limit_sell_order['rate'])
+    assert tuple(stored) == expected
+    # The instance keeps the very same values
+    assert (trade.open_rate, trade.amount, trade.close_rate) == expected
+    assert all(type(value) is float for value in (trade.open_rate, trade.amount, trade.close_rate))
+
+
 def test_calc_open_close_trade_price(limit_buy_order, limit_sell_order):
     trade = Trade(
         pair='BTC_ETH',
@@ -309,3 +346,500 @@ def test_calc_profit_percent(limit_buy_order, limit_sell_order):
 
     # Test with a custom fee rate on the close trade
     assert trade.calc_profit_percent(fee=0.003) == 0.0614782
+
+
+def test_calc_profit_keeps_decimal_context(limit_buy_order, limit_sell_order):
+    trade = Trade(
+        pair='BTC_ETH',
+        stake_amount=0.001,
+        fee=0.0025,
+        exchange=Exchanges.BITTREX,
+    )
+    trade.open_order_id = 'profit_percent'
+    prec = getcontext().prec
+    try:
+        getcontext().prec = 28
+        trade.update(limit_buy_order)
+        trade.update(limit_sell_order)
+        assert getcontext().prec == 28
+        # Results do not depend on the precision of the caller's context
+        assert trade.calc_profit() == 0.00006217
+        assert trade.calc_profit_percent() == 0.06201057
+    finally:
+        getcontext().prec = prec
+
+
+def test_open_trades_index(default_conf, limit_buy_order, limit_sell_order):
+    init(default_conf, create_engine('sqlite://'))
+    assert get_open_trades() == []
+
+    trades = []
+    for pair in ['BTC_ETH', 'BTC_ETH', 'BTC_TKN']:
+        trade = Trade(
+            pair=pair,
+            stake_amount=0.001,
+            fee=0.0025,
+            exchange=Exchanges.BITTREX.name,
+            open_order_id='something',
+        )
+        Trade.session.add(trade)
+        Trade.session.flush()
+        register_trade(trade)
+        trades.append(trade)
+
+    assert get_open_trades() == trades
+    assert get_open_trade(trades[2].id) is trades[2]
+    assert get_open_trades_by_pair('BTC_ETH') == trades[:2]
+    assert get_open_trades_by_pair('BTC_SWT') == []
+
+    # Closing a trade removes it from the index
+    trades[0].update(limit_buy_order)
+    trades[0].update(limit_sell_order)
+    assert get_open_trade(trades[0].id) is None
+    assert get_open_trades_by_pair('BTC_ETH') == trades[1:2]
+    assert check_open_trades() is True
+
+    # The index is rebuilt from the database
+    load_open_trades()
+    assert get_open_trades() == trades[1:]
+
+
+def test_copy_open_trades(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    trade = Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0, fee=0.0025,
+                  open_rate=0.123, exchange=Exchanges.BITTREX.name)
+    Trade.session.add(trade)
+    Trade.session.flush()
+    register_trade(trade)
+
+    copies = copy_open_trades()
+    assert len(copies) == 1
+    assert copies[0] is not trade
+    assert copies[0] not in Trade.session
+    assert (copies[0].id, copies[0].pair, copies[0].open_rate) == (trade.id, 'BTC_ETH', 0.123)
+
+
+def test_query_shares_session(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(Trade.query.session))
+    thread.start()
+    thread.join()
+    assert sessions == [Trade.session]
+    assert Trade.query.session is Trade.session
+
+
+def test_check_open_trades(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    trade = Trade(
+        pair='BTC_ETH',
+        stake_amount=0.001,
+        fee=0.0025,
+        exchange=Exchanges.BITTREX.name,
+    )
+    Trade.session.add(trade)
+    Trade.session.flush()
+
+    # Trade has not been registered
+    assert check_open_trades() is False
+    assert get_open_trades() == [trade]
+    assert check_open_trades() is True
+
+
+def test_init_sqlite_tuning(default_conf, tmpdir):
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('tradesv3.sqlite')))
+    init(default_conf, engine)
+
+    assert engine.execute('PRAGMA journal_mode').scalar() == 'wal'
+    assert engine.execute('PRAGMA synchronous').scalar() == 1
+    index_names = {index['name'] for index in inspect(engine).get_indexes('trades')}
+    assert 'ix_trades_is_open_close_date' in index_names
+    assert 'ix_trades_is_open_pair' in index_names
+
+
+def test_check_migrate(default_conf, tmpdir):
+    # Simulate a database created by an older version without indexes
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('tradesv3.sqlite')))
+    engine.execute("""
+        CREATE TABLE trades (
+            id INTEGER NOT NULL,
+            exchange VARCHAR NOT NULL,
+            pair VARCHAR NOT NULL,
+            is_open BOOLEAN NOT NULL,
+            fee FLOAT NOT NULL,
+            open_rate FLOAT,
+            close_rate FLOAT,
+            close_profit FLOAT,
+            stake_amount FLOAT NOT NULL,
+            amount FLOAT,
+            open_date DATETIME NOT NULL,
+            close_date DATETIME,
+            open_order_id VARCHAR,
+            PRIMARY KEY (id),
+            CHECK (is_open IN (0, 1))
+        )
+    """)
+    engine.execute("""
+        INSERT INTO trades (exchange, pair, is_open, fee, open_rate, stake_amount, amount,
+                            open_date)
+        VALUES ('BITTREX', 'BTC_ETH', 1, 0.0025, 0.00001099, 0.001, 90.99181073,
+                '2017-11-26 08:50:00')
+    """)
+    engine.execute("""
+        INSERT INTO trades (exchange, pair, is_open, fee, open_rate, close_rate, close_profit,
+                            stake_amount, amount, open_date, close_date)
+        VALUES ('BITTREX', 'BTC_TKN', 0, 0.0025, 0.00001099, 0.00001173, 0.06201057, 0.001,
+                90.99181073, '2017-11-26 08:50:00', '2017-11-26 09:50:00')
+    """)
+    assert not inspect(engine).get_indexes('trades')
+
+    init(default_conf, engine)
+    index_names = {index['name'] for index in inspect(engine).get_indexes('trades')}
+    assert index_names == {'ix_trades_is_open_close_date', 'ix_trades_is_open_pair'}
+    assert [trade.pair for trade in get_open_trades()] == ['BTC_ETH']
+
+    # Absolute profit got stored for the closed trade
+    trade = Trade.query.filter(Trade.is_open.is_(False)).one()
+    assert trade.close_profit_abs == 0.00006217
+
+    # Running the migration twice is a noop
+    check_migrate(engine)
+
+
+def test_get_daily_profit(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    today = datetime(2017, 11, 26, 12, 0, 0)
+    for days_ago, profit in [(0, 0.0001), (0, 0.0002), (2, -0.0005), (10, 0.1)]:
+        Trade.session.add(Trade(
+            pair='BTC_ETH',
+            stake_amount=0.001,
+            fee=0.0025,
+            exchange=Exchanges.BITTREX.name,
+            is_open=False,
+            close_profit_abs=profit,
+            close_date=today - timedelta(days=days_ago),
+        ))
+    Trade.session.flush()
+
+    profit_days = get_daily_profit(today.date(), 3)
+    assert list(profit_days.keys()) == [
+        date(2017, 11, 26), date(2017, 11, 25), date(2017, 11, 24)
+    ]
+    assert round(profit_days[date(2017, 11, 26)], 8) == 0.0003
+    assert profit_days[date(2017, 11, 25)] == 0.0
+    assert profit_days[date(2017, 11, 24)] == -0.0005
+
+
+def test_trade_stats(default_conf, limit_buy_order, limit_sell_order):
+    init(default_conf, create_engine('sqlite://'))
+    stats = get_trade_stats()
+    assert stats['trade_count'] == 0
+    assert stats['closed_trade_count'] == 0
+    assert get_pair_profits() == []
+
+    trades = []
+    for pair in ['BTC_ETH', 'BTC_TKN', 'BTC_ETH']:
+        trade = Trade(
+            pair=pair,
+            stake_amount=0.001,
+            fee=0.0025,
+            exchange=Exchanges.BITTREX.name,
+            open_date=datetime.utcnow() - timedelta(hours=1),
+            open_order_id='something',
+        )
+        Trade.session.add(trade)
+        Trade.session.flush()
+        register_trade(trade)
+        trades.append(trade)
+
+    trades[0].update(limit_buy_order)
+    trades[0].update(limit_sell_order)
+    trades[1].update(limit_buy_order)
+    trades[1].close(0.00001000)
+    Trade.session.flush()
+
+    stats = get_trade_stats()
+    assert stats['trade_count'] == 3
+    assert stats['first_trade_date'] == trades[0].open_date
+    assert stats['latest_trade_date'] == trades[2].open_date
+    assert stats['closed_trade_count'] == 2
+    assert round(stats['closed_profit'], 8) == round(
+        trades[0].calc_profit() + trades[1].calc_profit(), 8
+    )
+    assert stats['closed_profit_percent'] == trades[0].close_profit + trades[1].close_profit
+    assert stats['closed_duration'] > 2 * 3600
+    assert get_pair_profits() == [
+        ('BTC_ETH', trades[0].close_profit), ('BTC_TKN', trades[1].close_profit)
+    ]
+
+    # Closing a trade twice does not count it twice
+    trades[0].close(0.00001173)
+    assert get_trade_stats()['closed_trade_count'] == 2
+
+    # Statistics are rebuilt from the database
+    expected = get_trade_stats()
+    load_trade_stats()
+    stats = get_trade_stats()
+    assert stats['trade_count'] == expected['trade_count']
+    assert stats['first_trade_date'] == expected['first_trade_date']
+    assert stats['latest_trade_date'] == expected['latest_trade_date']
+    assert stats['closed_trade_count'] == expected['closed_trade_count']
+    assert round(stats['closed_profit'], 8) == round(expected['closed_profit'], 8)
+    assert round(stats['closed_duration']) == round(expected['closed_duration'])
+    assert [pair for pair, _ in get_pair_profits()] == ['BTC_ETH', 'BTC_TKN']
+
+
+def test_unit_of_work(default_conf, mocker):
+    mocker.patch.dict('freqtrade.persistence._CONF', default_conf)
+    init(default_conf, create_engine('sqlite://'))
+    callback = MagicMock()
+
+    with unit_of_work():
+        trade = Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0, fee=0.0025,
+                      open_rate=0.123, exchange=Exchanges.BITTREX.name)
+        Trade.session.add(trade)
+        with unit_of_work():
+            on_commit(callback)
+        assert Trade.session.transaction is not None
+        assert not callback.called
+    assert Trade.session.transaction is None
+    assert callback.call_count == 1
+
+    # Without a unit of work the callback is called right away
+    on_commit(callback)
+    assert callback.call_count == 2
+    assert Trade.query.count() == 1
+
+
+def test_unit_of_work_commits_on_error(default_conf, mocker):
+    mocker.patch.dict('freqtrade.persistence._CONF', default_conf)
+    init(default_conf, create_engine('sqlite://'))
+    callback = MagicMock()
+
+    with pytest.raises(ValueError):
+        with unit_of_work():
+            Trade.session.add(Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0,
+                                    fee=0.0025, open_rate=0.123,
+                                    exchange=Exchanges.BITTREX.name))
+            on_commit(callback)
+            raise ValueError()
+    assert Trade.session.transaction is None
+    assert callback.call_count == 1
+    assert Trade.query.count() == 1
+
+
+def test_unit_of_work_write_behind(default_conf, mocker, tmpdir):
+    conf = dict(default_conf, internals={'write_behind': True})
+    mocker.patch.dict('freqtrade.persistence._CONF', conf)
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('trades.sqlite')),
+                           connect_args={'check_same_thread': False})
+    init(conf, engine)
+    threads = []
+
+    with unit_of_work():
+        Trade.session.add(Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0,
+                                fee=0.0025, open_rate=0.123, exchange=Exchanges.BITTREX.name))
+        on_commit(lambda: threads.append(threading.current_thread().name))
+    wait_for_writes()
+
+    # Committed and synced on the writer thread
+    assert threads == ['persistence-writer']
+    assert engine.execute('SELECT COUNT(*) FROM trades').scalar() == 1
+    assert engine.execute('PRAGMA synchronous').scalar() == 2
+
+    cleanup()
+    assert not any(t.name == 'persistence-writer' for t in threading.enumerate())
+
+
+def test_unit_of_work_per_thread(default_conf, mocker):
+    mocker.patch.dict('freqtrade.persistence._CONF', default_conf)
+    init(default_conf, create_engine('sqlite://'))
+    called = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def other_thread():
+        # Not part of the unit of work of the main thread
+        on_commit(lambda: called.append('other'))
+        entered.set()
+        release.wait(5)
+
+    with unit_of_work():
+        on_commit(lambda: called.append('main'))
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        assert entered.wait(5)
+        assert called == ['other']
+        release.set()
+        thread.join()
+    assert called == ['other', 'main']
+
+
+def test_unit_of_work_blocks_other_threads(default_conf, mocker, tmpdir):
+    conf = dict(default_conf, internals={'write_behind': True})
+    mocker.patch.dict('freqtrade.persistence._CONF', conf)
+    engine = create_engine('sqlite:///{}'.format(tmpdir.join('trades.sqlite')),
+                           connect_args={'check_same_thread': False})
+    init(conf, engine)
+    events = []
+    committing = threading.Event()
+    release = threading.Event()
+
+    def slow_commit():
+        committing.set()
+        release.wait(5)
+        events.append('committed')
+
+    mocker.patch('freqtrade.persistence._snapshot_if_due', side_effect=slow_commit)
+
+    def other_thread():
+        with unit_of_work():
+            events.append('other')
+
+    with unit_of_work():
+        Trade.session.add(Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0,
+                                fee=0.0025, open_rate=0.123, exchange=Exchanges.BITTREX.name))
+    assert committing.wait(5)
+    # The session is still in use by the writer thread
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    thread.join(0.2)
+    assert events == []
+    release.set()
+    thread.join(5)
+    wait_for_writes()
+    assert events == ['committed', 'other', 'committed']
+    cleanup()
+
+
+@pytest.mark.parametrize('backup_api', [True, False])
+def test_dry_run_snapshot(default_conf, mocker, tmpdir, backup_api):
+    snapshot_file = str(tmpdir.join('tradesv3.dry_run.sqlite'))
+    mocker.patch('freqtrade.persistence.DRY_RUN_DB_FILE', snapshot_file)
+    # Without the backup API (python < 3.7) the tables are copied
+    mocker.patch('freqtrade.persistence._BACKUP_API', backup_api)
+    conf = dict(default_conf, dry_run=True, dry_run_snapshot=True,
+                internals={'dry_run_snapshot_secs': 3600})
+    mocker.patch.dict('freqtrade.persistence._CONF', conf)
+
+    init(conf)
+    assert str(Trade.session.bind.url) == 'sqlite://'
+    assert not os.path.isfile(snapshot_file)
+    with unit_of_work():
+        Trade.session.add(Trade(pair='BTC_ETH', stake_amount=0.001, amount=123.0,
+                                fee=0.0025, open_rate=0.123, exchange=Exchanges.BITTREX.name))
+    # The interval has not elapsed yet
+    assert not os.path.isfile(snapshot_file)
+
+    cleanup()
+    assert create_engine('sqlite:///' + snapshot_file) \
+        .execute('SELECT COUNT(*) FROM trades').scalar() == 1
+
+    # A new in-memory database is restored from the snapshot
+    init(conf)
+    assert str(Trade.session.bind.url) == 'sqlite://'
+    assert len(get_open_trades()) == 1
+
+    # Snapshots are taken when committing once the interval has elapsed
+    mocker.patch('freqtrade.persistence._LAST_SNAPSHOT', 0.0)
+    with unit_of_work():
+        Trade.session.add(Trade(pair='BTC_ETC', stake_amount=0.001, amount=123.0,
+                                fee=0.0025, open_rate=0.123, exchange=Exchanges.BITTREX.name))
+    assert create_engine('sqlite:///' + snapshot_file) \
+        .execute('SELECT COUNT(*) FROM trades').scalar() == 2
+    assert inspect(create_engine('sqlite:///' + snapshot_file)).get_indexes('trades')
+
+
+def test_snapshot_disabled(default_conf, mocker):
+    mocker.patch.dict('freqtrade.persistence._CONF', default_conf)
+    backup_mock = mocker.patch('freqtrade.persistence._backup')
+    init(default_conf, create_engine('sqlite://'))
+    snapshot()
+    assert not backup_mock.called
+
+
+def _add_closed_trade(pair: str, closed_days_ago: int, profit: float) -> Trade:
+    close_date = datetime.utcnow() - timedelta(days=closed_days_ago)
+    trade = Trade(pair=pair, stake_amount=0.001, fee=0.0025, exchange=Exchanges.BITTREX.name,
+                  open_rate=0.123, amount=1.0, is_open=False, close_profit=profit * 10,
+                  close_profit_abs=profit, open_date=close_date - timedelta(hours=1),
+                  close_date=close_date)
+    Trade.session.add(trade)
+    Trade.session.flush()
+    return trade
+
+
+def test_archive_trades(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    assert archive_trades(timedelta(days=30)) == 0
+
+    _add_closed_trade('BTC_ETH', 40, 0.001)
+    _add_closed_trade('BTC_TKN', 40, -0.002)
+    _add_closed_trade('BTC_ETH', 40, 0.003)
+    _add_closed_trade('BTC_ETH', 1, 0.004)
+    open_trade = Trade(pair='BTC_ETC', stake_amount=0.001, fee=0.0025, amount=1.0,
+                       open_rate=0.123, exchange=Exchanges.BITTREX.name)
+    Trade.session.add(open_trade)
+    Trade.session.flush()
+    register_trade(open_trade)
+    # The latest trade is never archived
+    latest = _add_closed_trade('BTC_TKN', 40, 0.005)
+
+    load_trade_stats()
+    stats = get_trade_stats()
+    pair_profits = get_pair_profits()
+    today = datetime.utcnow().date()
+    daily = get_daily_profit(today, 50)
+
+    assert archive_trades(timedelta(days=30)) == 3
+    assert Trade.query.count() == 3
+    assert Trade.session.execute('SELECT COUNT(*) FROM trades_archive').scalar() == 3
+    assert Trade.query.get(latest.id) is not None
+    assert get_open_trades() == [open_trade]
+
+    # Statistics include the archived trades
+    assert get_daily_profit(today, 50) == daily
+    load_trade_stats()
+    assert get_trade_stats() == stats
+    assert get_pair_profits() == pair_profits
+
+    # Summaries of already archived pairs are updated
+    _add_closed_trade('BTC_ETH', 40, 0.006)
+    _add_closed_trade('BTC_ETH', 0, 0.007)
+    assert archive_trades(timedelta(days=30)) == 2
+    load_trade_stats()
+    stats = get_trade_stats()
+    assert stats['trade_count'] == 8
+    assert stats['closed_trade_count'] == 7
+    assert round(stats['closed_profit'], 8) == 0.024
+    assert dict(get_pair_profits())['BTC_ETH'] == pytest.approx(0.21)
+    assert sum(get_daily_profit(today, 50).values()) == pytest.approx(0.024)
+
+
+def test_check_archive(default_conf, mocker):
+    mocker.patch.dict('freqtrade.persistence._CONF', default_conf)
+    archive_mock = mocker.patch('freqtrade.persistence.archive_trades')
+    mocker.patch('freqtrade.persistence._LAST_ARCHIVE', 0.0)
+
+    check_archive()
+    assert not archive_mock.called
+
+    mocker.patch.dict('freqtrade.persistence._CONF', {'internals': {'archive_trades_days': 30}})
+    check_archive()
+    archive_mock.assert_called_once_with(timedelta(days=30))
+    # Runs at most once per interval
+    check_archive()
+    assert archive_mock.call_count == 1
+
+
+def test_query_metrics(default_conf):
+    init(default_conf, create_engine('sqlite://'))
+    queries = metrics.DB_QUERY_SECONDS.get_count('SELECT', 'trades')
+    inserts = metrics.DB_QUERY_SECONDS.get_count('INSERT', 'trades')
+
+    Trade.query.filter(Trade.is_open.is_(True)).all()
+    Trade.session.add(Trade(pair='BTC_ETH', stake_amount=0.001, fee=0.0025,
+                            exchange='BITTREX', open_date=datetime.utcnow()))
+    Trade.session.flush()
+    assert metrics.DB_QUERY_SECONDS.get_count('SELECT', 'trades') == queries + 1
+    assert metrics.DB_QUERY_SECONDS.get_count('INSERT', 'trades') == inserts + 1
@@ -0,0 +1,94 @@
+# pragma pylint: disable=missing-docstring, C0103
+import logging
+import os
+import time
+
+from freqtrade import profiler
+from freqtrade.profiler import Profiler
+
+
+def busy_loop(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_profiler_dump(tmpdir):
+    prof = Profiler(output_dir=str(tmpdir), interval=0.001)
+    prof.start()
+    with prof.profile('loop'):
+        busy_loop(0.1)
+    prof.stop()
+
+    files = sorted(os.listdir(str(tmpdir)))
+    assert files == ['profile-00001-loop.txt']
+    with open(os.path.join(str(tmpdir), files[0])) as file:
+        lines = file.read().splitlines()
+    assert lines
+    # Folded stacks: frames separated by semicolons and the number of samples
+    assert any('busy_loop (freqtrade/tests/test_profiler.py:' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+
+    summary = prof.summary()
+    assert 'component' in summary
+    assert 'other' in summary
+    assert 'busy_loop' in summary
+
+
+def test_profiler_every_and_rotate(tmpdir):
+    prof = Profiler(every=2, output_dir=str(tmpdir), interval=0.001, keep=2)
+    prof.start()
+    for _ in range(6):
+        with prof.profile('epoch'):
+            busy_loop(0.02)
+    prof.stop()
+
+    # 3 dumps of 2 epochs each, the oldest one has been removed
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'profile-00002-epoch.txt', 'profile-00003-epoch.txt'
+    ]
+
+
+def test_profiler_ignores_other_threads(tmpdir):
+    prof = Profiler(output_dir=str(tmpdir), interval=0.001)
+    prof.start()
+    busy_loop(0.05)
+    prof.stop()
+    assert os.listdir(str(tmpdir)) == []
+    assert prof.summary() == 'No samples have been taken'
+
+
+def test_profiler_component():
+    def code(path):
+        return compile('pass', path, 'exec')
+
+    stack = (
+        code(os.path.join('freqtrade', 'main.py')),
+        code(os.path.join('freqtrade', 'analyze.py')),
+        code(os.path.join('freqtrade', 'exchange', 'bittrex.py')),
+        code(os.path.join('site-packages', 'requests', 'api.py')),
+    )
+    assert Profiler._component(stack) == 'exchange'
+    assert Profiler._component(stack[:2]) == 'analyze'
+    assert Profiler._component(stack[:1]) == 'other'
+
+
+def test_profile_disabled(mocker):
+    mocker.patch('freqtrade.profiler._PROFILER', None)
+    with profiler.profile('loop'):
+        pass
+    with profiler.profiling(None):
+        assert profiler._PROFILER is None
+
+
+def test_profiling(mocker, tmpdir, caplog):
+    caplog.set_level(logging.INFO)
+    mocker.patch('freqtrade.profiler.Profiler.__init__.__defaults__',
+                 (1, str(tmpdir), 0.001, 20))
+    with profiler.profiling(1):
+        assert profiler._PROFILER is not None
+        with profiler.profile('epoch'):
+            busy_loop(0.05)
+    assert profiler._PROFILER is None
+    assert os.listdir(str(tmpdir)) == ['profile-00001-epoch.txt']
+    assert 'Profile summary:' in caplog.text
@@ -0,0 +1,79 @@
+# pragma pylint: disable=missing-docstring, C0103
+import json
+
+import pytest
+
+from freqtrade import optimize
+from freqtrade.resample import get_source_interval, resample_ticker_history
+
+
+def candle(date, open_, high, low, close, volume):
+    return {'O': open_, 'H': high, 'L': low, 'C': close, 'V': volume, 'T': date,
+            'BV': volume * close}
+
+
+def test_resample_ticker_history():
+    ticker = [
+        candle('2017-11-26T09:02:00', 1.0, 1.5, 0.5, 1.2, 1.0),
+        candle('2017-11-26T09:00:00', 1.0, 1.1, 0.9, 1.0, 2.0),
+        candle('2017-11-26T09:01:00', 1.0, 2.0, 1.0, 1.0, 3.0),
+        # No trades at 9:03 and 9:04
+        candle('2017-11-26T09:05:00', 1.2, 1.3, 0.8, 0.9, 4.0),
+    ]
+    assert resample_ticker_history(ticker, 5) == [
+        {'O': 1.0, 'H': 2.0, 'L': 0.5, 'C': 1.2, 'V': 6.0, 'BV': 6.2,
+         'T': '2017-11-26T09:00:00'},
+        {'O': 1.2, 'H': 1.3, 'L': 0.8, 'C': 0.9, 'V': 4.0, 'BV': 3.6,
+         'T': '2017-11-26T09:05:00'},
+    ]
+
+
+def test_resample_ticker_history_incomplete_first():
+    ticker = [
+        candle('2017-11-26T08:58:00', 1.0, 1.0, 1.0, 1.0, 1.0),
+        candle('2017-11-26T08:59:00', 1.0, 1.0, 1.0, 1.0, 1.0),
+        candle('2017-11-26T09:00:00', 2.0, 2.0, 2.0, 2.0, 1.0),
+    ]
+    result = resample_ticker_history(ticker, 15)
+    assert [row['T'] for row in result] == ['2017-11-26T09:00:00']
+    assert result[0]['O'] == 2.0
+    assert resample_ticker_history(ticker[:2], 15) == []
+
+
+def test_resample_ticker_history_same_interval():
+    ticker = [candle('2017-11-26T09:01:00', 1, 1, 1, 1, 1),
+              candle('2017-11-26T09:00:00', 1, 1, 1, 1, 1)]
+    assert resample_ticker_history(ticker, 1) == [ticker[1], ticker[0]]
+    assert resample_ticker_history([], 5) == []
+
+
+def test_resample_ticker_history_invalid():
+    with pytest.raises(ValueError, match=r'Cannot resample tick_interval 5 to 12'):
+        resample_ticker_history([], 12, source_interval=5)
+
+
+def test_resample_ticker_history_matches_exchange():
+    # The bundled 5 min candles of Bittrex overlap with the 1 min candles
+    with open('{}/BTC_ETH-1.json'.format(optimize.testdata_path())) as file:
+        one_min = json.load(file)
+    with open('{}/BTC_ETH-5.json'.format(optimize.testdata_path())) as file:
+        five_min = {row['T']: row for row in json.load(file)}
+
+    result = resample_ticker_history(one_min, 5)
+    assert len(result) > 2000
+    for row in result:
+        expected = five_min[row['T']]
+        for key in ('O', 'H', 'L', 'C', 'V', 'BV'):
+            assert row[key] == pytest.approx(expected[key])
+
+    # Larger intervals can be derived from derived candles
+    hourly = resample_ticker_history(result, 60, source_interval=5)
+    assert hourly == resample_ticker_history(one_min, 60)
+
+
+def test_get_source_interval():
+    assert get_source_interval(5, (1, 5)) == 5
+    assert get_source_interval(60, (1, 5)) == 5
+    assert get_source_interval(7, (1, 5)) == 1
+    with pytest.raises(ValueError, match=r'Cannot derive tick_interval 7'):
+        get_source_interval(7, (5, 30))
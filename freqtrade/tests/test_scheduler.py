@@ -0,0 +1,102 @@
+# pragma pylint: disable=missing-docstring,C0103
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from freqtrade import metrics
+from freqtrade.scheduler import Scheduler
+
+
+class FakeClock():
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, secs: float) -> None:
+        self.now += secs
+
+
+def test_scheduler_aligned_job():
+    clock = FakeClock(1000.0)
+    func = MagicMock()
+    scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+    job = scheduler.add_job('entries', func, interval=300, offset=5, align=True)
+
+    # The first run is due right away, the next one just after the candle closes
+    assert scheduler.run_pending() == 1
+    assert job.next_run == 1205.0
+    assert scheduler.run_pending() == 0
+
+    scheduler.sleep()
+    assert clock.now == 1205.0
+    assert scheduler.run_pending() == 1
+    assert job.next_run == 1505.0
+    assert func.call_count == 2
+
+    # Sleeping can be interrupted
+    scheduler.sleep(max_secs=1)
+    assert clock.now == 1206.0
+
+
+def test_scheduler_interval_job():
+    clock = FakeClock(1000.0)
+    scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+    job = scheduler.add_job('exits', MagicMock(), interval=10)
+
+    scheduler.run_pending()
+    assert job.next_run == 1010.0
+    clock.now = 1003.0
+    assert scheduler.run_pending() == 0
+
+    # Late runs are recorded, the cadence stays the same
+    clock.now = 1012.0
+    scheduler.run_pending()
+    assert job.next_run == 1020.0
+    clock.now = 1025.0
+    scheduler.run_pending()
+    assert job.next_run == 1030.0
+    stats = scheduler.get_stats()['exits']
+    assert stats['runs'] == 3
+    assert stats['lateness_max'] == 5.0
+    assert stats['lateness_avg'] == pytest.approx((0 + 2 + 5) / 3)
+    assert stats['skipped'] == 0
+    assert metrics.LOOP_LAG.get('exits') == 5.0
+    assert stats['overruns'] == 0
+
+
+def test_scheduler_overrun(caplog):
+    clock = FakeClock(1000.0)
+
+    def slow():
+        clock.now += 700
+
+    scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+    job = scheduler.add_job('entries', slow, interval=300, offset=5, align=True)
+    scheduler.run_pending()
+    assert job.next_run == 1805.0
+
+    clock.now = 1805.0
+    with caplog.at_level(logging.WARNING, logger='freqtrade.scheduler'):
+        scheduler.run_pending()
+    assert 'Job entries took 700.00 seconds' in caplog.text
+
+    # Candles which closed during the run are skipped
+    assert job.next_run == 2705.0
+    stats = scheduler.get_stats()['entries']
+    assert stats['overruns'] == 2
+    assert stats['skipped'] == 2
+    assert stats['duration_max'] == 700.0
+
+
+def test_scheduler_job_exception():
+    clock = FakeClock(1000.0)
+    scheduler = Scheduler(clock=clock, sleep=clock.sleep)
+    job = scheduler.add_job('exits', MagicMock(side_effect=ValueError('Oh snap')), interval=10)
+
+    with pytest.raises(ValueError, match=r'Oh snap'):
+        scheduler.run_pending()
+    assert job.next_run == 1010.0
+    assert scheduler.get_stats()['exits']['runs'] == 1
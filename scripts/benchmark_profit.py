@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the Trade profit calculations.
+
+Compares the current implementation in freqtrade.persistence with the previous one,
+which changed the precision of the global decimal context on every call,
+and verifies that both return identical results for a set of random trades.
+"""
+import random
+import timeit
+from decimal import Decimal, getcontext
+
+from freqtrade.persistence import Trade
+
+
+def legacy_open_trade_price(trade: Trade, fee=None) -> float:
+    getcontext().prec = 8
+    buy_trade = (Decimal(trade.amount) * Decimal(trade.open_rate))
+    fees = buy_trade * Decimal(fee or trade.fee)
+    return float(buy_trade + fees)
+
+
+def legacy_close_trade_price(trade: Trade, rate=None, fee=None) -> float:
+    getcontext().prec = 8
+    if rate is None and not trade.close_rate:
+        return 0.0
+    sell_trade = (Decimal(trade.amount) * Decimal(rate or trade.close_rate))
+    fees = sell_trade * Decimal(fee or trade.fee)
+    return float(sell_trade - fees)
+
+
+def legacy_profit(trade: Trade, rate=None, fee=None) -> float:
+    open_trade_price = legacy_open_trade_price(trade)
+    close_trade_price = legacy_close_trade_price(
+        trade,
+        rate=Decimal(rate or trade.close_rate),
+        fee=Decimal(fee or trade.fee)
+    )
+    return float("{0:.8f}".format(close_trade_price - open_trade_price))
+
+
+def legacy_profit_percent(trade: Trade, rate=None, fee=None) -> float:
+    getcontext().prec = 8
+    open_trade_price = legacy_open_trade_price(trade)
+    close_trade_price = legacy_close_trade_price(
+        trade,
+        rate=Decimal(rate or trade.close_rate),
+        fee=Decimal(fee or trade.fee)
+    )
+    return float("{0:.8f}".format((close_trade_price / open_trade_price) - 1))
+
+
+def random_trades(count: int, seed: int = 0):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        open_rate = rnd.uniform(0.00000100, 0.1)
+        trade = Trade(
+            pair='BTC_ETH',
+            amount=rnd.uniform(0.1, 10000),
+            open_rate=open_rate,
+            fee=rnd.choice([0.001, 0.0025, 0.003]),
+        )
+        yield trade, open_rate * rnd.uniform(0.5, 1.5)
+
+
+def check_results(count: int) -> None:
+    for trade, rate in random_trades(count):
+        assert trade.calc_profit(rate=rate) == legacy_profit(trade, rate), (trade, rate)
+        assert trade.calc_profit_percent(rate=rate) == legacy_profit_percent(trade, rate), \
+            (trade, rate)
+    print('{} random trades: results are identical'.format(count))
+
+
+def run_benchmark(number: int) -> None:
+    trade = Trade(pair='BTC_ETH', amount=90.99181073, open_rate=0.00001099, fee=0.0025)
+    rate = 0.00001173
+    benchmarks = [
+        ('calc_profit', lambda: trade.calc_profit(rate=rate),
+         lambda: legacy_profit(trade, rate)),
+        ('calc_profit_percent', lambda: trade.calc_profit_percent(rate=rate),
+         lambda: legacy_profit_percent(trade, rate)),
+    ]
+    for name, current, legacy in benchmarks:
+        current_us = min(timeit.repeat(current, number=number, repeat=5)) / number * 1e6
+        legacy_us = min(timeit.repeat(legacy, number=number, repeat=5)) / number * 1e6
+        print('{:<20} current: {:6.2f} us  legacy: {:6.2f} us  speedup: {:.2f}x'.format(
+            name, current_us, legacy_us, legacy_us / current_us
+        ))
+
+
+if __name__ == '__main__':
+    check_results(10000)
+    run_benchmark(100000)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Scaling harness for preprocessing and backtesting.
+
+Generates synthetic ticker history for a growing number of pairs and days,
+then reports the throughput in candles per second and the peak memory
+of every step, e.g.:
+
+    python scripts/scaling_benchmark.py --pairs 10 100 500 --days 20 365 --output scaling.json
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+from tabulate import tabulate
+
+from freqtrade import main
+from freqtrade.benchmark import run_benchmark
+from freqtrade.optimize import preprocess
+from freqtrade.optimize.backtesting import backtest, compare_results
+from freqtrade.optimize.hyperopt_conf import hyperopt_optimize_conf
+from freqtrade.optimize.synthetic import generate_data
+
+
+def measure(pair_count: int, days: float, ticker_interval: int, repeat: int,
+            compact: bool = False) -> Dict[str, Any]:
+    start = time.perf_counter()
+    data = generate_data(pair_count, days=days, ticker_interval=ticker_interval)
+    generate_secs = time.perf_counter() - start
+    candles = sum(len(candles) for candles in data.values())
+
+    config = hyperopt_optimize_conf()
+    main._CONF = config
+    processed = preprocess(data)
+    steps = {
+        'preprocess': run_benchmark(lambda: preprocess(data), repeat),
+        'backtest': run_benchmark(
+            lambda: backtest(config['stake_amount'], processed, 0, False), repeat
+        ),
+    }
+    result = {
+        'pairs': pair_count,
+        'days': days,
+        'candles': candles,
+        'generate_secs': generate_secs,
+        'steps': steps,
+    }
+    if compact:
+        compact_processed = preprocess(data, compact=True)
+        steps['preprocess_compact'] = run_benchmark(lambda: preprocess(data, compact=True), repeat)
+        steps['backtest_compact'] = run_benchmark(
+            lambda: backtest(config['stake_amount'], compact_processed, 0, False), repeat
+        )
+        result['compact_matches'] = compare_results(
+            backtest(config['stake_amount'], compact_processed, 0, False),
+            backtest(config['stake_amount'], processed, 0, False),
+        )
+    return result
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    tabular_data = []
+    for result in results:
+        for step, timing in result['steps'].items():
+            tabular_data.append([
+                step,
+                result['pairs'],
+                result['days'],
+                result['candles'],
+                '{:.3f}'.format(timing['median']),
+                '{:.0f}'.format(result['candles'] / timing['median']),
+                '{:.1f}'.format(timing['peak_memory'] / 2 ** 20),
+            ])
+    print(tabulate(
+        sorted(tabular_data, key=lambda row: row[0]),
+        headers=['step', 'pairs', 'days', 'candles', 'median (s)', 'candles/s',
+                 'peak memory (MiB)'],
+        disable_numparse=True,
+    ))
+    for result in results:
+        if 'compact_matches' in result:
+            print('{} pairs over {} days: compact backtest {} the tolerance'.format(
+                result['pairs'], result['days'],
+                'within' if result['compact_matches'] else 'NOT within'
+            ))
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pairs', type=int, nargs='+', default=[10, 50, 100],
+                        help='numbers of pairs to measure (default: 10 50 100)')
+    parser.add_argument('--days', type=float, nargs='+', default=[20],
+                        help='numbers of days per pair to measure (default: 20)')
+    parser.add_argument('-i', '--ticker-interval', type=int, default=5,
+                        help='ticker interval in minutes (default: 5)')
+    parser.add_argument('-n', '--repeat', type=int, default=1,
+                        help='timed runs per measurement (default: 1)')
+    parser.add_argument('--compact', action='store_true',
+                        help='also measure compact indicators and compare their backtest results')
+    parser.add_argument('--output', help='write the results as json to this file')
+    args = parser.parse_args()
+
+    results = []
+    for days in args.days:
+        for pair_count in args.pairs:
+            print('Measuring {} pairs over {} days ...'.format(pair_count, days))
+            results.append(measure(pair_count, days, args.ticker_interval, args.repeat,
+                                   args.compact))
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == '__main__':
+    main_cli()